@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from pathlib import Path
+
+from benchmarks.harness import OPERATIONS, compare, run_benchmarks
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Benchmark the DIDManager hot paths on ACA-Py's in-memory profile",
+    )
+    parser.add_argument("--history-sizes", default="10,100,1000", type=_sizes)
+    parser.add_argument("--wallet-sizes", default="1,10000", type=_sizes)
+    parser.add_argument("--iterations", default=50, type=int)
+    parser.add_argument("--number-of-keys", default=3, type=int)
+    parser.add_argument("--operations", default=",".join(OPERATIONS))
+    parser.add_argument(
+        "--latency-ms",
+        default=0,
+        type=float,
+        help="simulated round-trip of every storage, wallet and mediator call",
+    )
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, type=Path)
+    parser.add_argument(
+        "--tolerance",
+        default=0.25,
+        type=float,
+        help="relative p50 increase allowed before flagging a regression",
+    )
+    parser.add_argument(
+        "--min-delta-ms",
+        default=0.05,
+        type=float,
+        help="absolute p50 increase always allowed, sub-millisecond timings being noisy",
+    )
+    parser.add_argument(
+        "--gate-latency",
+        action="store_true",
+        help="fail on p50 regressions too, not only on extra storage calls",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="store the results as the baseline of the operations run",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    results = asyncio.run(
+        run_benchmarks(
+            args.history_sizes,
+            args.wallet_sizes,
+            args.iterations,
+            args.number_of_keys,
+            args.operations.split(","),
+            args.latency_ms / 1000,
+        )
+    )
+
+    print(
+        f"{'operation':<50} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} "
+        f"{'storage calls':>14}"
+    )
+    for result in results:
+        print(
+            f"{result.name:<50} {result.p50_ms:>9.3f} {result.p90_ms:>9.3f} "
+            f"{result.p99_ms:>9.3f} {result.storage_calls:>14.1f}"
+        )
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    if args.save_baseline:
+        # the entries of the operations not run are kept
+        baseline.update((result.name, result.to_dict()) for result in results)
+        args.baseline.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    for result in results:
+        if result.name not in baseline:
+            print(f"NO BASELINE {result.name}, record it with --save-baseline")
+
+    # storage calls are deterministic, latencies vary with the load of the machine
+    failures = []
+    for regression in compare(results, baseline, args.tolerance, args.min_delta_ms):
+        if regression.metric == "storage_calls" or args.gate_latency:
+            failures.append(regression)
+            print(f"REGRESSION {regression}")
+        else:
+            print(f"SLOWER {regression}")
+
+    return 1 if failures else 0
+
+
+def _sizes(value: str):
+    return [int(size) for size in value.split(",")]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
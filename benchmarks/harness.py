@@ -0,0 +1,380 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable, Dict, List, Mapping, Sequence
+
+from aries_cloudagent.core.in_memory import InMemoryProfile
+from aries_cloudagent.core.profile import Profile, ProfileSession
+from aries_cloudagent.protocols.coordinate_mediation.v1_0.route_manager import (
+    CoordinateMediationV1RouteManager,
+    RouteManager,
+)
+from aries_cloudagent.storage.base import BaseStorage, BaseStorageSearchSession
+from aries_cloudagent.storage.record import StorageRecord
+from aries_cloudagent.wallet.base import BaseWallet
+from aries_cloudagent.wallet.did_info import DIDInfo
+from aries_cloudagent.wallet.did_method import DIDMethod, DIDMethods, HolderDefinedDid
+from aries_cloudagent.wallet.in_memory import InMemoryWallet
+from aries_cloudagent.wallet.key_type import ED25519
+
+from didmanagement.did_manager import DIDManager, RecallStrategyConfig
+from didmanagement.retention import StorageBackendStorageStrategy
+from didmanagement.verification_methods import LatestVerificationKeyStrategy
+
+logger = logging.getLogger(__name__)
+
+OPERATIONS = [
+    "get_diddoc",
+    "get_diddoc_concurrent",
+    "get_diddoc_json",
+    "get_diddoc_json_direct",
+    "rotate_key",
+    "current_index",
+    "verification_method_id",
+]
+
+# holder defined, rotatable DIDs, as served by the plugin
+WEB = DIDMethod(
+    "web", [ED25519], rotation=True, holder_defined_did=HolderDefinedDid.REQUIRED
+)
+
+
+class CountingStorage(BaseStorage):
+    """Storage counting the calls made to the storage it wraps."""
+
+    def __init__(self, storage: BaseStorage, latency: float = 0):
+        """
+        :param storage:
+        :param latency: seconds every call waits for, as a round-trip to a database would
+        """
+        self.__storage = storage
+        self.__latency = latency
+        self.calls = Counter()
+
+    async def add_record(self, record: StorageRecord):
+        await self._call("add_record")
+        await self.__storage.add_record(record)
+
+    async def get_record(
+        self, record_type: str, record_id: str, options: Mapping = None
+    ) -> StorageRecord:
+        await self._call("get_record")
+        return await self.__storage.get_record(record_type, record_id, options)
+
+    async def update_record(self, record: StorageRecord, value: str, tags: Mapping):
+        await self._call("update_record")
+        await self.__storage.update_record(record, value, tags)
+
+    async def delete_record(self, record: StorageRecord):
+        await self._call("delete_record")
+        await self.__storage.delete_record(record)
+
+    async def find_all_records(
+        self, type_filter: str, tag_query: Mapping = None, options: Mapping = None
+    ):
+        await self._call("find_all_records")
+        return await self.__storage.find_all_records(type_filter, tag_query, options)
+
+    async def delete_all_records(self, type_filter: str, tag_query: Mapping = None):
+        await self._call("delete_all_records")
+        await self.__storage.delete_all_records(type_filter, tag_query)
+
+    def search_records(
+        self,
+        type_filter: str,
+        tag_query: Mapping = None,
+        page_size: int = None,
+        options: Mapping = None,
+    ) -> BaseStorageSearchSession:
+        self.calls["search_records"] += 1
+        return self.__storage.search_records(type_filter, tag_query, page_size, options)
+
+    async def _call(self, method: str):
+        self.calls[method] += 1
+        if self.__latency:
+            await asyncio.sleep(self.__latency)
+
+
+class LatentWallet(InMemoryWallet):
+    """In-memory wallet whose DID lookups take a database round-trip."""
+
+    def __init__(self, profile: Profile, latency: float):
+        super().__init__(profile)
+        self.__latency = latency
+
+    async def get_local_did(self, did: str) -> DIDInfo:
+        await asyncio.sleep(self.__latency)
+        return await super().get_local_did(did)
+
+
+class LatentRouteManager(CoordinateMediationV1RouteManager):
+    """Route manager whose routing information takes a database round-trip."""
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self.__latency = latency
+
+    async def routing_info(self, *args, **kwargs):
+        await asyncio.sleep(self.__latency)
+        return await super().routing_info(*args, **kwargs)
+
+
+@dataclass
+class OperationResult:
+    operation: str
+    history_size: int
+    wallet_size: int
+    iterations: int
+    p50_ms: float
+    p90_ms: float
+    p99_ms: float
+    mean_ms: float
+    storage_calls: float
+    # simulated round-trip of the storage, wallet and route manager calls
+    latency_ms: float = 0
+
+    @property
+    def name(self) -> str:
+        latency = f",latency={self.latency_ms:g}ms" if self.latency_ms else ""
+        return (
+            f"{self.operation}[history={self.history_size},wallet={self.wallet_size}"
+            f"{latency}]"
+        )
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class Regression:
+    name: str
+    metric: str
+    baseline: float
+    current: float
+
+    def __str__(self) -> str:
+        return f"{self.name} {self.metric}: {self.baseline:.3f} -> {self.current:.3f}"
+
+
+async def seed_wallet(profile: Profile, wallet_size: int, history_size: int) -> List[str]:
+    """
+    Create DIDs with a synthetic key history, the first one holding `history_size` keys
+    :param profile:
+    :param wallet_size: number of DIDs in the wallet
+    :param history_size: number of rotated out keys of the benchmarked DID
+    :return: the created DIDs, benchmarked one first
+    """
+    dids = []
+    async with profile.session() as session:
+        wallet = session.inject(BaseWallet)
+        storage_strategy = StorageBackendStorageStrategy(session.inject(BaseStorage))
+        for i in range(wallet_size):
+            did = f"did:web:benchmark.example:{i}"
+            await wallet.create_local_did(WEB, ED25519, did=did)
+            dids.append(did)
+
+            # the other DIDs of the wallet carry a short history of their own
+            for _ in range(history_size if i == 0 else 1):
+                await storage_strategy.store_old_key(did, os.urandom(32))
+
+    return dids
+
+
+def benchmark_profile(latency: float = 0) -> Profile:
+    did_methods = DIDMethods()
+    did_methods.register(WEB)
+    return InMemoryProfile.test_profile(
+        settings={"default_endpoint": "http://endpoint.url", "wallet.id": "benchmark"},
+        bind={
+            DIDMethods: did_methods,
+            RouteManager: LatentRouteManager(latency)
+            if latency
+            else CoordinateMediationV1RouteManager(),
+        },
+    )
+
+
+async def measure(
+    operation: str,
+    history_size: int,
+    wallet_size: int,
+    iterations: int,
+    run: Callable[[ProfileSession, CountingStorage], Awaitable],
+    profile: Profile,
+    latency: float = 0,
+) -> OperationResult:
+    latencies = []
+    storage_calls = 0
+    for _ in range(iterations):
+        async with profile.session() as session:
+            storage = CountingStorage(session.inject(BaseStorage), latency)
+            session.context.injector.bind_instance(BaseStorage, storage)
+            if latency:
+                session.context.injector.bind_instance(
+                    BaseWallet, LatentWallet(profile, latency)
+                )
+
+            start = time.perf_counter()
+            await run(session, storage)
+            latencies.append((time.perf_counter() - start) * 1000)
+            storage_calls += sum(storage.calls.values())
+
+    latencies.sort()
+    return OperationResult(
+        operation=operation,
+        history_size=history_size,
+        wallet_size=wallet_size,
+        iterations=iterations,
+        p50_ms=_percentile(latencies, 50),
+        p90_ms=_percentile(latencies, 90),
+        p99_ms=_percentile(latencies, 99),
+        mean_ms=sum(latencies) / len(latencies),
+        storage_calls=storage_calls / iterations,
+        latency_ms=latency * 1000,
+    )
+
+
+async def run_benchmarks(
+    history_sizes: Sequence[int] = (10, 100, 1000),
+    wallet_sizes: Sequence[int] = (1, 10000),
+    iterations: int = 50,
+    number_of_keys: int = 3,
+    operations: Sequence[str] = OPERATIONS,
+    latency: float = 0,
+) -> List[OperationResult]:
+    """
+    Run every operation against every combination of key history and wallet size
+    :param history_sizes: number of rotated out keys of the benchmarked DID
+    :param wallet_sizes: number of DIDs in the wallet
+    :param iterations: number of timed runs of each operation
+    :param number_of_keys: number of keys of the benchmarked DID documents
+    :param operations: names of the operations to run
+    :param latency: seconds of simulated round-trip to the storage, wallet and mediator
+    :return:
+    """
+    results = []
+    for wallet_size in wallet_sizes:
+        for history_size in history_sizes:
+            profile = benchmark_profile(latency)
+            did = (await seed_wallet(profile, wallet_size, history_size))[0]
+            logger.info("Seeded %s DIDs, %s keys for %s", wallet_size, history_size, did)
+
+            runs = _operations(profile, did, number_of_keys)
+            for operation in operations:
+                results.append(
+                    await measure(
+                        operation,
+                        history_size,
+                        wallet_size,
+                        iterations,
+                        runs[operation],
+                        profile,
+                        latency,
+                    )
+                )
+
+    return results
+
+
+def compare(
+    results: List[OperationResult],
+    baseline: Dict[str, dict],
+    tolerance: float = 0.25,
+    min_delta_ms: float = 0.05,
+) -> List[Regression]:
+    """
+    Flag the operations slower, or doing more storage calls, than their baseline
+    :param results:
+    :param baseline: baseline results, by operation name
+    :param tolerance: relative latency increase allowed before flagging
+    :param min_delta_ms: latency increase always allowed, sub-millisecond timings being
+    mostly noise from one run to the next
+    :return:
+    """
+    regressions = []
+    for result in results:
+        reference = baseline.get(result.name)
+        if reference is None:
+            continue
+
+        # storage calls are deterministic, any increase is a regression
+        if result.storage_calls > reference["storage_calls"]:
+            regressions.append(
+                Regression(
+                    result.name,
+                    "storage_calls",
+                    reference["storage_calls"],
+                    result.storage_calls,
+                )
+            )
+        if result.p50_ms > max(
+            reference["p50_ms"] * (1 + tolerance), reference["p50_ms"] + min_delta_ms
+        ):
+            regressions.append(
+                Regression(result.name, "p50_ms", reference["p50_ms"], result.p50_ms)
+            )
+
+    return regressions
+
+
+def _operations(
+    profile: Profile, did: str, number_of_keys: int
+) -> Dict[str, Callable[[ProfileSession, CountingStorage], Awaitable]]:
+    recall_strategy_config = RecallStrategyConfig(number_of_keys - 1)
+    verification_key_strategy = LatestVerificationKeyStrategy()
+
+    def manager(
+        session: ProfileSession,
+        storage: CountingStorage,
+        direct_json: bool = False,
+        concurrent_session_reads: bool = False,
+    ) -> DIDManager:
+        return DIDManager(
+            profile,
+            session.inject(BaseWallet),
+            storage,
+            recall_strategy_config,
+            direct_json=direct_json,
+            concurrent_session_reads=concurrent_session_reads,
+        )
+
+    async def get_diddoc(session, storage):
+        await manager(session, storage).get_diddoc(did)
+
+    async def get_diddoc_concurrent(session, storage):
+        await manager(session, storage, concurrent_session_reads=True).get_diddoc(did)
+
+    async def get_diddoc_json(session, storage):
+        await manager(session, storage).get_diddoc_json(did)
+
+    async def get_diddoc_json_direct(session, storage):
+        await manager(session, storage, direct_json=True).get_diddoc_json(did)
+
+    async def rotate_key(session, storage):
+        await manager(session, storage).rotate(did)
+
+    async def current_index(session, storage):
+        await StorageBackendStorageStrategy(storage).current_index(did)
+
+    async def verification_method_id(session, storage):
+        await verification_key_strategy.get_verification_method_id_for_did(did, session)
+
+    return {
+        "get_diddoc": get_diddoc,
+        "get_diddoc_concurrent": get_diddoc_concurrent,
+        "get_diddoc_json": get_diddoc_json,
+        "get_diddoc_json_direct": get_diddoc_json_direct,
+        "rotate_key": rotate_key,
+        "current_index": current_index,
+        "verification_method_id": verification_method_id,
+    }
+
+
+def _percentile(sorted_values: List[float], percentile: int) -> float:
+    # nearest rank
+    rank = math.ceil(percentile / 100 * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
@@ -1,14 +1,179 @@
+import asyncio
 import logging
+from typing import Set
 
+from aries_cloudagent.cache.base import BaseCache
 from aries_cloudagent.config.injection_context import InjectionContext
-from aries_cloudagent.wallet.default_verification_key_strategy import BaseVerificationKeyStrategy
+from aries_cloudagent.core.event_bus import Event, EventBus
+from aries_cloudagent.core.profile import Profile
+from aries_cloudagent.core.util import SHUTDOWN_EVENT_PATTERN, STARTUP_EVENT_PATTERN
+from aries_cloudagent.storage.base import BaseStorage
+from aries_cloudagent.wallet.default_verification_key_strategy import (
+    BaseVerificationKeyStrategy,
+)
 
+from didmanagement.caching import (
+    MEDIATION_EVENT_PATTERN,
+    DIDCacheVersions,
+    DIDDocCache,
+    KeyIndexCache,
+    RoutingInfoCache,
+    SharedDIDDocCache,
+    SharedKeyIndexCache,
+    on_key_rotated,
+)
+from didmanagement.concurrency import DIDLocks
+from didmanagement.config import DIDManagementConfig
+from didmanagement.events import KEY_ROTATED_EVENT_PATTERN
+from didmanagement.manager_factory import DIDManagerFactory
+from didmanagement.metrics import METRICS
+from didmanagement.tracing import TRACER, ConsoleSpanExporter, FileSpanExporter
 from didmanagement.verification_methods import LatestVerificationKeyStrategy
 
 logger = logging.getLogger(__name__)
 
+_sweeper_tasks: Set[asyncio.Task] = set()
+
 
 async def setup(context: InjectionContext):
     """Load LatestVerificationKeyStrategy plugin."""
+    config = DIDManagementConfig.from_settings(context.settings)
+    did_locks = DIDLocks()
+    context.injector.bind_instance(DIDLocks, did_locks)
+    if config.tracing.enabled:
+        logger.info(
+            "Tracing DID management operations to the %s", config.tracing.exporter
+        )
+        TRACER.configure(
+            FileSpanExporter(config.tracing.path)
+            if config.tracing.exporter == "file"
+            else ConsoleSpanExporter(),
+            config.tracing.sample_rate,
+        )
+    event_bus = context.inject_or(EventBus)
+    if config.tracing.enabled and event_bus:
+        event_bus.subscribe(SHUTDOWN_EVENT_PATTERN, _stop_tracing)
+
+    # Caches shared by the agent instances live in ACA-Py's BaseCache, under versioned
+    # keys
+    shared_cache = None
+    if config.diddoc_cache.shared or config.key_index_cache.shared:
+        shared_cache = context.inject_or(BaseCache)
+        if not shared_cache:
+            logger.warning("No BaseCache to share caches in, caching in process instead")
+    versions = DIDCacheVersions(shared_cache) if shared_cache else None
+
+    key_index_cache = None
+    if config.key_index_cache.enabled:
+        logger.info("Enabling the key index cache")
+        if config.key_index_cache.shared and versions:
+            key_index_cache = SharedKeyIndexCache(
+                shared_cache, versions, config.key_index_cache.ttl
+            )
+        else:
+            key_index_cache = KeyIndexCache(
+                config.key_index_cache.max_size, config.key_index_cache.ttl
+            )
+        context.injector.bind_instance(KeyIndexCache, key_index_cache)
+        METRICS.track_cache("key_index", key_index_cache)
+
+    diddoc_cache = None
+    if config.diddoc_cache.enabled:
+        logger.info("Enabling the DID document cache")
+        if config.diddoc_cache.shared and versions:
+            diddoc_cache = SharedDIDDocCache(
+                shared_cache, versions, config.diddoc_cache.ttl
+            )
+        else:
+            diddoc_cache = DIDDocCache(
+                config.diddoc_cache.max_size, config.diddoc_cache.ttl
+            )
+        context.injector.bind_instance(DIDDocCache, diddoc_cache)
+        METRICS.track_cache("diddoc", diddoc_cache)
+
+    if event_bus and (config.diddoc_cache.enabled or config.key_index_cache.enabled):
+        event_bus.subscribe(KEY_ROTATED_EVENT_PATTERN, on_key_rotated)
+
+    routing_info_cache = None
+    if config.routing_info_cache.enabled:
+        logger.info("Enabling the routing information cache")
+        routing_info_cache = RoutingInfoCache(config.routing_info_cache.ttl)
+        context.injector.bind_instance(RoutingInfoCache, routing_info_cache)
+        METRICS.track_cache("routing_info", routing_info_cache)
+
+        if event_bus:
+            event_bus.subscribe(
+                MEDIATION_EVENT_PATTERN, routing_info_cache.on_mediation_event
+            )
+        else:
+            logger.warning(
+                "No event bus, routing information is refreshed on expiry only"
+            )
+
+    # request handlers get their DID managers from here, with the state above
+    manager_factory = DIDManagerFactory(
+        config, diddoc_cache, routing_info_cache, did_locks
+    )
+    context.injector.bind_instance(DIDManagerFactory, manager_factory)
+
     logger.info("Loading LatestVerificationKeyStrategy in the context")
-    context.injector.bind_instance(BaseVerificationKeyStrategy, LatestVerificationKeyStrategy())
+    context.injector.bind_instance(
+        BaseVerificationKeyStrategy,
+        LatestVerificationKeyStrategy(key_index_cache, manager_factory),
+    )
+
+    # the packed layout also finds the histories it has yet to convert from their head
+    if event_bus:
+        event_bus.subscribe(STARTUP_EVENT_PATTERN, _migrate_key_history_heads)
+    else:
+        logger.warning("No event bus, key history heads are backfilled on access only")
+
+    retention = config.retention
+    if retention.sweep_interval > 0 and retention.policy().enabled:
+        if event_bus:
+            event_bus.subscribe(STARTUP_EVENT_PATTERN, _start_key_history_sweeper)
+            event_bus.subscribe(SHUTDOWN_EVENT_PATTERN, _stop_key_history_sweepers)
+        else:
+            logger.warning("No event bus, key histories are not swept in the background")
+
+
+async def _stop_tracing(profile: Profile, event: Event):
+    # spans still queued are written out
+    TRACER.configure(None)
+
+
+async def _migrate_key_history_heads(profile: Profile, event: Event):
+    from didmanagement.retention import migrate_key_history_heads
+
+    try:
+        async with profile.transaction() as transaction:
+            written = await migrate_key_history_heads(transaction.inject(BaseStorage))
+            await transaction.commit()
+    except Exception:
+        # DIDs without a head still get one backfilled on first access
+        logger.exception("Could not backfill key history heads")
+        return
+    if written:
+        logger.info("Backfilled %s key history heads", written)
+
+
+async def _start_key_history_sweeper(profile: Profile, event: Event):
+    from didmanagement.retention import KeyHistorySweeper
+
+    retention = DIDManagementConfig.from_settings(profile.settings).retention
+    sweeper = KeyHistorySweeper(
+        profile, retention.policy(), retention.batch_size, retention.pause
+    )
+    logger.info("Sweeping key histories every %s seconds", retention.sweep_interval)
+
+    # the event loop only keeps weak references to tasks
+    task = asyncio.ensure_future(
+        sweeper.run_periodically(retention.sweep_interval, retention.dry_run)
+    )
+    _sweeper_tasks.add(task)
+    task.add_done_callback(_sweeper_tasks.discard)
+
+
+async def _stop_key_history_sweepers(profile: Profile, event: Event):
+    for task in list(_sweeper_tasks):
+        task.cancel()
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from aries_cloudagent.core.error import BaseError
+from aries_cloudagent.core.profile import Profile, ProfileSession
+from pydid import DIDDocument
+
+from didmanagement.concurrency import DIDLocks
+from didmanagement.did_manager import DIDManager, KeyRotation, UnknownDIDException
+from didmanagement.events import notify_key_rotated
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RotationOutcome:
+    did: str
+    rotation: Optional[KeyRotation] = None
+    diddoc: Optional[DIDDocument] = None
+    error: Optional[str] = None
+
+    @property
+    def rotated(self) -> bool:
+        return self.rotation is not None
+
+
+class BulkKeyRotator:
+    """Rotate the keys of many DIDs, in concurrently committed chunks."""
+
+    def __init__(
+        self,
+        profile: Profile,
+        manager_factory: Callable[[ProfileSession], DIDManager],
+        concurrency: int = 4,
+        chunk_size: int = 10,
+        include_diddocs: bool = True,
+        did_locks: DIDLocks = None,
+    ):
+        """
+        :param profile: profile owning the DIDs
+        :param manager_factory: builds a DIDManager operating within a transaction
+        :param concurrency: number of chunks being rotated at the same time
+        :param chunk_size: number of DIDs rotated within a single transaction
+        :param include_diddocs: whether to build the new DIDDocument of rotated DIDs
+        :param did_locks: locks of the DIDs, those of the managers built by the factory
+        """
+        self.__profile = profile
+        self.__manager_factory = manager_factory
+        self.__semaphore = asyncio.Semaphore(max(concurrency, 1))
+        self.__chunk_size = max(chunk_size, 1)
+        self.__include_diddocs = include_diddocs
+        self.__did_locks = did_locks or DIDLocks()
+
+    async def rotate(self, dids: List[str]) -> List[RotationOutcome]:
+        """
+        :param dids: DIDs to rotate the key of, duplicates are rotated once
+        :return: the outcome for every DID, in the order they were given
+        """
+        unique_dids = list(dict.fromkeys(dids))
+        chunks = [
+            unique_dids[i : i + self.__chunk_size]
+            for i in range(0, len(unique_dids), self.__chunk_size)
+        ]
+
+        outcomes: Dict[str, RotationOutcome] = {}
+        # a chunk failing as a whole must not hide what the others committed
+        for chunk, chunk_outcomes in zip(
+            chunks,
+            await asyncio.gather(
+                *(self._rotate_chunk(chunk) for chunk in chunks), return_exceptions=True
+            ),
+        ):
+            if isinstance(chunk_outcomes, Exception):
+                logger.error(
+                    "Could not rotate keys of %s", chunk, exc_info=chunk_outcomes
+                )
+                chunk_outcomes = {
+                    did: RotationOutcome(did, error=_error_reason(chunk_outcomes))
+                    for did in chunk
+                }
+            elif isinstance(chunk_outcomes, BaseException):
+                raise chunk_outcomes
+            outcomes.update(chunk_outcomes)
+
+        return [outcomes[did] for did in unique_dids]
+
+    async def _rotate_chunk(self, chunk: List[str]) -> Dict[str, RotationOutcome]:
+        outcomes: Dict[str, RotationOutcome] = {}
+        pending = list(chunk)
+
+        # Rotations of the chunk's DIDs wait until it commits, to read the keys it stored
+        async with self.__semaphore, self.__did_locks.hold(
+            self.__profile.settings.get("wallet.id"), chunk
+        ):
+            # A failing DID rolls its chunk back, the others are retried without it
+            while pending:
+                rotated: Dict[str, RotationOutcome] = {}
+                failed: Optional[RotationOutcome] = None
+
+                async with self.__profile.transaction() as transaction:
+                    manager = self.__manager_factory(transaction)
+                    for did in pending:
+                        try:
+                            rotated[did] = await self._rotate_did(manager, did)
+                        except Exception as e:
+                            if not isinstance(e, (UnknownDIDException, BaseError)):
+                                logger.exception("Could not rotate key of %s", did)
+                            failed = RotationOutcome(did, error=_error_reason(e))
+                            break
+
+                    if failed:
+                        await transaction.rollback()
+                    else:
+                        await transaction.commit()
+
+                if failed:
+                    logger.warning(
+                        "Could not rotate key of %s: %s", failed.did, failed.error
+                    )
+                    outcomes[failed.did] = failed
+                    pending.remove(failed.did)
+                else:
+                    outcomes.update(rotated)
+                    pending = []
+
+        for outcome in outcomes.values():
+            if outcome.rotated:
+                try:
+                    await notify_key_rotated(self.__profile, outcome.rotation)
+                except Exception:
+                    # the rotation is committed, only its subscribers missed it
+                    logger.exception("Could not publish key rotation of %s", outcome.did)
+
+        return outcomes
+
+    async def _rotate_did(self, manager: DIDManager, did: str) -> RotationOutcome:
+        rotation, diddoc = await manager.rotate(did, build_diddoc=self.__include_diddocs)
+        return RotationOutcome(did, rotation, diddoc)
+
+
+def _error_reason(error: Exception) -> str:
+    if isinstance(error, UnknownDIDException):
+        return "Unknown DID"
+    return str(error) or error.__class__.__name__
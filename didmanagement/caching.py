@@ -0,0 +1,459 @@
+import logging
+import math
+import re
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from aries_cloudagent.cache.base import BaseCache
+from aries_cloudagent.core.event_bus import Event
+from aries_cloudagent.core.profile import Profile
+
+logger = logging.getLogger(__name__)
+
+DIDDocCacheKey = Tuple[Optional[str], str, int, str]
+# serialized document and its ETag
+CachedDIDDoc = List[str]
+RoutingInformation = Tuple[Optional[List[str]], str]
+
+# Mediation records emit events on every state change,
+# e.g. acapy::record::mediation::granted
+MEDIATION_EVENT_PATTERN = re.compile("^acapy::record::mediation(::.*)?$")
+
+
+class DIDInvalidations:
+    """
+    When the DIDs cached in a process were last invalidated, in invalidation order.
+
+    Readers take the generation before reading what they cache, and only cache it if the
+    DID was not invalidated since: a rotation committed in between would be undone.
+    """
+
+    def __init__(self, max_size: int):
+        self.__max_size = max_size
+        self.__generation = 0
+        self.__invalidated_at: "OrderedDict[Hashable, int]" = OrderedDict()
+        # latest generation of the DIDs forgotten, which may have been invalidated then
+        self.__forgotten_at = 0
+
+    @property
+    def generation(self) -> int:
+        return self.__generation
+
+    def invalidate(self, key: Hashable):
+        self.__generation += 1
+        self.__invalidated_at[key] = self.__generation
+        self.__invalidated_at.move_to_end(key)
+        while len(self.__invalidated_at) > self.__max_size:
+            _, self.__forgotten_at = self.__invalidated_at.popitem(last=False)
+
+    def invalidated_since(self, key: Hashable, generation: int) -> bool:
+        return self.__invalidated_at.get(key, self.__forgotten_at) > generation
+
+
+class DIDDocCache:
+    """Size bounded, time limited cache of serialized DID documents and their ETag."""
+
+    def __init__(
+        self,
+        max_size: int = 1000,
+        ttl: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.__max_size = max_size
+        self.__ttl = ttl
+        self.__clock = clock
+        self.__entries: "OrderedDict[DIDDocCacheKey, Tuple[float, CachedDIDDoc]]" = (
+            OrderedDict()
+        )
+        # all the cached variants of a DID, to invalidate them together
+        self.__keys_by_did: Dict[Tuple[Optional[str], str], Set[DIDDocCacheKey]] = {}
+        self.__invalidations = DIDInvalidations(max_size)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def generation(self, wallet_id: Optional[str], did: str) -> Hashable:
+        """
+        State of the cached DID, to be taken before reading what is cached.
+        :param wallet_id:
+        :param did:
+        :return: what get and set are to be given
+        """
+        return self.__invalidations.generation
+
+    async def get(
+        self,
+        wallet_id: Optional[str],
+        did: str,
+        number_of_keys: int,
+        verification_method_type: str,
+        generation: Hashable = None,
+    ) -> Optional[CachedDIDDoc]:
+        key = (wallet_id, did, number_of_keys, verification_method_type)
+        entry = self.__entries.get(key)
+        if entry is None or entry[0] <= self.__clock():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+        self.__entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    async def set(
+        self,
+        wallet_id: Optional[str],
+        did: str,
+        number_of_keys: int,
+        verification_method_type: str,
+        document: CachedDIDDoc,
+        generation: Hashable = None,
+    ):
+        """
+        :param wallet_id:
+        :param did:
+        :param number_of_keys:
+        :param verification_method_type:
+        :param document:
+        :param generation: taken before the document was built, it is left out when the
+        DID was invalidated since
+        """
+        if generation is not None and self.__invalidations.invalidated_since(
+            _did_key(wallet_id, did), generation
+        ):
+            return
+
+        key = (wallet_id, did, number_of_keys, verification_method_type)
+        self.__entries[key] = (self.__clock() + self.__ttl, document)
+        self.__entries.move_to_end(key)
+        self.__keys_by_did.setdefault(_did_key(wallet_id, did), set()).add(key)
+
+        while len(self.__entries) > self.__max_size:
+            oldest_key = next(iter(self.__entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    async def invalidate(self, wallet_id: Optional[str], did: str):
+        """Drop every cached document of a DID, whatever the options it was built with."""
+        self.__invalidations.invalidate(_did_key(wallet_id, did))
+        for key in self.__keys_by_did.pop(_did_key(wallet_id, did), set()):
+            self.__entries.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.__entries),
+            "max_size": self.__max_size,
+        }
+
+    def _remove(self, key: DIDDocCacheKey):
+        self.__entries.pop(key, None)
+        did_keys = self.__keys_by_did.get(_did_key(key[0], key[1]))
+        if did_keys is not None:
+            did_keys.discard(key)
+            if not did_keys:
+                del self.__keys_by_did[_did_key(key[0], key[1])]
+
+
+class KeyIndexCache:
+    """Size bounded, time limited cache of the current key index of DIDs."""
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        ttl: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.__max_size = max_size
+        self.__ttl = ttl
+        self.__clock = clock
+        self.__entries: "OrderedDict[Tuple[Optional[str], str], Tuple[float, int]]" = (
+            OrderedDict()
+        )
+        self.__invalidations = DIDInvalidations(max_size)
+        self.hits = 0
+        self.misses = 0
+
+    async def generation(self, wallet_id: Optional[str], did: str) -> Hashable:
+        """State of the cached DID, to be taken before reading its key history."""
+        return self.__invalidations.generation
+
+    async def get(
+        self, wallet_id: Optional[str], did: str, generation: Hashable = None
+    ) -> Optional[int]:
+        # the key history is tagged with the DID as given, prefixed forms are not merged
+        key = (wallet_id, did)
+        entry = self.__entries.get(key)
+        if entry is None or entry[0] <= self.__clock():
+            self.__entries.pop(key, None)
+            self.misses += 1
+            return None
+
+        self.__entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    async def set(
+        self, wallet_id: Optional[str], did: str, index: int, generation: Hashable = None
+    ):
+        key = (wallet_id, did)
+        # read before a rotation committed since, the index would be the previous one
+        if generation is not None and self.__invalidations.invalidated_since(
+            key, generation
+        ):
+            return
+
+        self.__entries[key] = (self.__clock() + self.__ttl, index)
+        self.__entries.move_to_end(key)
+
+        while len(self.__entries) > self.__max_size:
+            self.__entries.popitem(last=False)
+
+    async def invalidate(self, wallet_id: Optional[str], did: str):
+        self.__invalidations.invalidate((wallet_id, did))
+        self.__entries.pop((wallet_id, did), None)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.__entries),
+            "max_size": self.__max_size,
+        }
+
+
+class DIDCacheVersions:
+    """
+    Version of the cached state of each DID, in a cache shared by the agent instances.
+
+    Cached entries are keyed by version, bumping it makes every instance miss them.
+    """
+
+    PREFIX = "didmanagement::version"
+
+    def __init__(self, cache: BaseCache):
+        self.__cache = cache
+
+    async def current(self, wallet_id: Optional[str], did: str) -> str:
+        key = self._key(wallet_id, did)
+        version = await self.__cache.get(key)
+        if version is None:
+            # never trust entries cached before the version got lost
+            version = await self.bump(wallet_id, did)
+        return version
+
+    async def bump(self, wallet_id: Optional[str], did: str) -> str:
+        # unique rather than incremented, concurrent bumps cannot end on a known version
+        version = uuid.uuid4().hex
+        await self.__cache.set(self._key(wallet_id, did), version)
+        return version
+
+    def _key(self, wallet_id: Optional[str], did: str) -> str:
+        return f"{self.PREFIX}::{wallet_id}::{_normalized_did(did)}"
+
+
+class SharedDIDDocCache(DIDDocCache):
+    """Cache of serialized DID documents held in ACA-Py's (possibly shared) BaseCache."""
+
+    # apart from the entries of the versions caching the document alone
+    PREFIX = "didmanagement::diddoc-etag"
+
+    def __init__(self, cache: BaseCache, versions: DIDCacheVersions, ttl: float = 300.0):
+        super().__init__(ttl=ttl)
+        self.__cache = cache
+        self.__versions = versions
+        self.__ttl = ttl
+
+    async def generation(self, wallet_id: Optional[str], did: str) -> Hashable:
+        return await self.__versions.current(wallet_id, did)
+
+    async def get(
+        self,
+        wallet_id: Optional[str],
+        did: str,
+        number_of_keys: int,
+        verification_method_type: str,
+        generation: Hashable = None,
+    ) -> Optional[CachedDIDDoc]:
+        key = await self._key(
+            wallet_id, did, number_of_keys, verification_method_type, generation
+        )
+        document = await self.__cache.get(key)
+        if document is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return document
+
+    async def set(
+        self,
+        wallet_id: Optional[str],
+        did: str,
+        number_of_keys: int,
+        verification_method_type: str,
+        document: CachedDIDDoc,
+        generation: Hashable = None,
+    ):
+        # under the version the document was built at, a newer one never serves it
+        key = await self._key(
+            wallet_id, did, number_of_keys, verification_method_type, generation
+        )
+        await self.__cache.set(key, document, _ttl(self.__ttl))
+
+    async def invalidate(self, wallet_id: Optional[str], did: str):
+        await self.__versions.bump(wallet_id, did)
+
+    def stats(self) -> dict:
+        # the entries live in the shared cache, only this instance's counters are known
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": None,
+            "size": None,
+            "max_size": None,
+        }
+
+    async def _key(
+        self,
+        wallet_id: Optional[str],
+        did: str,
+        number_of_keys: int,
+        verification_method_type: str,
+        version: Hashable = None,
+    ) -> str:
+        if version is None:
+            version = await self.__versions.current(wallet_id, did)
+        return (
+            f"{self.PREFIX}::{wallet_id}::{_normalized_did(did)}::{version}"
+            f"::{number_of_keys}::{verification_method_type}"
+        )
+
+
+class SharedKeyIndexCache(KeyIndexCache):
+    """Cache of the current key index of DIDs in ACA-Py's (possibly shared) BaseCache."""
+
+    PREFIX = "didmanagement::key-index"
+
+    def __init__(self, cache: BaseCache, versions: DIDCacheVersions, ttl: float = 3600.0):
+        super().__init__(ttl=ttl)
+        self.__cache = cache
+        self.__versions = versions
+        self.__ttl = ttl
+
+    async def generation(self, wallet_id: Optional[str], did: str) -> Hashable:
+        return await self.__versions.current(wallet_id, did)
+
+    async def get(
+        self, wallet_id: Optional[str], did: str, generation: Hashable = None
+    ) -> Optional[int]:
+        index = await self.__cache.get(await self._key(wallet_id, did, generation))
+        if index is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return index
+
+    async def set(
+        self, wallet_id: Optional[str], did: str, index: int, generation: Hashable = None
+    ):
+        await self.__cache.set(
+            await self._key(wallet_id, did, generation), index, _ttl(self.__ttl)
+        )
+
+    async def invalidate(self, wallet_id: Optional[str], did: str):
+        await self.__versions.bump(wallet_id, did)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": None, "max_size": None}
+
+    async def _key(
+        self, wallet_id: Optional[str], did: str, version: Hashable = None
+    ) -> str:
+        if version is None:
+            version = await self.__versions.current(wallet_id, did)
+        # the key history is tagged with the DID as given, prefixed forms are not merged
+        return f"{self.PREFIX}::{wallet_id}::{did}::{version}"
+
+
+class RoutingInfoCache:
+    """Time limited cache of the routing keys and endpoint of each wallet."""
+
+    def __init__(self, ttl: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        self.__ttl = ttl
+        self.__clock = clock
+        self.__entries: Dict[Optional[str], Tuple[float, RoutingInformation]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, wallet_id: Optional[str]) -> Optional[RoutingInformation]:
+        entry = self.__entries.get(wallet_id)
+        if entry is None or entry[0] <= self.__clock():
+            self.__entries.pop(wallet_id, None)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry[1]
+
+    async def set(
+        self, wallet_id: Optional[str], routing_information: RoutingInformation
+    ):
+        self.__entries[wallet_id] = (self.__clock() + self.__ttl, routing_information)
+
+    async def invalidate(self, wallet_id: Optional[str]):
+        self.__entries.pop(wallet_id, None)
+
+    async def clear(self):
+        self.__entries.clear()
+
+    async def on_mediation_event(self, profile: Profile, event: Event):
+        """Drop the routing information of a wallet whose mediation state changed."""
+        logger.debug(
+            "Mediation changed (%s), refreshing routing information", event.topic
+        )
+        wallet_id = profile.settings.get("wallet.id")
+        if wallet_id is None:
+            # the root profile holds the base mediation the sub-wallets route through
+            await self.clear()
+        else:
+            await self.invalidate(wallet_id)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.__entries)}
+
+
+async def invalidate_did_caches(profile: Profile, did: str):
+    """Drop what is cached about a DID after a change was committed, if caching is on."""
+    wallet_id = profile.settings.get("wallet.id")
+
+    diddoc_cache = profile.inject_or(DIDDocCache)
+    if diddoc_cache:
+        await diddoc_cache.invalidate(wallet_id, did)
+
+    key_index_cache = profile.inject_or(KeyIndexCache)
+    if key_index_cache:
+        await key_index_cache.invalidate(wallet_id, did)
+
+
+async def on_key_rotated(profile: Profile, event: Event):
+    """Invalidate the caches of a DID whose key rotation was committed."""
+    await invalidate_did_caches(profile, event.payload["did"])
+
+
+def _did_key(wallet_id: Optional[str], did: str) -> Tuple[Optional[str], str]:
+    return wallet_id, _normalized_did(did)
+
+
+def _normalized_did(did: str) -> str:
+    # "did:sov:" prefixed and unprefixed forms designate the same wallet DID
+    return did.replace("did:sov:", "")
+
+
+def _ttl(ttl: float) -> int:
+    # shared cache implementations expect whole seconds
+    return max(math.ceil(ttl), 1)
@@ -0,0 +1,63 @@
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import AsyncIterator, Iterable, Optional, Tuple
+from weakref import WeakValueDictionary
+
+
+class DIDLock:
+    """Lock of a DID, which the task holding it may take again."""
+
+    __slots__ = ("__lock", "__owner", "__depth", "__weakref__")
+
+    def __init__(self):
+        self.__lock = asyncio.Lock()
+        self.__owner: Optional[asyncio.Task] = None
+        self.__depth = 0
+
+    def locked(self) -> bool:
+        return self.__lock.locked()
+
+    async def __aenter__(self):
+        task = asyncio.current_task()
+        if self.__owner is not task:
+            await self.__lock.acquire()
+            self.__owner = task
+        self.__depth += 1
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.__depth -= 1
+        if not self.__depth:
+            self.__owner = None
+            self.__lock.release()
+
+
+class DIDLocks:
+    """In-process locks serializing the operations changing a DID's keys."""
+
+    def __init__(self):
+        # a lock lives as long as someone holds or waits for it
+        self.__locks: "WeakValueDictionary[Tuple[Optional[str], str], DIDLock]" = (
+            WeakValueDictionary()
+        )
+
+    def lock(self, wallet_id: Optional[str], did: str) -> DIDLock:
+        key = (wallet_id, did.replace("did:sov:", ""))
+        lock = self.__locks.get(key)
+        if lock is None:
+            lock = DIDLock()
+            self.__locks[key] = lock
+        return lock
+
+    @asynccontextmanager
+    async def hold(
+        self, wallet_id: Optional[str], dids: Iterable[str]
+    ) -> AsyncIterator[None]:
+        """
+        Hold the locks of several DIDs, e.g. until the transaction changing them commits.
+
+        Locks are taken in the same order by every holder, so that none of them deadlock.
+        """
+        async with AsyncExitStack() as stack:
+            for did in sorted({did.replace("did:sov:", "") for did in dids}):
+                await stack.enter_async_context(self.lock(wallet_id, did))
+            yield
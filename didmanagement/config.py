@@ -0,0 +1,133 @@
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Mapping, Optional
+
+if TYPE_CHECKING:
+    from didmanagement.retention import RetentionPolicy
+
+PLUGIN_CONFIG_KEY = "didmanagement"
+
+
+@dataclass
+class DIDDocCacheConfig:
+    enabled: bool = False
+    # held in ACA-Py's BaseCache, to be consistent across agent instances
+    shared: bool = False
+    max_size: int = 1000
+    ttl: float = 300.0
+
+
+@dataclass
+class DIDDocEndpointConfig:
+    # clients may keep the document, but must revalidate it with its ETag
+    cache_control: str = "no-cache"
+    # render documents straight to JSON, without building and validating pydid models
+    direct_json: bool = False
+    # read the wallet entry and key history of a DID concurrently, on storages whose
+    # sessions can be used by concurrent tasks; routing information is always read aside
+    concurrent_session_reads: bool = False
+
+
+@dataclass
+class KeyIndexCacheConfig:
+    enabled: bool = False
+    shared: bool = False
+    max_size: int = 10000
+    ttl: float = 3600.0
+
+
+@dataclass
+class RoutingInfoCacheConfig:
+    enabled: bool = False
+    ttl: float = 60.0
+
+
+@dataclass
+class BulkRotationConfig:
+    max_concurrency: int = 4
+    chunk_size: int = 10
+
+
+@dataclass
+class RouteRegistrationConfig:
+    # keys sent to the mediator per keylist update when registering routes in bulk
+    keylist_chunk_size: int = 100
+
+
+@dataclass
+class TracingConfig:
+    enabled: bool = False
+    # "console" logs the spans, "file" appends them to `path`, as OTLP/JSON lines
+    exporter: str = "console"
+    path: str = "didmanagement-spans.jsonl"
+    sample_rate: float = 1.0
+
+
+@dataclass
+class KeyHistoryConfig:
+    # "records" keeps one record per previous key, "packed" one record per DID
+    layout: str = "records"
+
+
+@dataclass
+class RetentionConfig:
+    # previous keys kept: the last `keep_last` and/or those younger than `max_age_days`
+    keep_last: Optional[int] = None
+    max_age_days: Optional[float] = None
+    # seconds between background sweeps, none are run when 0
+    sweep_interval: float = 0
+    batch_size: int = 100
+    pause: float = 0.1
+    dry_run: bool = False
+
+    def policy(self) -> "RetentionPolicy":
+        # the storage layer is only loaded once retention is used
+        from didmanagement.retention import RetentionPolicy
+
+        return RetentionPolicy(
+            keep_last=self.keep_last,
+            max_age=self.max_age_days * 86400 if self.max_age_days is not None else None,
+        )
+
+
+@dataclass
+class DIDManagementConfig:
+    """Plugin settings, from the `didmanagement` section of ACA-Py's plugin config."""
+
+    diddoc_cache: DIDDocCacheConfig = field(default_factory=DIDDocCacheConfig)
+    diddoc_endpoint: DIDDocEndpointConfig = field(default_factory=DIDDocEndpointConfig)
+    key_index_cache: KeyIndexCacheConfig = field(default_factory=KeyIndexCacheConfig)
+    routing_info_cache: RoutingInfoCacheConfig = field(
+        default_factory=RoutingInfoCacheConfig
+    )
+    bulk_rotation: BulkRotationConfig = field(default_factory=BulkRotationConfig)
+    route_registration: RouteRegistrationConfig = field(
+        default_factory=RouteRegistrationConfig
+    )
+    retention: RetentionConfig = field(default_factory=RetentionConfig)
+    key_history: KeyHistoryConfig = field(default_factory=KeyHistoryConfig)
+    tracing: TracingConfig = field(default_factory=TracingConfig)
+
+    @classmethod
+    def from_settings(cls, settings: Mapping[str, Any]) -> "DIDManagementConfig":
+        plugin_config = (settings.get("plugin_config") or {}).get(PLUGIN_CONFIG_KEY) or {}
+        return cls(
+            diddoc_cache=DIDDocCacheConfig(**(plugin_config.get("diddoc_cache") or {})),
+            diddoc_endpoint=DIDDocEndpointConfig(
+                **(plugin_config.get("diddoc_endpoint") or {})
+            ),
+            key_index_cache=KeyIndexCacheConfig(
+                **(plugin_config.get("key_index_cache") or {})
+            ),
+            routing_info_cache=RoutingInfoCacheConfig(
+                **(plugin_config.get("routing_info_cache") or {})
+            ),
+            bulk_rotation=BulkRotationConfig(
+                **(plugin_config.get("bulk_rotation") or {})
+            ),
+            route_registration=RouteRegistrationConfig(
+                **(plugin_config.get("route_registration") or {})
+            ),
+            retention=RetentionConfig(**(plugin_config.get("retention") or {})),
+            key_history=KeyHistoryConfig(**(plugin_config.get("key_history") or {})),
+            tracing=TracingConfig(**(plugin_config.get("tracing") or {})),
+        )
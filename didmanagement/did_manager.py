@@ -1,9 +1,11 @@
-import logging
+import asyncio
+import hashlib
+import json
 from dataclasses import dataclass
 import itertools
-from typing import Iterable, Tuple, List, cast, Callable
+from functools import lru_cache
+from typing import Awaitable, Dict, Iterable, Optional, Tuple, List, Union, cast, Callable
 
-import base58
 from aries_cloudagent.core.profile import Profile
 from aries_cloudagent.did.did_key import DIDKey
 from aries_cloudagent.protocols.coordinate_mediation.v1_0.route_manager import (
@@ -15,13 +17,29 @@ from aries_cloudagent.wallet.did_info import DIDInfo
 from aries_cloudagent.wallet.error import WalletNotFoundError
 from aries_cloudagent.wallet.key_type import ED25519
 
-from pydid import DIDDocumentBuilder, DIDUrl
-from pydid.verification_method import VerificationMethod
+from pydid import DIDDocument, DIDDocumentBuilder, DIDUrl
+from pydid.verification_method import Ed25519VerificationKey2018, VerificationMethod
 
-from didmanagement.retention import StorageBackendStorageStrategy, NumberOfKeysStrategy
+from didmanagement.caching import DIDDocCache, RoutingInfoCache
+from didmanagement.concurrency import DIDLocks
+from didmanagement.diddoc_json import can_render, render_diddoc_json
+from didmanagement.key_encodings import KeyEncodings, decode_verkey
+from didmanagement.metrics import METRICS
+from didmanagement.retention import (
+    KeyHistoryHead,
+    KeyHistorySnapshot,
+    NumberOfKeysStrategy,
+    StorageBackendStorageStrategy,
+    StorageStrategy,
+)
+from didmanagement.tracing import TRACER, traced
 from didmanagement.verification_methods import Did, ed25519_verification_key_2018
 
 
+# bumped whenever the same inputs come to be rendered differently
+DIDDOC_ETAG_VERSION = 1
+
+
 class UnknownDIDException(Exception):
     """When trying to operate on an unknown DID."""
 
@@ -31,6 +49,15 @@ class RecallStrategyConfig:
     number_of_keys: int = 0
 
 
+@dataclass(frozen=True)
+class KeyRotation:
+    did: str
+    old_index: int
+    new_index: int
+    old_verkey: str
+    new_verkey: str
+
+
 class DIDManager:
     def __init__(
         self,
@@ -38,18 +65,30 @@ class DIDManager:
         wallet: BaseWallet,
         storage: BaseStorage,
         recall_strategy_config: RecallStrategyConfig = None,
+        diddoc_cache: DIDDocCache = None,
+        did_locks: DIDLocks = None,
+        routing_info_cache: RoutingInfoCache = None,
+        storage_strategy: StorageStrategy = None,
+        direct_json: bool = False,
+        concurrent_session_reads: bool = False,
     ):
         self.__profile = profile
-        self.__wallet = wallet
+        self.__wallet = traced(wallet, "wallet")
         self.__storage = storage
-        self.__storage_strategy = StorageBackendStorageStrategy(self.__storage)
-        self.__recall_strategy = (
-            NumberOfKeysStrategy(
-                self.__storage_strategy, recall_strategy_config.number_of_keys
-            )
-            if recall_strategy_config
-            else NumberOfKeysStrategy(self.__storage_strategy, 0)
+        self.__storage_strategy = storage_strategy or StorageBackendStorageStrategy(
+            self.__storage
+        )
+        self.__number_of_keys = (
+            recall_strategy_config.number_of_keys if recall_strategy_config else 0
+        )
+        self.__recall_strategy = NumberOfKeysStrategy(
+            self.__storage_strategy, self.__number_of_keys
         )
+        self.__diddoc_cache = diddoc_cache
+        self.__did_locks = did_locks or DIDLocks()
+        self.__routing_info_cache = routing_info_cache
+        self.__direct_json = direct_json
+        self.__concurrent_session_reads = concurrent_session_reads
 
         self.__verification_method_factory = ed25519_verification_key_2018
 
@@ -57,13 +96,15 @@ class DIDManager:
         self,
         did: str,
         verification_method_factory: Callable[
-            [Did, int, bytes], VerificationMethod
+            [Did, int, bytes, KeyEncodings], VerificationMethod
         ] = None,
+        key_history: KeyHistorySnapshot = None,
     ):
         """
         Generate a DIDDocument for a given DID
         :param did:
         :param verification_method_factory:
+        :param key_history: key history already loaded for this operation, if any
         :return: a w3c compliant DID Document
         """
         verification_method_factory = (
@@ -72,90 +113,469 @@ class DIDManager:
             else verification_method_factory
         )
 
-        # fetch did with current key
-        did_info, signing_key = await self._get_did_and_signing_key(did)
+        # fetch did with current key, n previous keys and routing information
+        (did_info, signing_key), key_history, routing_information = await self._resolve(
+            did, key_history
+        )
+        with METRICS.stage("diddoc_build"), TRACER.span("diddoc_build"):
+            return _build_diddoc(
+                did,
+                signing_key,
+                key_history,
+                routing_information,
+                verification_method_factory,
+                signing_key_encodings=decode_verkey(did_info.verkey)[1],
+            )
 
-        # Also retrieve n previous keys and build complete key list
-        previous_keys = await self.__recall_strategy.previous_keys(did)
-        keys_with_indices = [
-            (await self.__storage_strategy.current_index(did), signing_key)
-        ]
-        keys_with_indices.extend(
-            [(previous_key.index, previous_key.key) for previous_key in previous_keys]
+    async def get_diddocs(
+        self,
+        dids: List[str],
+        verification_method_factory: Callable[
+            [Did, int, bytes, KeyEncodings], VerificationMethod
+        ] = None,
+    ) -> Dict[str, Union[DIDDocument, UnknownDIDException]]:
+        """
+        Generate the DIDDocuments of several DIDs, sharing routing information and
+        key history reads between them
+        :param dids:
+        :param verification_method_factory:
+        :return: the DID Document, or the reason it could not be built, of every given DID
+        """
+        verification_method_factory = (
+            self.__verification_method_factory
+            if verification_method_factory is None
+            else verification_method_factory
         )
 
-        # Build diddoc
-        did_doc_builder = DIDDocumentBuilder(did, controller=[did])
+        # one entry per distinct DID, in the order they were asked for
+        diddocs: Dict[str, Union[DIDDocument, UnknownDIDException]] = dict.fromkeys(dids)
+        signing_keys: Dict[str, Tuple[DIDInfo, bytes]] = {}
 
-        verification_methods_and_contexts = [
-            verification_method_factory(did, key_index, key)
-            for key_index, key in keys_with_indices
-        ]
-        verification_methods, contexts = zip(*verification_methods_and_contexts)
-        # flat map the contexts and eliminate duplicate entries
-        contexts = list(set(itertools.chain.from_iterable(contexts)))
-
-        # add contexts required by the verification methods
-        did_doc_builder.context.extend(contexts)
-        did_doc_builder.verification_method.methods.extend(verification_methods)
-
-        # reference the keys in the other sections
-        all_key_references = _build_key_references(did, keys_with_indices)
-        did_doc_builder.authentication.methods.extend(all_key_references)
-        did_doc_builder.assertion_method.methods.extend(all_key_references)
-
-        # add routing information
-        routing_keys, endpoint = await self._retrieve_routing_information()
-        did_doc_builder.service.add_didcomm(
-            endpoint,
-            recipient_keys=[did_doc_builder.verification_method.methods[0]],
-            routing_keys=[
-                DIDKey.from_public_key_b58(key, key_type=ED25519).did
-                for key in routing_keys
-            ]
-            if routing_keys is not None
-            else [],
+        async def did_reads() -> Dict[str, KeyHistorySnapshot]:
+            for did in diddocs:
+                try:
+                    signing_keys[did] = await self._get_did_and_signing_key(did)
+                except UnknownDIDException as e:
+                    diddocs[did] = e
+            return await self.load_key_histories(list(signing_keys))
+
+        key_histories, routing_information = await _concurrently(
+            did_reads(), self._retrieve_routing_information()
+        )
+        for did, (did_info, signing_key) in signing_keys.items():
+            with METRICS.stage("diddoc_build"), TRACER.span("diddoc_build"):
+                diddocs[did] = _build_diddoc(
+                    did,
+                    signing_key,
+                    key_histories[did],
+                    routing_information,
+                    verification_method_factory,
+                    signing_key_encodings=decode_verkey(did_info.verkey)[1],
+                )
+
+        return diddocs
+
+    async def get_diddoc_json(
+        self,
+        did: str,
+        verification_method_factory: Callable[
+            [Did, int, bytes, KeyEncodings], VerificationMethod
+        ] = None,
+    ) -> str:
+        """
+        Serialized DIDDocument for a given DID, served from the cache when there is one
+        :param did:
+        :param verification_method_factory:
+        :return: the JSON of a w3c compliant DID Document
+        """
+        diddoc_json, _ = await self.get_diddoc_json_with_etag(
+            did, verification_method_factory
         )
+        return diddoc_json
 
-        return did_doc_builder.build()
+    async def get_diddoc_json_with_etag(
+        self,
+        did: str,
+        verification_method_factory: Callable[
+            [Did, int, bytes, KeyEncodings], VerificationMethod
+        ] = None,
+        is_current: Callable[[str], bool] = None,
+    ) -> Tuple[Optional[str], str]:
+        """
+        Serialized DIDDocument for a given DID along with its strong entity tag
+
+        The tag is derived from what the document is made of, a document the client
+        already has is neither built nor serialized. Cached documents keep the tag they
+        were built with.
+        :param did:
+        :param verification_method_factory:
+        :param is_current: whether the client has the document of a given ETag
+        :return: the JSON of the document, None when the client's is current, and its
+        quoted ETag
+        """
+        verification_method_factory = (
+            verification_method_factory or self.__verification_method_factory
+        )
+        cache_key, generation = None, None
+        if self.__diddoc_cache is not None:
+            wallet_id = self.__profile.settings.get("wallet.id")
+            cache_key = (
+                wallet_id,
+                did,
+                self.__number_of_keys,
+                verification_method_factory.__name__,
+            )
+            # taken first, a document read before a rotation committed is not cached
+            generation = await self.__diddoc_cache.generation(wallet_id, did)
+            cached = await self.__diddoc_cache.get(*cache_key, generation=generation)
+            if cached is not None:
+                diddoc_json, etag = cached
+                return _unless_current(diddoc_json, etag, is_current)
+
+        (did_info, signing_key), head, routing_information = await self._resolve_head(did)
+        etag = diddoc_etag(
+            did,
+            did_info.verkey,
+            head,
+            routing_information,
+            self.__number_of_keys,
+            verification_method_factory.__name__,
+        )
+        if is_current is not None and is_current(etag):
+            return None, etag
+
+        diddoc_json = await self._diddoc_json(
+            did,
+            verification_method_factory,
+            (did_info, signing_key),
+            await self.load_key_history(did, head),
+            routing_information,
+        )
+        if cache_key is not None:
+            await self.__diddoc_cache.set(
+                *cache_key, [diddoc_json, etag], generation=generation
+            )
+        return diddoc_json, etag
+
+    async def _diddoc_json(
+        self,
+        did: str,
+        verification_method_factory: Callable[
+            [Did, int, bytes, KeyEncodings], VerificationMethod
+        ],
+        did_and_signing_key: Tuple[DIDInfo, bytes],
+        key_history: KeyHistorySnapshot,
+        routing_information: Tuple[List[str], str],
+    ) -> str:
+        did_info, signing_key = did_and_signing_key
+        if not (self.__direct_json and can_render(verification_method_factory)):
+            with METRICS.stage("diddoc_build"), TRACER.span("diddoc_build"):
+                diddoc = _build_diddoc(
+                    did,
+                    signing_key,
+                    key_history,
+                    routing_information,
+                    verification_method_factory,
+                    signing_key_encodings=decode_verkey(did_info.verkey)[1],
+                )
+            return _serialize(diddoc)
+
+        # same inputs as get_diddoc, rendered without the pydid models
+        with METRICS.stage("diddoc_render"), TRACER.span("diddoc_render"):
+            return render_diddoc_json(
+                did,
+                signing_key,
+                key_history,
+                routing_information,
+                verification_method_factory,
+                signing_key_encodings=decode_verkey(did_info.verkey)[1],
+            )
 
     async def rotate_key(self, did: str):
-        # Safe keep the old key
-        did_info, signing_key = await self._get_did_and_signing_key(did)
-        await self.__storage_strategy.store_old_key(did, signing_key)
+        _, new_diddoc = await self.rotate(did, build_diddoc=True)
+        return new_diddoc
 
-        # Rotate key in wallet
-        await self.__wallet.rotate_did_keypair_start(did)
-        await self.__wallet.rotate_did_keypair_apply(did)
+    async def rotate(
+        self, did: str, build_diddoc: bool = False
+    ) -> Tuple[KeyRotation, Optional[DIDDocument]]:
+        """
+        Rotate the key of a DID
+        :param did:
+        :param build_diddoc: whether to build the DIDDocument resulting from the rotation
+        :return: the key indices and verkeys before and after the rotation, and the new
+        DIDDocument when requested
+        """
+        # Rotations of a DID must not interleave, or two of them would safe keep the
+        # same key and lose the one the wallet replaced in between. Callers rotating
+        # within a transaction hold the lock until it commits, see DIDLocks.hold
+        async with self.__did_locks.lock(self.__profile.settings.get("wallet.id"), did):
+            # Safe keep the old key
+            did_info, signing_key = await self._get_did_and_signing_key(did)
+            old_head = await self.__storage_strategy.head(did)
+            head = await self.__storage_strategy.store_old_key(did, signing_key, old_head)
+
+            # Rotate key in wallet
+            await self.__wallet.rotate_did_keypair_start(did)
+            await self.__wallet.rotate_did_keypair_apply(did)
+            new_did_info, _ = await self._get_did_and_signing_key(did)
+
+        rotation = KeyRotation(
+            did=did,
+            old_index=old_head.current_index,
+            new_index=head.current_index if head else old_head.current_index,
+            old_verkey=did_info.verkey,
+            new_verkey=new_did_info.verkey,
+        )
+        if not build_diddoc:
+            return rotation, None
 
         # Return new DIDDoc
-        return await self.get_diddoc(did)
+        return rotation, await self.get_diddoc(
+            did, key_history=await self.load_key_history(did, head)
+        )
+
+    async def load_key_history(
+        self, did: str, head: KeyHistoryHead = None
+    ) -> KeyHistorySnapshot:
+        """
+        Load the key history of a DID once, to be shared by the steps of an operation.
+        :param did:
+        :param head: key history head already known by the caller, if any
+        :return:
+        """
+        with METRICS.stage("key_history_read"), TRACER.span("key_history_read"):
+            head = head if head is not None else await self.__storage_strategy.head(did)
+            previous_keys = await self.__recall_strategy.previous_keys(did, head)
+        METRICS.key_history_length.observe(head.count)
+        return KeyHistorySnapshot(head, previous_keys)
+
+    async def load_key_histories(self, dids: List[str]) -> Dict[str, KeyHistorySnapshot]:
+        """
+        Load the key history of several DIDs with batched storage reads.
+        :param dids:
+        :return:
+        """
+        if not dids:
+            return {}
+
+        with METRICS.stage("key_history_read"), TRACER.span("key_history_read"):
+            heads = await self.__storage_strategy.heads(dids)
+            previous_keys = await self.__recall_strategy.previous_keys_for_dids(heads)
+        for head in heads.values():
+            METRICS.key_history_length.observe(head.count)
+        return {did: KeyHistorySnapshot(heads[did], previous_keys[did]) for did in dids}
+
+    async def _resolve(
+        self, did: str, key_history: KeyHistorySnapshot = None
+    ) -> Tuple[Tuple[DIDInfo, bytes], KeyHistorySnapshot, Tuple[List[str], str]]:
+        """
+        Read what the DID document of a DID is made of.
+
+        Routing information does not depend on the DID and is read with a session of its
+        own, concurrently with the reads of the DID, which share the manager's session.
+        :param did:
+        :param key_history: key history already loaded for this operation, if any
+        :return: the wallet entry and current key, key history and routing information
+        """
+        reads = [lambda: self._get_did_and_signing_key(did)]
+        if key_history is None:
+            reads.append(lambda: self.load_key_history(did))
+
+        (did_and_signing_key, *loaded), routing_information = await _concurrently(
+            self._session_reads(*reads), self._retrieve_routing_information()
+        )
+        return did_and_signing_key, key_history or loaded[0], routing_information
+
+    async def _resolve_head(
+        self, did: str
+    ) -> Tuple[Tuple[DIDInfo, bytes], KeyHistoryHead, Tuple[List[str], str]]:
+        """
+        Read what tags the DID document of a DID, as _resolve but for the key history
+        head only.
+        :param did:
+        :return: the wallet entry and current key, key history head and routing
+        information
+        """
+
+        async def head_read() -> KeyHistoryHead:
+            with METRICS.stage("key_history_read"), TRACER.span("key_history_read"):
+                return await self.__storage_strategy.head(did)
+
+        (did_and_signing_key, head), routing_information = await _concurrently(
+            self._session_reads(lambda: self._get_did_and_signing_key(did), head_read),
+            self._retrieve_routing_information(),
+        )
+        return did_and_signing_key, head, routing_information
+
+    async def _session_reads(self, *reads: Callable[[], Awaitable]) -> list:
+        """Run reads sharing the manager's session, concurrently if the session can."""
+        if self.__concurrent_session_reads:
+            return await _concurrently(*(read() for read in reads))
+        return [await read() for read in reads]
 
     async def _get_did_and_signing_key(self, did) -> Tuple[DIDInfo, bytes]:
         try:
-            did_info = await self.__wallet.get_local_did(did.replace("did:sov:", ""))
-            signing_key = base58.b58decode(did_info.verkey)
+            with METRICS.stage("wallet_lookup"), TRACER.span("wallet_lookup"):
+                did_info = await self.__wallet.get_local_did(did.replace("did:sov:", ""))
+            signing_key, _ = decode_verkey(did_info.verkey)
 
             return did_info, signing_key
         except WalletNotFoundError:
             raise UnknownDIDException()
 
     async def _retrieve_routing_information(self) -> Tuple[List[str], str]:
-        route_manager = self.__profile.inject(RouteManager)
+        with METRICS.stage("routing_info"), TRACER.span("routing_info"):
+            return await self._routing_information()
+
+    async def _routing_information(self) -> Tuple[List[str], str]:
+        # Routing is the same for every DID of the wallet, it is shared when cached
+        wallet_id = self.__profile.settings.get("wallet.id")
+        if self.__routing_info_cache is not None:
+            routing_information = await self.__routing_info_cache.get(wallet_id)
+            if routing_information is not None:
+                return routing_information
+
+        route_manager = traced(self.__profile.inject(RouteManager), "route_manager")
 
         routing_keys, my_endpoint = await route_manager.routing_info(
             self.__profile,
             None,
         )
-        return routing_keys, my_endpoint or cast(
+        routing_information = routing_keys, my_endpoint or cast(
             str, self.__profile.settings.get("default_endpoint")
         )
 
+        if self.__routing_info_cache is not None:
+            await self.__routing_info_cache.set(wallet_id, routing_information)
+
+        return routing_information
+
+
+async def _concurrently(*awaitables: Awaitable) -> list:
+    tasks = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        # the other reads must not outlive the operation, nor the session they use
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def diddoc_etag(
+    did: str,
+    verkey: str,
+    head: KeyHistoryHead,
+    routing_information: Tuple[Optional[List[str]], str],
+    number_of_keys: int,
+    verification_method_type: str,
+) -> str:
+    """
+    Strong entity tag of a serialized DIDDocument, from what the document is made of.
+
+    The previous keys shown follow from the head: new keys get new indices, and pruning
+    lowers the count. Both renderers write the same JSON, see diddoc_json.
+    """
+    routing_keys, endpoint = routing_information
+    inputs = json.dumps(
+        [
+            DIDDOC_ETAG_VERSION,
+            did,
+            verkey,
+            head.latest_index,
+            head.count,
+            routing_keys or [],
+            endpoint,
+            number_of_keys,
+            verification_method_type,
+        ]
+    )
+    return f'"{hashlib.sha256(inputs.encode()).hexdigest()}"'
+
+
+def _unless_current(
+    diddoc_json: str, etag: str, is_current: Optional[Callable[[str], bool]]
+) -> Tuple[Optional[str], str]:
+    return (None if is_current is not None and is_current(etag) else diddoc_json), etag
+
+
+def _serialize(diddoc: DIDDocument) -> str:
+    with METRICS.stage("serialization"), TRACER.span("serialization"):
+        return diddoc.to_json()
+
+
+def _build_diddoc(
+    did: str,
+    signing_key: bytes,
+    key_history: KeyHistorySnapshot,
+    routing_information: Tuple[List[str], str],
+    verification_method_factory: Callable[
+        [Did, int, bytes, KeyEncodings], VerificationMethod
+    ],
+    signing_key_encodings: KeyEncodings = None,
+) -> DIDDocument:
+    # build complete key list, with the encodings stored along with the previous keys
+    keys_with_indices = [
+        (
+            key_history.current_index,
+            signing_key,
+            signing_key_encodings or KeyEncodings.of(signing_key),
+        )
+    ]
+    keys_with_indices.extend(
+        [
+            (previous_key.index, previous_key.key, previous_key.key_encodings())
+            for previous_key in key_history.previous_keys
+        ]
+    )
+
+    # Build diddoc
+    did_doc_builder = DIDDocumentBuilder(did, controller=[did])
+
+    verification_methods_and_contexts = [
+        verification_method_factory(did, key_index, key, encodings)
+        for key_index, key, encodings in keys_with_indices
+    ]
+    verification_methods, contexts = zip(*verification_methods_and_contexts)
+    # flat map the contexts and eliminate duplicate entries
+    contexts = list(set(itertools.chain.from_iterable(contexts)))
+
+    # add contexts required by the verification methods
+    did_doc_builder.context.extend(contexts)
+    did_doc_builder.verification_method.methods.extend(verification_methods)
+
+    # reference the keys in the other sections
+    all_key_references = _build_key_references(did, keys_with_indices)
+    did_doc_builder.authentication.methods.extend(all_key_references)
+    did_doc_builder.assertion_method.methods.extend(all_key_references)
+
+    # add routing information
+    routing_keys, endpoint = routing_information
+    did_doc_builder.service.add_didcomm(
+        endpoint,
+        recipient_keys=[did_doc_builder.verification_method.methods[0]],
+        routing_keys=[_routing_verification_method(key) for key in routing_keys]
+        if routing_keys is not None
+        else [],
+    )
+
+    return did_doc_builder.build()
+
+
+@lru_cache(maxsize=1024)
+def _routing_verification_method(routing_key: str) -> VerificationMethod:
+    # the same few mediator keys appear in every DID document
+    did_key = DIDKey.from_public_key_b58(routing_key, key_type=ED25519)
+    return Ed25519VerificationKey2018.make(
+        id=did_key.key_id, controller=did_key.did, public_key_base58=routing_key
+    )
+
 
 def _build_key_references(
-    did: str, keys_with_indices: Iterable[Tuple[int, bytes]]
+    did: str, keys_with_indices: Iterable[Tuple[int, bytes, KeyEncodings]]
 ) -> List[DIDUrl]:
-    return [DIDUrl(f"{did}#key-{index}") for index, _ in keys_with_indices]
+    return [DIDUrl(f"{did}#key-{index}") for index, _, _ in keys_with_indices]
 
 
 def _get_default_context():
@@ -0,0 +1,122 @@
+import json
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+from aries_cloudagent.did.did_key import DIDKey
+from aries_cloudagent.wallet.key_type import ED25519
+from pydid import DID
+
+from didmanagement.key_encodings import KeyEncodings
+from didmanagement.retention import KeyHistorySnapshot
+from didmanagement.verification_methods import (
+    Did,
+    ed25519_verification_key_2018,
+    json_web_key_2020,
+)
+
+DID_CONTEXT = "https://www.w3.org/ns/did/v1"
+
+# Same JSON as pydid's DIDDocument.to_json() for the documents DIDManager builds: keys in
+# the model's field order, json.dumps separators, and strings escaped by json.dumps
+_ED25519_2018_TEMPLATE = (
+    '{"id": %s, "type": "Ed25519VerificationKey2018", "controller": %s, '
+    '"publicKeyBase58": %s}'
+)
+_JWK_2020_TEMPLATE = (
+    '{"id": %s, "type": "JsonWebKey2020", "controller": %s, '
+    '"publicKeyJwk": {"kty": "OKP", "crv": "Ed25519", "x": %s}}'
+)
+_DIDDOC_TEMPLATE = (
+    '{"@context": %s, "id": %s, "controller": [%s], "verificationMethod": [%s], '
+    '"authentication": [%s], "assertionMethod": [%s], "service": [{"id": %s, '
+    '"type": "did-communication", "serviceEndpoint": %s, "recipientKeys": [%s], '
+    '"routingKeys": [%s], "priority": 0}]}'
+)
+
+_quote = json.dumps
+
+
+def _ed25519_2018(key_id: str, controller: str, encodings: KeyEncodings) -> str:
+    return _ED25519_2018_TEMPLATE % (key_id, controller, _quote(encodings.base58))
+
+
+def _jwk_2020(key_id: str, controller: str, encodings: KeyEncodings) -> str:
+    return _JWK_2020_TEMPLATE % (key_id, controller, _quote(encodings.jwk_x))
+
+
+# verification method renderers and their context, by the factory they stand in for
+_RENDERERS: Dict[Callable, Tuple[Callable[[str, str, KeyEncodings], str], str]] = {
+    ed25519_verification_key_2018: (
+        _ed25519_2018,
+        _quote([DID_CONTEXT, "https://w3id.org/security/suites/ed25519-2018/v1"]),
+    ),
+    json_web_key_2020: (
+        _jwk_2020,
+        _quote([DID_CONTEXT, "https://w3id.org/security/suite/jws-2020/v1"]),
+    ),
+}
+
+
+def can_render(verification_method_factory: Callable) -> bool:
+    """Whether documents with the factory's verification methods can be rendered."""
+    return verification_method_factory in _RENDERERS
+
+
+def render_diddoc_json(
+    did: Did,
+    signing_key: bytes,
+    key_history: KeyHistorySnapshot,
+    routing_information: Tuple[Optional[List[str]], str],
+    verification_method_factory: Callable,
+    signing_key_encodings: KeyEncodings = None,
+) -> str:
+    """
+    Render the JSON of a DID document without building it with pydid.
+    :param did:
+    :param signing_key: current key of the DID
+    :param key_history: previous keys to include
+    :param routing_information: mediator routing keys and endpoint
+    :param verification_method_factory: factory the verification methods stand in for
+    :param signing_key_encodings: encodings of the current key, derived when not given
+    :return: the JSON pydid would serialize the same document to
+    :raises InvalidDIDError: as DIDDocumentBuilder does, for what is not a DID
+    """
+    DID.validate(did)
+    render_method, context = _RENDERERS[verification_method_factory]
+    quoted_did = _quote(did)
+
+    keys_with_indices = [
+        (
+            key_history.current_index,
+            signing_key_encodings or KeyEncodings.of(signing_key),
+        )
+    ]
+    keys_with_indices.extend(
+        (previous_key.index, previous_key.key_encodings())
+        for previous_key in key_history.previous_keys
+    )
+    key_ids = [_quote(f"{did}#key-{index}") for index, _ in keys_with_indices]
+    references = ", ".join(key_ids)
+
+    routing_keys, endpoint = routing_information
+    return _DIDDOC_TEMPLATE % (
+        context,
+        quoted_did,
+        quoted_did,
+        ", ".join(
+            render_method(key_id, quoted_did, encodings)
+            for key_id, (_, encodings) in zip(key_ids, keys_with_indices)
+        ),
+        references,
+        references,
+        _quote(f"{did}#service-0"),
+        _quote(endpoint),
+        key_ids[0],
+        ", ".join(_routing_key_reference(key) for key in routing_keys or []),
+    )
+
+
+@lru_cache(maxsize=1024)
+def _routing_key_reference(routing_key: str) -> str:
+    # the same few mediator keys appear in every DID document
+    return _quote(DIDKey.from_public_key_b58(routing_key, key_type=ED25519).key_id)
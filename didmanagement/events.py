@@ -0,0 +1,26 @@
+import re
+from dataclasses import asdict
+from typing import TYPE_CHECKING
+
+from aries_cloudagent.core.event_bus import EventBus
+from aries_cloudagent.core.profile import Profile
+
+from didmanagement.caching import invalidate_did_caches
+
+if TYPE_CHECKING:
+    # the DID manager pulls pydid in, which the plugin setup does not need
+    from didmanagement.did_manager import KeyRotation
+
+# payload: did, old_index, new_index, old_verkey, new_verkey
+KEY_ROTATED_EVENT_TOPIC = "didmanagement::key::rotated"
+KEY_ROTATED_EVENT_PATTERN = re.compile(f"^{re.escape(KEY_ROTATED_EVENT_TOPIC)}$")
+
+
+async def notify_key_rotated(profile: Profile, rotation: "KeyRotation"):
+    """Publish a key rotation on the profile's event bus, once it is committed."""
+    if profile.inject_or(EventBus) is None:
+        # nobody listens, the plugin's own caches still have to forget the old key
+        await invalidate_did_caches(profile, rotation.did)
+        return
+
+    await profile.notify(KEY_ROTATED_EVENT_TOPIC, asdict(rotation))
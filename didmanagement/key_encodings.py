@@ -0,0 +1,46 @@
+import base64
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Tuple
+
+import base58
+
+# multibase prefix of base58btc
+MULTIBASE_BASE58BTC = "z"
+# multicodec prefix of ed25519 public keys, as publicKeyMultibase values carry it
+MULTICODEC_ED25519_PUB = b"\xed\x01"
+
+
+@dataclass(frozen=True)
+class KeyEncodings:
+    """Encodings of a public key as verification methods show it."""
+
+    base58: str
+    # base64 of the key, as the JsonWebKey2020 verification methods carry it
+    jwk_x: str
+    multibase: str
+
+    @classmethod
+    def of(cls, key: bytes) -> "KeyEncodings":
+        return cls.from_base58(base58.b58encode(key).decode(), key)
+
+    @classmethod
+    def from_base58(cls, encoded: str, key: bytes) -> "KeyEncodings":
+        """Encodings of a key whose base58 encoding is already known, like a verkey."""
+        return cls(
+            base58=encoded,
+            jwk_x=base64.b64encode(key).decode(),
+            multibase=multibase(key),
+        )
+
+
+def multibase(key: bytes) -> str:
+    """Multibase of an ed25519 public key: base58btc of the key behind its multicodec."""
+    return MULTIBASE_BASE58BTC + base58.b58encode(MULTICODEC_ED25519_PUB + key).decode()
+
+
+@lru_cache(maxsize=4096)
+def decode_verkey(verkey: str) -> Tuple[bytes, KeyEncodings]:
+    """Raw bytes and encodings of a wallet verkey, decoded once per verkey."""
+    key = base58.b58decode(verkey)
+    return key, KeyEncodings.from_base58(verkey, key)
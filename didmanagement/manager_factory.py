@@ -0,0 +1,63 @@
+from typing import TYPE_CHECKING
+
+from aries_cloudagent.core.profile import ProfileSession
+from aries_cloudagent.storage.base import BaseStorage
+from aries_cloudagent.wallet.base import BaseWallet
+
+from didmanagement.caching import DIDDocCache, RoutingInfoCache
+from didmanagement.concurrency import DIDLocks
+from didmanagement.config import DIDManagementConfig
+
+if TYPE_CHECKING:
+    # both pull pydid and the storage layer in, only needed once a request comes
+    from didmanagement.did_manager import DIDManager
+    from didmanagement.retention import StorageStrategy
+
+
+class DIDManagerFactory:
+    """
+    Hand out DID managers bound to a session, sharing the state that outlives requests.
+
+    Bound in the injector by the plugin setup, it holds the configuration, caches and
+    locks of the agent, so that a manager per request only wraps the session it uses.
+    """
+
+    def __init__(
+        self,
+        config: DIDManagementConfig = None,
+        diddoc_cache: DIDDocCache = None,
+        routing_info_cache: RoutingInfoCache = None,
+        did_locks: DIDLocks = None,
+    ):
+        self.config = config or DIDManagementConfig()
+        self.diddoc_cache = diddoc_cache
+        self.routing_info_cache = routing_info_cache
+        self.did_locks = did_locks or DIDLocks()
+
+    def storage_strategy(self, storage: BaseStorage) -> "StorageStrategy":
+        """Storage strategy of the configured key history layout over a storage."""
+        from didmanagement.retention import storage_strategy_for_layout
+
+        return storage_strategy_for_layout(storage, self.config.key_history.layout)
+
+    def manager(self, session: ProfileSession, previous_keys: int = 0) -> "DIDManager":
+        """
+        :param session: session or transaction the manager reads and writes in
+        :param previous_keys: number of previous keys DID documents show
+        :return: a manager to use for the lifetime of the session only
+        """
+        from didmanagement.did_manager import DIDManager, RecallStrategyConfig
+
+        storage = session.inject(BaseStorage)
+        return DIDManager(
+            session.profile,
+            session.inject(BaseWallet),
+            storage,
+            RecallStrategyConfig(previous_keys),
+            diddoc_cache=self.diddoc_cache,
+            did_locks=self.did_locks,
+            routing_info_cache=self.routing_info_cache,
+            storage_strategy=self.storage_strategy(storage),
+            direct_json=self.config.diddoc_endpoint.direct_json,
+            concurrent_session_reads=self.config.diddoc_endpoint.concurrent_session_reads,
+        )
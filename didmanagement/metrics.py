@@ -0,0 +1,284 @@
+import bisect
+import functools
+import math
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+from .tracing import TRACER
+
+Labels = Tuple[str, ...]
+
+# seconds, from a cached lookup to a slow wallet or mediator
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+)
+# number of previous keys of a DID
+KEY_HISTORY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """(name, labels, value) of every sample to expose."""
+        return []
+
+    def expose(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        lines.extend(
+            f"{name}{_format_labels(labels)} {_format_value(value)}"
+            for name, labels, value in self.samples()
+        )
+        return lines
+
+    def _labels(self, labels: Dict[str, str]) -> Labels:
+        return tuple(str(labels[name]) for name in self.label_names)
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self.__values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._labels(labels)
+        self.__values[key] = self.__values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self.__values.get(self._labels(labels), 0)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        return [
+            (f"{self.name}_total", dict(zip(self.label_names, key)), value)
+            for key, value in sorted(self.__values.items())
+        ]
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # per label set: count per bucket, then sum of the observations
+        self.__values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str):
+        self.observe_labels(value, self._labels(labels))
+
+    def observe_labels(self, value: float, labels: Labels):
+        """Observe a value for label values in the order of the label names."""
+        values = self.__values.get(labels)
+        if values is None:
+            values = self.__values[labels] = ([0] * len(self.buckets), [0.0])
+        counts, total = values
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def time(self, **labels: str) -> "_Timer":
+        return _Timer(self, self._labels(labels))
+
+    def count(self, **labels: str) -> int:
+        counts, _ = self.__values.get(self._labels(labels), ([], [0.0]))
+        return sum(counts)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        samples = []
+        for key, (counts, total) in sorted(self.__values.items()):
+            labels = dict(zip(self.label_names, key))
+            cumulative = 0
+            for upper_bound, count in zip(self.buckets, counts):
+                cumulative += count
+                bucket_labels = {**labels, "le": _format_value(upper_bound)}
+                samples.append((f"{self.name}_bucket", bucket_labels, cumulative))
+            samples.append((f"{self.name}_sum", labels, total[0]))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class Gauge(Metric):
+    """Gauge read when exposed, from one callback per label set."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self.__callbacks: Dict[Labels, Callable[[], Optional[float]]] = {}
+
+    def track(self, callback: Callable[[], Optional[float]], **labels: str):
+        self.__callbacks[self._labels(labels)] = callback
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        samples = []
+        for key, callback in sorted(self.__callbacks.items()):
+            value = callback()
+            if value is not None:
+                samples.append((self.name, dict(zip(self.label_names, key)), value))
+        return samples
+
+
+class DIDManagementMetrics:
+    """Counters and latency histograms of the plugin's operations, in-process."""
+
+    def __init__(self):
+        self.operations = Counter(
+            "didmanagement_operations",
+            "DID management operations, by outcome",
+            ("operation", "outcome"),
+        )
+        self.operation_duration = Histogram(
+            "didmanagement_operation_duration_seconds",
+            "Duration of DID management operations",
+            ("operation",),
+        )
+        self.stage_duration = Histogram(
+            "didmanagement_stage_duration_seconds",
+            "Duration of the stages of DID document operations",
+            ("stage",),
+        )
+        self.key_history_length = Histogram(
+            "didmanagement_key_history_length",
+            "Number of previous keys of the DIDs whose key history is loaded",
+            buckets=KEY_HISTORY_BUCKETS,
+        )
+        self.cache_hit_ratio = Gauge(
+            "didmanagement_cache_hit_ratio",
+            "Share of cache lookups served from the cache",
+            ("cache",),
+        )
+
+    def metrics(self) -> List[Metric]:
+        return [
+            self.operations,
+            self.operation_duration,
+            self.stage_duration,
+            self.key_history_length,
+            self.cache_hit_ratio,
+        ]
+
+    def operation(self, name: str) -> "_OperationTimer":
+        return _OperationTimer(self, name)
+
+    def stage(self, name: str) -> "_Timer":
+        return _Timer(self.stage_duration, (name,))
+
+    def track_cache(self, name: str, cache):
+        """Expose the hit ratio of a cache counting its `hits` and `misses`."""
+        self.cache_hit_ratio.track(functools.partial(_hit_ratio, cache), cache=name)
+
+    def expose(self) -> str:
+        """Metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics():
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+class _Timer:
+    # a plain class, these wrap every stage of the hot paths
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: Labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.histogram.observe_labels(time.perf_counter() - self.start, self.labels)
+
+
+class _OperationTimer:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics: DIDManagementMetrics, name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.metrics.operation_duration.observe_labels(
+            time.perf_counter() - self.start, (self.name,)
+        )
+        if exc is None:
+            outcome = "success"
+        elif isinstance(exc, web.HTTPException):
+            # aiohttp raises redirections and 304 Not Modified too
+            outcome = "success" if exc.status < 400 else "error"
+        else:
+            outcome = "error"
+        self.metrics.operations.inc(operation=self.name, outcome=outcome)
+
+
+# shared by every profile of the agent process
+METRICS = DIDManagementMetrics()
+
+
+def instrumented(operation: str):
+    """Count, time and trace an admin route handler as a DID management operation."""
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request: web.Request):
+            with METRICS.operation(operation), TRACER.span(
+                operation, **{"http.method": request.method, "http.target": request.path}
+            ):
+                return await handler(request)
+
+        return wrapper
+
+    return decorator
+
+
+def _hit_ratio(cache) -> Optional[float]:
+    lookups = cache.hits + cache.misses
+    return cache.hits / lookups if lookups else None
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (f'{name}="{_escape(value)}"' for name, value in labels.items())
+    return "{" + ",".join(escaped) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
@@ -1,17 +1,44 @@
 from .previous_key import PreviousKey
-from .recall_strategy import NumberOfKeysStrategy, RecallStrategy, RecallStrategyConfig
+from .key_history_head import KeyHistoryHead
+from .key_history_snapshot import KeyHistorySnapshot
+from .recall_strategy import (
+    NumberOfKeysStrategy,
+    RecallStrategy,
+    RecallStrategyConfig,
+    TimeWindowStrategy,
+)
 from .storage_strategy import (
     StorageStrategy,
     StorageBackendStorageStrategy,
     NoStorageStrategy,
 )
+from .migration import backfill_key_history_heads, migrate_key_history_heads
+from .listing import list_key_history_heads, storage_search
+from .pruning import KeyHistorySweeper, RetentionPolicy, SweepResult
+from .packed_storage_strategy import PackedStorageStrategy, pack_key_histories
+from .layouts import PACKED_LAYOUT, RECORDS_LAYOUT, storage_strategy_for_layout
 
 __all__ = [
     "StorageBackendStorageStrategy",
     "NoStorageStrategy",
+    "PackedStorageStrategy",
     "StorageStrategy",
     "NumberOfKeysStrategy",
+    "TimeWindowStrategy",
     "RecallStrategy",
     "RecallStrategyConfig",
     "PreviousKey",
+    "KeyHistoryHead",
+    "KeyHistorySnapshot",
+    "backfill_key_history_heads",
+    "migrate_key_history_heads",
+    "list_key_history_heads",
+    "storage_search",
+    "KeyHistorySweeper",
+    "RetentionPolicy",
+    "SweepResult",
+    "pack_key_histories",
+    "storage_strategy_for_layout",
+    "RECORDS_LAYOUT",
+    "PACKED_LAYOUT",
 ]
@@ -0,0 +1,22 @@
+import json
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class KeyHistoryHead:
+    """Summary of a DID's key history: highest stored index and number of stored keys."""
+
+    latest_index: int = 0
+    count: int = 0
+
+    @property
+    def current_index(self) -> int:
+        return self.latest_index + 1
+
+    def to_json(self) -> str:
+        return json.dumps({"latest_index": self.latest_index, "count": self.count})
+
+    @classmethod
+    def from_json(cls, value: str) -> "KeyHistoryHead":
+        parsed = json.loads(value)
+        return cls(int(parsed["latest_index"]), int(parsed["count"]))
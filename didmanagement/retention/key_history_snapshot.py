@@ -0,0 +1,17 @@
+from dataclasses import dataclass, field
+from typing import List
+
+from .key_history_head import KeyHistoryHead
+from .previous_key import PreviousKey
+
+
+@dataclass(frozen=True)
+class KeyHistorySnapshot:
+    """Key history of a DID as loaded once for a single operation."""
+
+    head: KeyHistoryHead
+    previous_keys: List[PreviousKey] = field(default_factory=list)
+
+    @property
+    def current_index(self) -> int:
+        return self.head.current_index
@@ -0,0 +1,20 @@
+from aries_cloudagent.storage.base import BaseStorage
+
+from .packed_storage_strategy import PackedStorageStrategy
+from .storage_strategy import StorageBackendStorageStrategy, StorageStrategy
+
+# one record per previous key, plus a head record per DID
+RECORDS_LAYOUT = "records"
+# one record holding the whole key history of a DID
+PACKED_LAYOUT = "packed"
+
+
+def storage_strategy_for_layout(
+    storage: BaseStorage, layout: str = RECORDS_LAYOUT
+) -> StorageStrategy:
+    """Return the storage strategy reading and writing key histories in a layout."""
+    if layout == RECORDS_LAYOUT:
+        return StorageBackendStorageStrategy(storage)
+    if layout == PACKED_LAYOUT:
+        return PackedStorageStrategy(storage)
+    raise ValueError(f"Unknown key history layout: {layout}")
@@ -0,0 +1,66 @@
+from typing import List, Tuple
+
+from aries_cloudagent.core.profile import ProfileSession
+from aries_cloudagent.storage.base import BaseStorage, BaseStorageSearch
+
+from .key_history_head import KeyHistoryHead
+from .storage_strategy import NO_HISTORY_TAG, PREVIOUS_PUBLIC_KEY_HEAD_RECORD_TYPE
+
+# records skipped at once when moving to the requested offset
+SKIP_PAGE_SIZE = 500
+
+
+async def list_key_history_heads(
+    search: BaseStorageSearch, offset: int = 0, limit: int = 100
+) -> Tuple[List[Tuple[str, KeyHistoryHead]], bool]:
+    """
+    List the key history heads of the wallet, one page at a time.
+
+    Heads summarize the previous keys of a DID and are kept up to date by every rotation,
+    so a page costs one record per DID instead of one per stored key. DIDs whose history
+    predates head records are only listed once backfilled, see migrate_key_history_heads.
+    The empty heads of DIDs never rotated are left out.
+
+    ACA-Py storage searches can neither sort nor seek, pages are found by streaming past
+    the previous ones: the records skipped are fetched in large batches and not decoded.
+    :param search: storage search of the wallet
+    :param offset: number of DIDs already listed
+    :param limit: maximum number of DIDs in the page
+    :return: the DIDs of the page with their key history head, and whether more follow
+    """
+    search_session = search.search_records(
+        PREVIOUS_PUBLIC_KEY_HEAD_RECORD_TYPE,
+        {"$not": {NO_HISTORY_TAG: "1"}},
+        page_size=min(limit + 1, SKIP_PAGE_SIZE),
+    )
+    try:
+        # stream past the previous pages without keeping them
+        skipped = 0
+        while skipped < offset:
+            records = await search_session.fetch(min(offset - skipped, SKIP_PAGE_SIZE))
+            if not records:
+                return [], False
+            skipped += len(records)
+
+        page = []
+        while len(page) <= limit:
+            records = await search_session.fetch(limit + 1 - len(page))
+            if not records:
+                break
+            page.extend(records)
+    finally:
+        await search_session.close()
+
+    heads = [
+        (record.tags["did"], KeyHistoryHead.from_json(record.value))
+        for record in page[:limit]
+    ]
+    return heads, len(page) > limit
+
+
+def storage_search(session: ProfileSession) -> BaseStorageSearch:
+    # storages such as the in-memory one search by themselves
+    storage = session.inject(BaseStorage)
+    if isinstance(storage, BaseStorageSearch):
+        return storage
+    return session.inject(BaseStorageSearch)
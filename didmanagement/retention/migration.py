@@ -0,0 +1,88 @@
+import json
+import logging
+from collections import defaultdict
+from typing import Dict, List
+
+from aries_cloudagent.storage.base import BaseStorage
+from aries_cloudagent.storage.error import StorageDuplicateError, StorageNotFoundError
+from aries_cloudagent.storage.record import StorageRecord
+
+from .previous_key import PreviousKey
+from .storage_strategy import (
+    PREVIOUS_PUBLIC_KEY_HEAD_RECORD_TYPE,
+    PREVIOUS_PUBLIC_KEY_RECORD_TYPE,
+    _head_record,
+    _previous_key,
+    head_from_previous_keys,
+)
+
+logger = logging.getLogger(__name__)
+
+# written once every DID of the wallet has a key history head
+KEY_HISTORY_MIGRATION_RECORD_TYPE = "DIDMANAGEMENT_MIGRATION"
+KEY_HISTORY_HEADS_MIGRATION = "key-history-heads"
+
+
+async def backfill_key_history_heads(storage: BaseStorage) -> int:
+    """
+    Create or correct the key history head of every DID having stored previous keys.
+
+    Heads are otherwise backfilled lazily on first access, this allows doing it upfront.
+    :param storage: storage of the wallet to migrate, ideally from a transaction
+    :return: number of head records written
+    """
+    previous_keys_by_did: Dict[str, List[PreviousKey]] = defaultdict(list)
+    for record in await storage.find_all_records(PREVIOUS_PUBLIC_KEY_RECORD_TYPE, {}):
+        previous_keys_by_did[record.tags["did"]].append(_previous_key(record))
+
+    written = 0
+    for did, previous_keys in previous_keys_by_did.items():
+        head_record = _head_record(did, head_from_previous_keys(previous_keys))
+        try:
+            existing = await storage.get_record(PREVIOUS_PUBLIC_KEY_HEAD_RECORD_TYPE, did)
+        except StorageNotFoundError:
+            await storage.add_record(head_record)
+            written += 1
+            continue
+
+        if existing.value != head_record.value:
+            await storage.update_record(existing, head_record.value, existing.tags)
+            written += 1
+
+    logger.info(
+        "Backfilled %s key history heads out of %s DIDs",
+        written,
+        len(previous_keys_by_did),
+    )
+    return written
+
+
+async def migrate_key_history_heads(storage: BaseStorage) -> int:
+    """
+    Backfill the key history heads of a wallet, unless it already was.
+
+    Rotations keep heads up to date, a wallet migrated once stays so.
+    :param storage: storage of the wallet to migrate, ideally from a transaction
+    :return: number of head records written
+    """
+    try:
+        await storage.get_record(
+            KEY_HISTORY_MIGRATION_RECORD_TYPE, KEY_HISTORY_HEADS_MIGRATION
+        )
+        return 0
+    except StorageNotFoundError:
+        pass
+
+    written = await backfill_key_history_heads(storage)
+    try:
+        await storage.add_record(
+            StorageRecord(
+                KEY_HISTORY_MIGRATION_RECORD_TYPE,
+                json.dumps({"written": written}),
+                id=KEY_HISTORY_HEADS_MIGRATION,
+            )
+        )
+    except StorageDuplicateError:
+        # migrated concurrently, e.g. by another agent instance
+        pass
+    return written
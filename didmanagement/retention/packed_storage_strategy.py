@@ -0,0 +1,298 @@
+import base64
+import logging
+import struct
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from aries_cloudagent.storage.base import BaseStorage
+from aries_cloudagent.storage.error import StorageDuplicateError, StorageNotFoundError
+from aries_cloudagent.storage.record import StorageRecord
+
+from ..tracing import traced
+from .key_history_head import KeyHistoryHead
+from .previous_key import PreviousKey
+from .storage_strategy import (
+    MAX_INDEX_ALLOCATION_ATTEMPTS,
+    PREVIOUS_PUBLIC_KEY_RECORD_TYPE,
+    KeyIndexAllocationError,
+    StorageStrategy,
+    _previous_key,
+    _rotated_since,
+    head_from_previous_keys,
+)
+
+PACKED_KEY_HISTORY_RECORD_TYPE = "PACKED_KEY_HISTORY"
+PACKED_KEY_HISTORY_VERSION = 1
+logger = logging.getLogger(__name__)
+
+# version of the layout, then one entry per key
+_VERSION = struct.Struct(">B")
+# index, rotated out at (epoch seconds, 0 when unknown), key length, then the raw key
+_ENTRY = struct.Struct(">IQH")
+
+
+class PackedKeyHistoryError(Exception):
+    """When a packed key history cannot be read."""
+
+
+class PackedStorageStrategy(StorageStrategy):
+    """
+    Keep the whole key history of a DID in a single record.
+
+    Keys are appended in place: a rotation costs one read and one update, and loading a
+    history for a DID document one read, whatever the number of keys. Listing and pruning
+    key histories only apply to the one record per key layout.
+
+    Histories still kept one record per key are read as they are and converted on the
+    next rotation, so that indices carry on.
+    """
+
+    def __init__(self, storage: BaseStorage, clock: Callable[[], float] = time.time):
+        """
+        :param storage:
+        :param clock: source of the rotation timestamps, in epoch seconds
+        """
+        self.__storage = traced(storage, "storage")
+        self.__clock = clock
+        # keys behind the last head returned, for the recall following it to reuse
+        self.__head_keys: Optional[Tuple[str, KeyHistoryHead, List[PreviousKey]]] = None
+
+    async def stored_keys(self, did: str) -> List[PreviousKey]:
+        record = await self._record(did)
+        return unpack_keys(record.value) if record else await self._unpacked_keys(did)
+
+    async def store_old_key(
+        self, did: str, signing_key: bytes, head: KeyHistoryHead = None
+    ) -> KeyHistoryHead:
+        """
+        :param did: DID for which the key is being safe-kept
+        :param signing_key: bytes of the DID's signing key
+        :param head: ignored, the stored history is read anyway to append to it
+        :return: the key history head after storing the key
+        """
+        rotated_at = self.__clock()
+        self.__head_keys = None
+        for _ in range(MAX_INDEX_ALLOCATION_ATTEMPTS):
+            record = await self._record(did, for_update=True)
+            previous_keys = (
+                unpack_keys(record.value) if record else await self._unpacked_keys(did)
+            )
+            new_key = PreviousKey(
+                head_from_previous_keys(previous_keys).current_index,
+                signing_key,
+                rotated_at,
+            )
+            logger.info(
+                "Storing key %s with index %s for did %s", signing_key, new_key.index, did
+            )
+
+            if record is not None:
+                value = _append(record.value, new_key)
+                await self.__storage.update_record(record, value, record.tags)
+            else:
+                try:
+                    await self.__storage.add_record(
+                        _packed_record(did, pack_keys([*previous_keys, new_key]))
+                    )
+                except StorageDuplicateError:
+                    # another rotation created the history meanwhile, append to it
+                    continue
+                await self._delete_unpacked_keys(did, previous_keys)
+
+            return head_from_previous_keys([*previous_keys, new_key])
+
+        raise KeyIndexAllocationError(f"Could not update the key history of {did}")
+
+    async def head(self, did: str) -> KeyHistoryHead:
+        previous_keys = await self.stored_keys(did)
+        head = head_from_previous_keys(previous_keys)
+        self.__head_keys = did, head, previous_keys
+        return head
+
+    async def latest_keys(
+        self, did: str, number_of_keys: int, head: KeyHistoryHead = None
+    ) -> List[PreviousKey]:
+        if number_of_keys <= 0 or (head is not None and head.count == 0):
+            return []
+
+        previous_keys = sorted(
+            await self._keys_behind(did, head), key=lambda key: key.index, reverse=True
+        )
+        return previous_keys[:number_of_keys]
+
+    async def keys_rotated_since(self, did: str, since: float) -> List[PreviousKey]:
+        return _rotated_since(await self._keys_behind(did), since)
+
+    async def heads(self, dids: List[str]) -> Dict[str, KeyHistoryHead]:
+        keys_by_did = await self._stored_keys_for_dids(dids)
+        return {did: head_from_previous_keys(keys_by_did[did]) for did in dids}
+
+    async def latest_keys_for_dids(
+        self, heads: Dict[str, KeyHistoryHead], number_of_keys: int
+    ) -> Dict[str, List[PreviousKey]]:
+        if number_of_keys <= 0:
+            return {did: [] for did in heads}
+
+        keys_by_did = await self._stored_keys_for_dids(
+            [did for did, head in heads.items() if head.count > 0]
+        )
+        return {
+            did: sorted(keys_by_did[did], key=lambda key: key.index, reverse=True)[
+                :number_of_keys
+            ]
+            for did in heads
+        }
+
+    async def _keys_behind(
+        self, did: str, head: KeyHistoryHead = None
+    ) -> List[PreviousKey]:
+        """Keys of the DID, read along with its head when it is the one last returned."""
+        if self.__head_keys is not None:
+            head_did, head_read, previous_keys = self.__head_keys
+            self.__head_keys = None
+            if head_did == did and (head is None or head is head_read):
+                return previous_keys
+        return await self.stored_keys(did)
+
+    async def _stored_keys_for_dids(
+        self, dids: List[str]
+    ) -> Dict[str, List[PreviousKey]]:
+        keys_by_did: Dict[str, List[PreviousKey]] = defaultdict(list)
+        if not dids:
+            return keys_by_did
+
+        for record in await self.__storage.find_all_records(
+            PACKED_KEY_HISTORY_RECORD_TYPE, {"did": {"$in": dids}}
+        ):
+            keys_by_did[record.tags["did"]] = unpack_keys(record.value)
+
+        # DIDs without a packed history: never rotated, or still kept one record per key
+        missing_dids = [did for did in dids if did not in keys_by_did]
+        if missing_dids:
+            for record in await self.__storage.find_all_records(
+                PREVIOUS_PUBLIC_KEY_RECORD_TYPE, {"did": {"$in": missing_dids}}
+            ):
+                keys_by_did[record.tags["did"]].append(_previous_key(record))
+        return keys_by_did
+
+    async def _record(
+        self, did: str, for_update: bool = False
+    ) -> Optional[StorageRecord]:
+        try:
+            return await self.__storage.get_record(
+                PACKED_KEY_HISTORY_RECORD_TYPE,
+                _packed_record_id(did),
+                {"forUpdate": for_update},
+            )
+        except StorageNotFoundError:
+            return None
+
+    async def _unpacked_keys(self, did: str) -> List[PreviousKey]:
+        """Keys of a history still kept one record per key, with or without a head."""
+        return [
+            _previous_key(record)
+            for record in await self.__storage.find_all_records(
+                PREVIOUS_PUBLIC_KEY_RECORD_TYPE, {"did": did}
+            )
+        ]
+
+    async def _delete_unpacked_keys(self, did: str, previous_keys: List[PreviousKey]):
+        for key in previous_keys:
+            try:
+                await self.__storage.delete_record(
+                    StorageRecord(
+                        PREVIOUS_PUBLIC_KEY_RECORD_TYPE, "", id=f"{did}#{key.index}"
+                    )
+                )
+            except StorageNotFoundError:
+                continue
+
+
+async def pack_key_histories(storage: BaseStorage) -> int:
+    """
+    Convert the one record per key histories of the wallet into packed ones.
+
+    Keys already packed for a DID are kept, the converted ones are merged into them.
+    :param storage: storage of the wallet to migrate, ideally from a transaction
+    :return: number of DIDs converted
+    """
+    records_by_did: Dict[str, List[StorageRecord]] = defaultdict(list)
+    for record in await storage.find_all_records(PREVIOUS_PUBLIC_KEY_RECORD_TYPE, {}):
+        records_by_did[record.tags["did"]].append(record)
+
+    for did, records in records_by_did.items():
+        try:
+            packed_record = await storage.get_record(
+                PACKED_KEY_HISTORY_RECORD_TYPE,
+                _packed_record_id(did),
+                {"forUpdate": True},
+            )
+        except StorageNotFoundError:
+            packed_record = None
+
+        previous_keys = {key.index: key for key in map(_previous_key, records)}
+        if packed_record is not None:
+            previous_keys.update(
+                (key.index, key) for key in unpack_keys(packed_record.value)
+            )
+        value = pack_keys(sorted(previous_keys.values(), key=lambda key: key.index))
+
+        if packed_record is None:
+            await storage.add_record(_packed_record(did, value))
+        else:
+            await storage.update_record(packed_record, value, packed_record.tags)
+
+        for record in records:
+            await storage.delete_record(record)
+
+    logger.info("Packed the key histories of %s DIDs", len(records_by_did))
+    return len(records_by_did)
+
+
+def pack_keys(previous_keys: List[PreviousKey]) -> str:
+    """Encode previous keys as a packed key history record value."""
+    return base64.b64encode(
+        _VERSION.pack(PACKED_KEY_HISTORY_VERSION)
+        + b"".join(_entry(key) for key in previous_keys)
+    ).decode()
+
+
+def unpack_keys(value: str) -> List[PreviousKey]:
+    """Decode the previous keys of a packed key history record value."""
+    packed = base64.b64decode(value)
+    if not packed or packed[0] != PACKED_KEY_HISTORY_VERSION:
+        raise PackedKeyHistoryError("Unsupported packed key history layout")
+
+    previous_keys = []
+    offset = _VERSION.size
+    while offset < len(packed):
+        index, rotated_at, length = _ENTRY.unpack_from(packed, offset)
+        offset += _ENTRY.size
+        previous_keys.append(
+            PreviousKey(index, packed[offset : offset + length], rotated_at or None)
+        )
+        offset += length
+    return previous_keys
+
+
+def _entry(key: PreviousKey) -> bytes:
+    return _ENTRY.pack(key.index, int(key.rotated_at or 0), len(key.key)) + key.key
+
+
+def _append(value: str, key: PreviousKey) -> str:
+    return base64.b64encode(base64.b64decode(value) + _entry(key)).decode()
+
+
+def _packed_record(did: str, value: str) -> StorageRecord:
+    return StorageRecord(
+        type=PACKED_KEY_HISTORY_RECORD_TYPE,
+        value=value,
+        tags={"did": did},
+        id=_packed_record_id(did),
+    )
+
+
+def _packed_record_id(did: str) -> str:
+    # apart from the key history head's, on storages keying records by id alone
+    return f"{did}#packed"
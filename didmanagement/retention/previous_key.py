@@ -1,7 +1,18 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Optional
+
+from ..key_encodings import KeyEncodings
 
 
 @dataclass(frozen=True)
 class PreviousKey:
     index: int
     key: bytes
+    # epoch seconds the key was rotated out at, unknown for keys stored before it was kept
+    rotated_at: Optional[float] = field(default=None, compare=False)
+    # stored along with the key since it was rotated out, unknown for older keys
+    encodings: Optional[KeyEncodings] = field(default=None, compare=False, repr=False)
+
+    def key_encodings(self) -> KeyEncodings:
+        """Encodings of the key, derived when they were not stored with it."""
+        return self.encodings if self.encodings is not None else KeyEncodings.of(self.key)
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from aries_cloudagent.core.profile import Profile
+from aries_cloudagent.storage.base import BaseStorage
+
+from ..caching import invalidate_did_caches
+from .key_history_head import KeyHistoryHead
+from .listing import list_key_history_heads, storage_search
+from .migration import migrate_key_history_heads
+from .previous_key import PreviousKey
+from .storage_strategy import StorageBackendStorageStrategy
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """
+    Previous keys to keep: the `keep_last` most recent ones and/or the ones rotated out
+    less than `max_age` seconds ago. A key is pruned only when no configured rule keeps
+    it.
+    """
+
+    keep_last: Optional[int] = None
+    max_age: Optional[float] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.keep_last is not None or self.max_age is not None
+
+    def prunable(self, previous_keys: List[PreviousKey], now: float) -> List[PreviousKey]:
+        if not self.enabled:
+            return []
+
+        most_recent_first = sorted(previous_keys, key=lambda key: key.index, reverse=True)
+        return [
+            key
+            for position, key in enumerate(most_recent_first)
+            if not self._keeps(position, key, now)
+        ]
+
+    def needs_keys(self, head: KeyHistoryHead) -> bool:
+        """Whether the keys of a DID have to be looked at to apply the policy."""
+        return self.max_age is not None or head.count > self.keep_last
+
+    def _keeps(self, position: int, key: PreviousKey, now: float) -> bool:
+        if self.keep_last is not None and position < self.keep_last:
+            return True
+        # the age of keys stored before rotation times were recorded is unknown
+        return self.max_age is not None and (
+            key.rotated_at is None or key.rotated_at > now - self.max_age
+        )
+
+
+@dataclass
+class SweepResult:
+    dids_scanned: int = 0
+    dids_pruned: int = 0
+    records_pruned: int = 0
+    dry_run: bool = False
+
+
+class KeyHistorySweeper:
+    """Prune the key histories of every DID of a wallet following a retention policy."""
+
+    def __init__(
+        self,
+        profile: Profile,
+        policy: RetentionPolicy,
+        batch_size: int = 100,
+        pause: float = 0.1,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        :param profile: profile of the wallet to sweep
+        :param policy: previous keys to keep
+        :param batch_size: number of DIDs listed, and of records deleted, at once
+        :param pause: seconds to wait between batches, to leave room for other work
+        :param clock: current time, in epoch seconds
+        """
+        self.__profile = profile
+        self.__policy = policy
+        self.__batch_size = max(batch_size, 1)
+        self.__pause = pause
+        self.__clock = clock
+
+    async def sweep(self, dry_run: bool = False) -> SweepResult:
+        """
+        :param dry_run: only count the records that would be pruned
+        :return: counts of the DIDs looked at and of the records pruned
+        """
+        result = SweepResult(dry_run=dry_run)
+        if not self.__policy.enabled:
+            return result
+
+        # DIDs are listed from their head, those whose history predates heads get one
+        async with self.__profile.transaction() as transaction:
+            await migrate_key_history_heads(transaction.inject(BaseStorage))
+            await transaction.commit()
+
+        # pruning never removes head records, offsets stay valid while sweeping
+        offset, more = 0, True
+        while more:
+            async with self.__profile.session() as session:
+                heads, more = await list_key_history_heads(
+                    storage_search(session), offset, self.__batch_size
+                )
+            offset += len(heads)
+
+            for did, head in heads:
+                result.dids_scanned += 1
+                pruned = await self._sweep_did(did, head, dry_run)
+                if pruned:
+                    result.dids_pruned += 1
+                    result.records_pruned += pruned
+
+            await asyncio.sleep(self.__pause)
+
+        logger.info(
+            "%s %s previous keys of %s DIDs out of %s",
+            "Would prune" if dry_run else "Pruned",
+            result.records_pruned,
+            result.dids_pruned,
+            result.dids_scanned,
+        )
+        return result
+
+    async def run_periodically(self, interval: float, dry_run: bool = False):
+        """Sweep every `interval` seconds, until cancelled."""
+        while True:
+            try:
+                await self.sweep(dry_run)
+            except Exception:
+                logger.exception("Key history sweep failed")
+            await asyncio.sleep(interval)
+
+    async def _sweep_did(self, did: str, head: KeyHistoryHead, dry_run: bool) -> int:
+        if not self.__policy.needs_keys(head):
+            return 0
+
+        async with self.__profile.session() as session:
+            storage_strategy = StorageBackendStorageStrategy(session.inject(BaseStorage))
+            prunable = self.__policy.prunable(
+                await storage_strategy.stored_keys(did), self.__clock()
+            )
+        if dry_run or not prunable:
+            return len(prunable)
+
+        pruned = 0
+        indices = [key.index for key in prunable]
+        for start in range(0, len(indices), self.__batch_size):
+            async with self.__profile.transaction() as transaction:
+                storage_strategy = StorageBackendStorageStrategy(
+                    transaction.inject(BaseStorage)
+                )
+                pruned += await storage_strategy.delete_keys(
+                    did, indices[start : start + self.__batch_size]
+                )
+                await transaction.commit()
+            # cached documents and ETags would still show the pruned keys
+            await invalidate_did_caches(self.__profile, did)
+            await asyncio.sleep(self.__pause)
+
+        return pruned
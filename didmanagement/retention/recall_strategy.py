@@ -1,9 +1,10 @@
 import abc
 import logging
+import time
 from dataclasses import dataclass
-from typing import List
+from typing import Callable, Dict, List
 
-from . import PreviousKey
+from . import KeyHistoryHead, PreviousKey
 from .storage_strategy import StorageStrategy
 
 logger = logging.getLogger(__name__)
@@ -15,25 +16,83 @@ class RecallStrategyConfig:
 
 
 class RecallStrategy(abc.ABC):
-    async def previous_keys(self, did: str):
+    async def previous_keys(self, did: str, head: KeyHistoryHead = None):
         """Return previous keys based on a set strategy"""
 
+    async def previous_keys_for_dids(
+        self, heads: Dict[str, KeyHistoryHead]
+    ) -> Dict[str, List[PreviousKey]]:
+        """Return previous keys of several DIDs based on a set strategy"""
+        return {did: await self.previous_keys(did, head) for did, head in heads.items()}
+
 
 class NumberOfKeysStrategy(RecallStrategy):
     def __init__(self, storage_strategy: StorageStrategy, previous_keys: int = 0):
         self.__storage_strategy = storage_strategy
         self.__previous_keys = previous_keys
 
-    async def previous_keys(self, did: str) -> List[PreviousKey]:
-        all_previous_keys = await self.__storage_strategy.stored_keys(did)
-
-        reversed_previous_keys = sorted(
-            all_previous_keys, key=lambda previous_key: previous_key.index, reverse=True
+    async def previous_keys(
+        self, did: str, head: KeyHistoryHead = None
+    ) -> List[PreviousKey]:
+        latest_previous_keys = await self.__storage_strategy.latest_keys(
+            did, self.__previous_keys, head
         )
 
-        logging.info(
-            "Returning %s previous keys out of %s entries",
+        logger.info(
+            "Returning %s previous keys out of %s requested",
+            len(latest_previous_keys),
             self.__previous_keys,
-            len(reversed_previous_keys),
         )
-        return reversed_previous_keys[: self.__previous_keys]
+        return latest_previous_keys
+
+    async def previous_keys_for_dids(
+        self, heads: Dict[str, KeyHistoryHead]
+    ) -> Dict[str, List[PreviousKey]]:
+        return await self.__storage_strategy.latest_keys_for_dids(
+            heads, self.__previous_keys
+        )
+
+
+class TimeWindowStrategy(RecallStrategy):
+    """Recall the keys rotated out within the last `window` seconds, e.g. 30 days."""
+
+    def __init__(
+        self,
+        storage_strategy: StorageStrategy,
+        window: float,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        :param storage_strategy:
+        :param window: length of the time window, in seconds
+        :param clock: current time, in epoch seconds
+        """
+        self.__storage_strategy = storage_strategy
+        self.__window = window
+        self.__clock = clock
+
+    async def previous_keys(
+        self, did: str, head: KeyHistoryHead = None
+    ) -> List[PreviousKey]:
+        if head is not None and head.count == 0:
+            return []
+
+        recent_keys = await self.__storage_strategy.keys_rotated_since(
+            did, self.__clock() - self.__window
+        )
+
+        logger.info(
+            "Returning %s previous keys rotated out in the last %s seconds",
+            len(recent_keys),
+            self.__window,
+        )
+        return recent_keys
+
+    async def previous_keys_for_dids(
+        self, heads: Dict[str, KeyHistoryHead]
+    ) -> Dict[str, List[PreviousKey]]:
+        dids = [did for did, head in heads.items() if head.count > 0]
+        recent_keys = await self.__storage_strategy.keys_rotated_since_for_dids(
+            dids, self.__clock() - self.__window
+        )
+        return {did: recent_keys.get(did, []) for did in heads}
@@ -1,23 +1,53 @@
 import abc
 import base64
+import json
 import logging
-from typing import List
+import time
+from typing import Callable, Dict, Iterable, List, Optional
 
 from aries_cloudagent.storage.base import BaseStorage
+from aries_cloudagent.storage.error import (
+    StorageDuplicateError,
+    StorageError,
+    StorageNotFoundError,
+)
 from aries_cloudagent.storage.record import StorageRecord
 
+from ..key_encodings import MULTIBASE_BASE58BTC, KeyEncodings, multibase
+from ..tracing import traced
+from .key_history_head import KeyHistoryHead
 from .previous_key import PreviousKey
 
 PREVIOUS_PUBLIC_KEY_RECORD_TYPE = "PREVIOUS_PUBLIC_KEY"
+PREVIOUS_PUBLIC_KEY_HEAD_RECORD_TYPE = "PREVIOUS_PUBLIC_KEY_HEAD"
+# unencrypted, so that storages can run range queries on it
+ROTATED_AT_TAG = "~rotated_at"
+# on the heads of DIDs never rotated, which have no key history to list
+NO_HISTORY_TAG = "no_history"
 logger = logging.getLogger(__name__)
 
+# Concurrent rotations of a DID can only take each other's index so many times
+MAX_INDEX_ALLOCATION_ATTEMPTS = 100
+
+
+class KeyIndexAllocationError(StorageError):
+    """When no free index could be found to safe keep a key under."""
+
 
 class StorageStrategy(abc.ABC):
     async def stored_keys(self, did: str) -> List[PreviousKey]:
         """retrieve all previous keys valid for the current strategy"""
 
-    async def store_old_key(self, did: str, signing_key: bytes):
-        """Store a key as a "previous" key."""
+    async def store_old_key(
+        self, did: str, signing_key: bytes, head: KeyHistoryHead = None
+    ) -> Optional[KeyHistoryHead]:
+        """
+        Store a key as a "previous" key.
+        :param did:
+        :param signing_key:
+        :param head: key history head already loaded by the caller, if any
+        :return: the key history head after storing the key, None if nothing was stored
+        """
 
     async def current_index(self, did: str) -> int:
         """
@@ -25,54 +55,328 @@ class StorageStrategy(abc.ABC):
         :param did:
         :return:
         """
+        return (await self.head(did)).current_index
+
+    async def head(self, did: str) -> KeyHistoryHead:
+        """
+        Return the summary of the key history of a DID.
+        :param did:
+        :return:
+        """
+        return head_from_previous_keys(await self.stored_keys(did))
+
+    async def latest_keys(
+        self, did: str, number_of_keys: int, head: KeyHistoryHead = None
+    ) -> List[PreviousKey]:
+        """
+        Return at most `number_of_keys` previous keys, most recently rotated out first.
+        :param did:
+        :param number_of_keys:
+        :param head: key history head already loaded by the caller, if any
+        :return:
+        """
+        if number_of_keys <= 0:
+            return []
+
+        previous_keys = sorted(
+            await self.stored_keys(did), key=lambda key: key.index, reverse=True
+        )
+        return previous_keys[:number_of_keys]
+
+    async def heads(self, dids: List[str]) -> Dict[str, KeyHistoryHead]:
+        """
+        Return the key history heads of several DIDs.
+        :param dids:
+        :return: the head of every given DID
+        """
+        return {did: await self.head(did) for did in dids}
+
+    async def latest_keys_for_dids(
+        self, heads: Dict[str, KeyHistoryHead], number_of_keys: int
+    ) -> Dict[str, List[PreviousKey]]:
+        """
+        Return at most `number_of_keys` previous keys for each DID, most recent first.
+        :param heads: key history heads of the DIDs, by DID
+        :param number_of_keys:
+        :return: the previous keys of every given DID
+        """
+        return {
+            did: await self.latest_keys(did, number_of_keys, head)
+            for did, head in heads.items()
+        }
+
+    async def keys_rotated_since(self, did: str, since: float) -> List[PreviousKey]:
+        """
+        Return the previous keys rotated out at or after `since`, most recent first.
+        :param did:
+        :param since: start of the time window, in epoch seconds
+        :return: keys of unknown rotation time are left out
+        """
+        return _rotated_since(await self.stored_keys(did), since)
+
+    async def keys_rotated_since_for_dids(
+        self, dids: List[str], since: float
+    ) -> Dict[str, List[PreviousKey]]:
+        """
+        Return the previous keys rotated out at or after `since` for each DID, most
+        recent first.
+        :param dids:
+        :param since: start of the time window, in epoch seconds
+        :return: the previous keys of every given DID
+        """
+        return {did: await self.keys_rotated_since(did, since) for did in dids}
 
 
 class StorageBackendStorageStrategy(StorageStrategy):
-    def __init__(self, storage: BaseStorage):
+    def __init__(self, storage: BaseStorage, clock: Callable[[], float] = time.time):
         """
         :param storage:
+        :param clock: source of the rotation timestamps, in epoch seconds
         """
-        self.__storage = storage
+        self.__storage = traced(storage, "storage")
+        self.__clock = clock
 
     async def stored_keys(self, did) -> List[PreviousKey]:
         previous_keys = await self.__storage.find_all_records(
             PREVIOUS_PUBLIC_KEY_RECORD_TYPE, {"did": did}
         )
 
-        return [
-            PreviousKey(int(key.tags.get("index")), base64.b64decode(key.value))
-            for key in previous_keys
-        ]
+        return [_previous_key(key) for key in previous_keys]
 
-    async def store_old_key(self, did: str, signing_key: bytes):
+    async def store_old_key(
+        self, did: str, signing_key: bytes, head: KeyHistoryHead = None
+    ) -> KeyHistoryHead:
         """
         :param did: DID for which the key is being safe-kept
         :param signing_key: bytes of the DID's signing key
-        :return:
+        :param head: key history head already loaded by the caller, if any
+        :return: the key history head after storing the key
         """
-        # Store current key
+        head = head if head is not None else await self.head(did)
+
+        # Store current key. Its record id doubles as the index allocation: when a
+        # concurrent rotation took the index first, the insert fails and the next
+        # index is tried, so no two keys are ever kept under the same index.
         # record: (type, value, tags, id)
-        index = await self.current_index(did)
-        logger.info("Storing key %s with index %s for did %s", did, index, signing_key)
-
-        current_key_record = StorageRecord(
-            type=PREVIOUS_PUBLIC_KEY_RECORD_TYPE,
-            value=base64.b64encode(signing_key),
-            tags={"did": did, "index": str(index)},
-            id=f"{did}#{index}",
+        index = head.current_index
+        rotated_at = rotated_at_tag(self.__clock())
+        # encoded once here instead of on every DID document built with the key
+        value = _previous_key_value(KeyEncodings.of(signing_key))
+        for _ in range(MAX_INDEX_ALLOCATION_ATTEMPTS):
+            logger.info(
+                "Storing key %s with index %s for did %s", signing_key, index, did
+            )
+
+            current_key_record = StorageRecord(
+                type=PREVIOUS_PUBLIC_KEY_RECORD_TYPE,
+                value=value,
+                tags={"did": did, "index": str(index), ROTATED_AT_TAG: rotated_at},
+                id=f"{did}#{index}",
+            )
+            try:
+                await self.__storage.add_record(current_key_record)
+            except StorageDuplicateError:
+                logger.info("Index %s of did %s is already taken", index, did)
+                index += 1
+                continue
+
+            return await self._advance_head(did, index)
+
+        raise KeyIndexAllocationError(f"Could not allocate a key index for {did}")
+
+    async def _advance_head(self, did: str, index: int) -> KeyHistoryHead:
+        """Account for the key stored at index, merging with concurrent head updates."""
+        # The head was backfilled before allocating, a missing one means no history yet
+        for _ in range(MAX_INDEX_ALLOCATION_ATTEMPTS):
+            head_record = await self._stored_head_record(did, for_update=True)
+            if head_record is None:
+                new_head = KeyHistoryHead(latest_index=index, count=1)
+                try:
+                    await self.__storage.add_record(_head_record(did, new_head))
+                except StorageDuplicateError:
+                    # another rotation created the head meanwhile, merge into it
+                    continue
+                return new_head
+
+            head = KeyHistoryHead.from_json(head_record.value)
+            new_head = KeyHistoryHead(
+                latest_index=max(head.latest_index, index), count=head.count + 1
+            )
+            new_head_record = _head_record(did, new_head)
+            await self.__storage.update_record(
+                head_record, new_head_record.value, new_head_record.tags
+            )
+            return new_head
+
+        raise KeyIndexAllocationError(f"Could not update the key history head of {did}")
+
+    async def delete_keys(self, did: str, indices: List[int]) -> int:
+        """
+        Delete previous keys of a DID, the head keeps its latest index for new keys to
+        follow.
+        :param did:
+        :param indices: indices of the keys to delete
+        :return: number of keys deleted
+        """
+        deleted = 0
+        for index in indices:
+            try:
+                await self.__storage.delete_record(
+                    StorageRecord(
+                        PREVIOUS_PUBLIC_KEY_RECORD_TYPE, "", id=f"{did}#{index}"
+                    )
+                )
+            except StorageNotFoundError:
+                # pruned concurrently
+                continue
+            deleted += 1
+
+        head_record = await self._stored_head_record(did, for_update=True)
+        if deleted and head_record is not None:
+            head = KeyHistoryHead.from_json(head_record.value)
+            new_head = KeyHistoryHead(head.latest_index, max(head.count - deleted, 0))
+            await self.__storage.update_record(
+                head_record, new_head.to_json(), head_record.tags
+            )
+
+        return deleted
+
+    async def latest_keys(
+        self, did: str, number_of_keys: int, head: KeyHistoryHead = None
+    ) -> List[PreviousKey]:
+        if number_of_keys <= 0:
+            return []
+
+        head = head if head is not None else await self.head(did)
+        if head.count == 0:
+            return []
+
+        # Only ask for the indices that can be recalled instead of the whole history
+        previous_keys = await self.__storage.find_all_records(
+            PREVIOUS_PUBLIC_KEY_RECORD_TYPE,
+            {"did": did, "index": {"$in": _wanted_indices(head, number_of_keys)}},
         )
-        await self.__storage.add_record(current_key_record)
 
-    async def current_index(self, did: str) -> int:
+        return _most_recent_first(_previous_key(key) for key in previous_keys)
+
+    async def keys_rotated_since(self, did: str, since: float) -> List[PreviousKey]:
+        # Range query on the unencrypted tag, only the keys in the window are read
+        previous_keys = await self.__storage.find_all_records(
+            PREVIOUS_PUBLIC_KEY_RECORD_TYPE,
+            {"did": did, ROTATED_AT_TAG: {"$gte": rotated_at_tag(since)}},
+        )
+
+        return _most_recent_first(_previous_key(key) for key in previous_keys)
+
+    async def keys_rotated_since_for_dids(
+        self, dids: List[str], since: float
+    ) -> Dict[str, List[PreviousKey]]:
+        keys_by_did: Dict[str, List[PreviousKey]] = {did: [] for did in dids}
+        if not dids:
+            return keys_by_did
+
+        for record in await self.__storage.find_all_records(
+            PREVIOUS_PUBLIC_KEY_RECORD_TYPE,
+            {"did": {"$in": dids}, ROTATED_AT_TAG: {"$gte": rotated_at_tag(since)}},
+        ):
+            keys_by_did[record.tags["did"]].append(_previous_key(record))
+
+        return {did: _most_recent_first(keys) for did, keys in keys_by_did.items()}
+
+    async def heads(self, dids: List[str]) -> Dict[str, KeyHistoryHead]:
+        head_records = await self.__storage.find_all_records(
+            PREVIOUS_PUBLIC_KEY_HEAD_RECORD_TYPE, {"did": {"$in": dids}}
+        )
+        heads = {
+            record.tags["did"]: KeyHistoryHead.from_json(record.value)
+            for record in head_records
+        }
+
+        # Backfill the DIDs whose history predates head records, in one query as well
+        missing_dids = [did for did in dids if did not in heads]
+        if missing_dids:
+            previous_keys_by_did: Dict[str, List[PreviousKey]] = {}
+            for record in await self.__storage.find_all_records(
+                PREVIOUS_PUBLIC_KEY_RECORD_TYPE, {"did": {"$in": missing_dids}}
+            ):
+                previous_keys_by_did.setdefault(record.tags["did"], []).append(
+                    _previous_key(record)
+                )
+
+            for did in missing_dids:
+                head = head_from_previous_keys(previous_keys_by_did.get(did, []))
+                head_record = await self._backfill_head(did, head)
+                heads[did] = KeyHistoryHead.from_json(head_record.value)
+
+        return heads
+
+    async def latest_keys_for_dids(
+        self, heads: Dict[str, KeyHistoryHead], number_of_keys: int
+    ) -> Dict[str, List[PreviousKey]]:
+        latest_keys: Dict[str, List[PreviousKey]] = {did: [] for did in heads}
+        wanted = [
+            {"did": did, "index": {"$in": _wanted_indices(head, number_of_keys)}}
+            for did, head in heads.items()
+            if head.count > 0
+        ]
+        if number_of_keys <= 0 or not wanted:
+            return latest_keys
+
+        for record in await self.__storage.find_all_records(
+            PREVIOUS_PUBLIC_KEY_RECORD_TYPE, {"$or": wanted}
+        ):
+            latest_keys[record.tags["did"]].append(_previous_key(record))
+
+        return {did: _most_recent_first(keys) for did, keys in latest_keys.items()}
+
+    async def head(self, did: str) -> KeyHistoryHead:
+        """
+        Return the key history head for a DID, backfilling it from the stored keys if
+        needed.
+        :param did:
+        :return:
+        """
+        return KeyHistoryHead.from_json((await self._head_record(did)).value)
+
+    async def _head_record(self, did: str) -> StorageRecord:
+        head_record = await self._stored_head_record(did)
+        if head_record is not None:
+            return head_record
+
+        # No head yet: either the DID never rotated, or its history predates head records.
+        # An empty head is stored as well, so that the next reads of a DID never rotated
+        # do not look for its keys again.
         previous_keys = await self.stored_keys(did)
+        return await self._backfill_head(did, head_from_previous_keys(previous_keys))
 
-        indices = [key.index for key in previous_keys]
-        return max(indices) + 1 if len(previous_keys) > 0 else 1
+    async def _backfill_head(self, did: str, head: KeyHistoryHead) -> StorageRecord:
+        logger.info("Backfilling key history head for did %s", did)
+        head_record = _head_record(did, head)
+        try:
+            await self.__storage.add_record(head_record)
+        except StorageDuplicateError:
+            # backfilled by a concurrent read, or created by a rotation: it prevails
+            stored_head_record = await self._stored_head_record(did)
+            if stored_head_record is not None:
+                return stored_head_record
+        return head_record
+
+    async def _stored_head_record(
+        self, did: str, for_update: bool = False
+    ) -> Optional[StorageRecord]:
+        try:
+            return await self.__storage.get_record(
+                PREVIOUS_PUBLIC_KEY_HEAD_RECORD_TYPE, did, {"forUpdate": for_update}
+            )
+        except StorageNotFoundError:
+            return None
 
 
 class NoStorageStrategy(StorageStrategy):
-    async def store_old_key(self, did: str, signing_key: bytes):
-        return
+    async def store_old_key(
+        self, did: str, signing_key: bytes, head: KeyHistoryHead = None
+    ) -> Optional[KeyHistoryHead]:
+        return None
 
     async def stored_keys(self, did: str) -> List[PreviousKey]:
         """retrieve all previous keys valid for the current strategy"""
@@ -83,3 +387,92 @@ class NoStorageStrategy(StorageStrategy):
         Return the index for the currently in-use key based on the key history.
         """
         return 1
+
+    async def head(self, did: str) -> KeyHistoryHead:
+        return KeyHistoryHead()
+
+
+def head_from_previous_keys(previous_keys: List[PreviousKey]) -> KeyHistoryHead:
+    return KeyHistoryHead(
+        latest_index=max((key.index for key in previous_keys), default=0),
+        count=len(previous_keys),
+    )
+
+
+def _wanted_indices(head: KeyHistoryHead, number_of_keys: int) -> List[str]:
+    return [
+        str(index)
+        for index in range(
+            head.latest_index, max(head.latest_index - number_of_keys, 0), -1
+        )
+    ]
+
+
+def _most_recent_first(previous_keys: Iterable[PreviousKey]) -> List[PreviousKey]:
+    return sorted(
+        previous_keys, key=lambda previous_key: previous_key.index, reverse=True
+    )
+
+
+def _rotated_since(
+    previous_keys: Iterable[PreviousKey], since: float
+) -> List[PreviousKey]:
+    # compared at the precision of the tag, as storages do
+    since = int(since)
+    return _most_recent_first(
+        key
+        for key in previous_keys
+        if key.rotated_at is not None and key.rotated_at >= since
+    )
+
+
+def rotated_at_tag(timestamp: float) -> str:
+    # fixed width, so that string comparisons order timestamps too
+    return f"{int(timestamp):012d}"
+
+
+def _previous_key_value(encodings: KeyEncodings) -> str:
+    # the JWK x is the base64 of the key, which the value has always held
+    return json.dumps(
+        {
+            "key": encodings.jwk_x,
+            "base58": encodings.base58,
+            "multibase": encodings.multibase,
+        }
+    )
+
+
+def _previous_key(record: StorageRecord) -> PreviousKey:
+    rotated_at = record.tags.get(ROTATED_AT_TAG)
+    value = record.value.decode() if isinstance(record.value, bytes) else record.value
+    if value.startswith("{"):
+        stored = json.loads(value)
+        key = base64.b64decode(stored["key"])
+        stored_multibase = stored.get("multibase")
+        # missing, or stored without the multicodec prefix, it is derived from the key
+        if stored_multibase in (None, MULTIBASE_BASE58BTC + stored["base58"]):
+            stored_multibase = multibase(key)
+        encodings = KeyEncodings(stored["base58"], stored["key"], stored_multibase)
+    else:
+        # stored before the encodings were, the value is the base64 of the key alone
+        encodings = None
+        key = base64.b64decode(value)
+
+    return PreviousKey(
+        int(record.tags.get("index")),
+        key,
+        float(rotated_at) if rotated_at is not None else None,
+        encodings,
+    )
+
+
+def _head_record(did: str, head: KeyHistoryHead) -> StorageRecord:
+    tags = {"did": did}
+    if head == KeyHistoryHead():
+        tags[NO_HISTORY_TAG] = "1"
+    return StorageRecord(
+        type=PREVIOUS_PUBLIC_KEY_HEAD_RECORD_TYPE,
+        value=head.to_json(),
+        tags=tags,
+        id=did,
+    )
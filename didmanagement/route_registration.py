@@ -1,13 +1,41 @@
-from profile import Profile
-from typing import Optional
+import logging
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional
 
+from aries_cloudagent.core.error import BaseError
+from aries_cloudagent.core.profile import Profile
+from aries_cloudagent.messaging.responder import BaseResponder
+from aries_cloudagent.multitenant.route_manager import MultitenantRouteManager
+from aries_cloudagent.protocols.coordinate_mediation.v1_0.manager import MediationManager
 from aries_cloudagent.protocols.coordinate_mediation.v1_0.messages.keylist_update import (
     KeylistUpdate,
 )
 from aries_cloudagent.protocols.coordinate_mediation.v1_0.route_manager import (
     RouteManager,
 )
+from aries_cloudagent.protocols.routing.v1_0.manager import RoutingManager
+from aries_cloudagent.protocols.routing.v1_0.models.route_record import RouteRecord
+from aries_cloudagent.storage.error import StorageNotFoundError
 from aries_cloudagent.wallet.base import BaseWallet
+from aries_cloudagent.wallet.error import WalletNotFoundError
+
+logger = logging.getLogger(__name__)
+
+REGISTERED = "registered"
+ALREADY_REGISTERED = "already_registered"
+FAILED = "failed"
+
+
+@dataclass(frozen=True)
+class RouteRegistration:
+    did: str
+    status: str
+    error: Optional[str] = None
+
+    @property
+    def registered(self) -> bool:
+        return self.status != FAILED
 
 
 class RouteRegistrar:
@@ -22,10 +50,118 @@ class RouteRegistrar:
         """
         Register a route given a did and a recipient wallet
         :param did: DID on the receiving end of the route
-        :param wallet_id: wallet on the receiving end of the route
         :return:
         """
         did_record = await self.__wallet.get_local_did(did)
         return await self.__route_manager.route_public_did(
             self.__profile, did_record.verkey
         )
+
+    async def register_routes(
+        self, dids: List[str], chunk_size: int = 100
+    ) -> List[RouteRegistration]:
+        """
+        Register the routes of many DIDs, notifying the mediator of their keys in bulk.
+
+        Routes of a multi-tenant agent are recorded one by one, but their keys are sent to
+        the base wallet's mediator in as few keylist updates as possible. Other route
+        managers route each DID on its own.
+        :param dids: DIDs on the receiving end of the routes, duplicates are routed once
+        :param chunk_size: maximum number of keys per keylist update
+        :return: the registration of every DID, in the order they were given
+        """
+        unique_dids = list(dict.fromkeys(dids))
+        registrations: Dict[str, RouteRegistration] = {}
+        verkeys: Dict[str, str] = {}
+        for did in unique_dids:
+            try:
+                verkeys[did] = (await self.__wallet.get_local_did(did)).verkey
+            except WalletNotFoundError:
+                registrations[did] = RouteRegistration(did, FAILED, "Unknown DID")
+
+        if isinstance(self.__route_manager, MultitenantRouteManager):
+            registrations.update(
+                await self._register_multitenant_routes(verkeys, max(chunk_size, 1))
+            )
+        else:
+            for did, verkey in verkeys.items():
+                registrations[did] = await self._register_single_route(did, verkey)
+
+        return [registrations[did] for did in unique_dids]
+
+    async def _register_single_route(self, did: str, verkey: str) -> RouteRegistration:
+        try:
+            await self.__route_manager.route_public_did(self.__profile, verkey)
+        except BaseError as e:
+            return RouteRegistration(did, FAILED, _error_reason(e))
+        return RouteRegistration(did, REGISTERED)
+
+    async def _register_multitenant_routes(
+        self, verkeys: Dict[str, str], chunk_size: int
+    ) -> Dict[str, RouteRegistration]:
+        # Same steps as MultitenantRouteManager.route_public_did, the mediator excepted
+        route_manager: MultitenantRouteManager = self.__route_manager
+        root_profile = route_manager.root_profile
+        wallet_id = self.__profile.settings["wallet.id"]
+        routing_manager = RoutingManager(root_profile)
+
+        registrations: Dict[str, RouteRegistration] = {}
+        new_routes: Dict[str, RouteRecord] = {}
+        for did, verkey in verkeys.items():
+            try:
+                if await _route_exists(root_profile, verkey):
+                    registrations[did] = RouteRegistration(did, ALREADY_REGISTERED)
+                    continue
+                new_routes[did] = await routing_manager.create_route_record(
+                    recipient_key=verkey, internal_wallet_id=wallet_id
+                )
+            except BaseError as e:
+                registrations[did] = RouteRegistration(did, FAILED, _error_reason(e))
+                continue
+            registrations[did] = RouteRegistration(did, REGISTERED)
+
+        mediation_record = await route_manager.get_base_wallet_mediator()
+        if mediation_record is None or not new_routes:
+            return registrations
+
+        mediation_manager = MediationManager(root_profile)
+        responder = root_profile.inject(BaseResponder)
+        dids = list(new_routes)
+        for start in range(0, len(dids), chunk_size):
+            chunk = dids[start : start + chunk_size]
+            keylist_update = KeylistUpdate()
+            for did in chunk:
+                await mediation_manager.add_key(
+                    new_routes[did].recipient_key, keylist_update
+                )
+
+            try:
+                await responder.send(
+                    keylist_update, connection_id=mediation_record.connection_id
+                )
+            except BaseError as e:
+                # forget the routes, so that registering them again notifies the mediator
+                logger.warning("Could not send keylist update to the mediator: %s", e)
+                for did in chunk:
+                    await routing_manager.delete_route_record(new_routes[did])
+                    registrations[did] = RouteRegistration(did, FAILED, _error_reason(e))
+
+        logger.info(
+            "Registered %s routes in %s keylist updates",
+            len(new_routes),
+            math.ceil(len(new_routes) / chunk_size),
+        )
+        return registrations
+
+
+async def _route_exists(profile: Profile, verkey: str) -> bool:
+    try:
+        async with profile.session() as session:
+            await RouteRecord.retrieve_by_recipient_key(session, verkey)
+    except StorageNotFoundError:
+        return False
+    return True
+
+
+def _error_reason(error: Exception) -> str:
+    return str(error) or error.__class__.__name__
@@ -1,19 +1,37 @@
 from aiohttp import web
 
-from .mark_did_public import set_public_did
-from .register_route import register_route
-from .get_diddoc import fetch_diddoc
-from .rotate_key import rotate_key
-
 
 async def register(app: web.Application):
     """Register routes."""
+    # Handlers pull aiohttp_apispec, marshmallow schemas and the DID manager in, they are
+    # only imported by agents serving the admin API
+    from .cache_stats import diddoc_cache_stats
+    from .get_diddoc import fetch_diddoc
+    from .get_diddocs import fetch_diddocs
+    from .list_key_histories import list_key_histories
+    from .mark_did_public import set_public_did
+    from .metrics import didmanagement_metrics
+    from .prune_key_histories import prune_key_histories
+    from .register_route import register_route
+    from .register_routes import register_routes
+    from .rotate_key import rotate_key
+    from .rotate_keys import rotate_keys
+
     app.add_routes(
         [
             web.get("/wallet/{did}/diddoc", fetch_diddoc, allow_head=False),
+            web.post("/wallet/diddocs", fetch_diddocs),
+            web.get("/wallet/key-histories", list_key_histories, allow_head=False),
+            web.post("/wallet/key-histories/prune", prune_key_histories),
             web.put("/wallet/{did}/rotate-keys", rotate_key),
+            web.post("/wallet/rotate-keys", rotate_keys),
             web.put("/wallet/{did}/routing/register-route", register_route),
+            web.post("/wallet/routing/register-routes", register_routes),
             web.put("/wallet/{did}/mark-public", set_public_did),
+            web.get(
+                "/didmanagement/diddoc-cache/stats", diddoc_cache_stats, allow_head=False
+            ),
+            web.get("/didmanagement/metrics", didmanagement_metrics, allow_head=False),
         ]
     )
 
@@ -0,0 +1,20 @@
+from aiohttp import web
+from aiohttp_apispec import response_schema
+from aiohttp_apispec.decorators import docs
+from aries_cloudagent.admin.request_context import AdminRequestContext
+
+from ..caching import DIDDocCache
+from .openapi_config import OPENAPI_TAG
+from .schemas import CacheStatsSchema
+
+
+@docs(tags=[OPENAPI_TAG], summary="Hit/miss counters of the DID document cache")
+@response_schema(CacheStatsSchema())
+async def diddoc_cache_stats(request: web.Request):
+    context: AdminRequestContext = request["context"]
+
+    diddoc_cache = context.profile.inject_or(DIDDocCache)
+    if not diddoc_cache:
+        raise web.HTTPNotFound(reason="DID document cache is not enabled")
+
+    return web.json_response(data=diddoc_cache.stats())
@@ -1,41 +1,50 @@
+from functools import partial
+
 from aiohttp import web
 from aiohttp_apispec import querystring_schema, response_schema, match_info_schema
 from aiohttp_apispec.decorators import docs
 from aries_cloudagent.admin.request_context import AdminRequestContext
-from aries_cloudagent.storage.base import BaseStorage
-from aries_cloudagent.wallet.base import BaseWallet
 
-from ..did_manager import DIDManager
+from ..manager_factory import DIDManagerFactory
+from ..metrics import instrumented
 from .openapi_config import OPENAPI_TAG
 from .schemas import GetDIDDocSchema, DIDDocSchema, DIDSchema
-from ..retention import RecallStrategyConfig
 
 
 @docs(tags=[OPENAPI_TAG], summary="Gets DIDDoc for specified did")
 @match_info_schema(DIDSchema())
 @querystring_schema(GetDIDDocSchema())
 @response_schema(DIDDocSchema())
+@instrumented("fetch_diddoc")
 async def fetch_diddoc(request: web.Request):
     did = request.match_info.get("did")
-    print(did)
     if not did:
         raise web.HTTPBadRequest(reason="Request query must include DID")
     number_of_keys = int(request.query.get("number_of_keys", "1"))
 
     context: AdminRequestContext = request["context"]
+    manager_factory = context.profile.inject(DIDManagerFactory)
+    config = manager_factory.config.diddoc_endpoint
 
     async with context.profile.session() as session:
-        retention_strategy_config = (
-            RecallStrategyConfig(number_of_keys - 1) if number_of_keys >= 1 else None
+        manager = manager_factory.manager(session, max(number_of_keys - 1, 0))
+        # the document is not built when the client's copy is current
+        diddoc_json, etag = await manager.get_diddoc_json_with_etag(
+            did, is_current=partial(_etag_matches, request.headers.get("If-None-Match"))
         )
 
-        manager = DIDManager(
-            context.profile,
-            session.inject(BaseWallet),
-            session.inject(BaseStorage),
-            retention_strategy_config,
-        )
+    headers = {"ETag": etag, "Cache-Control": config.cache_control}
+    if diddoc_json is None:
+        raise web.HTTPNotModified(headers=headers)
+
+    return web.json_response(text=diddoc_json, headers=headers)
 
-        diddoc = await manager.get_diddoc(did)
 
-    return web.json_response(text=diddoc.to_json())
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # weak comparison, as RFC 9110 mandates for If-None-Match
+    return "*" in candidates or any(
+        candidate.removeprefix("W/") == etag for candidate in candidates
+    )
@@ -0,0 +1,41 @@
+from aiohttp import web
+from aiohttp_apispec import request_schema, response_schema
+from aiohttp_apispec.decorators import docs
+from aries_cloudagent.admin.request_context import AdminRequestContext
+
+from ..did_manager import UnknownDIDException
+from ..manager_factory import DIDManagerFactory
+from ..metrics import instrumented
+from .openapi_config import OPENAPI_TAG
+from .schemas import BulkDIDDocRequestSchema, BulkDIDDocResponseSchema
+
+
+@docs(tags=[OPENAPI_TAG], summary="Gets DIDDocs for a batch of DIDs")
+@request_schema(BulkDIDDocRequestSchema())
+@response_schema(BulkDIDDocResponseSchema())
+@instrumented("fetch_diddocs")
+async def fetch_diddocs(request: web.Request):
+    body = await request.json()
+    dids = body.get("dids")
+    if not dids:
+        raise web.HTTPBadRequest(reason="Request body must include DIDs")
+    number_of_keys = int(body.get("number_of_keys", 1))
+
+    context: AdminRequestContext = request["context"]
+    manager_factory = context.profile.inject(DIDManagerFactory)
+
+    async with context.profile.session() as session:
+        manager = manager_factory.manager(session, max(number_of_keys - 1, 0))
+
+        diddocs = await manager.get_diddocs(dids)
+
+    return web.json_response(
+        data={"results": [_result(did, diddoc) for did, diddoc in diddocs.items()]}
+    )
+
+
+def _result(did, diddoc) -> dict:
+    if isinstance(diddoc, UnknownDIDException):
+        return {"did": did, "error": "Unknown DID"}
+
+    return {"did": did, "diddoc": diddoc.serialize()}
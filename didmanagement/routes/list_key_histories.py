@@ -0,0 +1,64 @@
+import base64
+import binascii
+import json
+
+from aiohttp import web
+from aiohttp_apispec import querystring_schema, response_schema
+from aiohttp_apispec.decorators import docs
+from aries_cloudagent.admin.request_context import AdminRequestContext
+from aries_cloudagent.storage.base import BaseStorage
+
+from ..retention import list_key_history_heads, migrate_key_history_heads, storage_search
+from .openapi_config import OPENAPI_TAG
+from .schemas import KeyHistoryListQueryStringSchema, KeyHistoryListSchema
+
+DEFAULT_PAGE_SIZE = 100
+
+
+@docs(
+    tags=[OPENAPI_TAG],
+    summary="Lists the DIDs having rotated keys, with their current key index",
+)
+@querystring_schema(KeyHistoryListQueryStringSchema())
+@response_schema(KeyHistoryListSchema())
+async def list_key_histories(request: web.Request):
+    offset = _decode_cursor(request.query.get("cursor"))
+    limit = int(request.query.get("limit", DEFAULT_PAGE_SIZE))
+
+    context: AdminRequestContext = request["context"]
+
+    if not offset:
+        # the listing reads heads, DIDs whose history predates them get one first
+        async with context.profile.transaction() as transaction:
+            await migrate_key_history_heads(transaction.inject(BaseStorage))
+            await transaction.commit()
+
+    async with context.profile.session() as session:
+        heads, more = await list_key_history_heads(storage_search(session), offset, limit)
+
+    return web.json_response(
+        data={
+            "results": [
+                {
+                    "did": did,
+                    "current_index": head.current_index,
+                    "previous_keys": head.count,
+                }
+                for did, head in heads
+            ],
+            "next_cursor": _encode_cursor(offset + len(heads)) if more else None,
+        }
+    )
+
+
+def _encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> int:
+    if not cursor:
+        return 0
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(cursor.encode()))["offset"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise web.HTTPBadRequest(reason="Invalid cursor")
@@ -5,6 +5,8 @@ from aries_cloudagent.wallet.base import BaseWallet
 from aries_cloudagent.wallet.did_posture import DIDPosture
 from aries_cloudagent.wallet.routes import DIDResultSchema
 
+from ..caching import invalidate_did_caches
+from ..metrics import instrumented
 from .openapi_config import OPENAPI_TAG
 from didmanagement.routes.schemas import DIDSchema
 
@@ -16,6 +18,7 @@ from didmanagement.routes.schemas import DIDSchema
 )
 @match_info_schema(DIDSchema())
 @response_schema(DIDResultSchema, 200, description="The updated did.")
+@instrumented("set_public_did")
 async def set_public_did(request: web.Request):
     did = request.match_info.get("did")
     if not did:
@@ -27,6 +30,8 @@ async def set_public_did(request: web.Request):
         did_info = await transaction.inject(BaseWallet).set_public_did(did)
         await transaction.commit()
 
+    await invalidate_did_caches(context.profile, did)
+
     return web.json_response(
         data={
             "did": did_info.did,
@@ -0,0 +1,16 @@
+from aiohttp import web
+from aiohttp_apispec.decorators import docs
+
+from ..metrics import METRICS
+from .openapi_config import OPENAPI_TAG
+
+
+@docs(
+    tags=[OPENAPI_TAG],
+    summary="Counters, latencies and cache hit ratios in the Prometheus text format",
+)
+async def didmanagement_metrics(request: web.Request):
+    return web.Response(
+        text=METRICS.expose(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
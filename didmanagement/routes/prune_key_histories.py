@@ -0,0 +1,34 @@
+from dataclasses import asdict
+
+from aiohttp import web
+from aiohttp_apispec import request_schema, response_schema
+from aiohttp_apispec.decorators import docs
+from aries_cloudagent.admin.request_context import AdminRequestContext
+
+from ..config import DIDManagementConfig
+from ..retention import KeyHistorySweeper
+from .openapi_config import OPENAPI_TAG
+from .schemas import PruneKeyHistoriesRequestSchema, PruneKeyHistoriesResultSchema
+
+
+@docs(
+    tags=[OPENAPI_TAG],
+    summary="Prunes the previous keys of the wallet's DIDs per the retention policy",
+)
+@request_schema(PruneKeyHistoriesRequestSchema())
+@response_schema(PruneKeyHistoriesResultSchema())
+async def prune_key_histories(request: web.Request):
+    body = await request.json() if request.body_exists else {}
+    context: AdminRequestContext = request["context"]
+    retention = DIDManagementConfig.from_settings(context.settings).retention
+
+    policy = retention.policy()
+    if not policy.enabled:
+        raise web.HTTPBadRequest(reason="No retention policy is configured")
+
+    sweeper = KeyHistorySweeper(
+        context.profile, policy, retention.batch_size, retention.pause
+    )
+    result = await sweeper.sweep(dry_run=bool(body.get("dry_run", retention.dry_run)))
+
+    return web.json_response(data=asdict(result))
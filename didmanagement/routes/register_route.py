@@ -7,7 +7,9 @@ from aries_cloudagent.protocols.coordinate_mediation.v1_0.route_manager import (
 )
 from aries_cloudagent.wallet.base import BaseWallet
 
+from ..caching import invalidate_did_caches
 from ..route_registration import RouteRegistrar
+from ..metrics import instrumented
 from .openapi_config import OPENAPI_TAG
 from .schemas import DIDSchema
 
@@ -18,6 +20,7 @@ from .schemas import DIDSchema
     responses={201: {"description": "Route registered."}},
 )
 @match_info_schema(DIDSchema())
+@instrumented("register_route")
 async def register_route(request: web.Request):
     did = request.match_info.get("did")
     if not did:
@@ -34,4 +37,6 @@ async def register_route(request: web.Request):
         await route_registrar.register_route(did)
         await transaction.commit()
 
+    await invalidate_did_caches(context.profile, did)
+
     return web.Response(status=201)
@@ -0,0 +1,57 @@
+from aiohttp import web
+from aiohttp_apispec import request_schema, response_schema
+from aiohttp_apispec.decorators import docs
+from aries_cloudagent.admin.request_context import AdminRequestContext
+from aries_cloudagent.protocols.coordinate_mediation.v1_0.route_manager import (
+    RouteManager,
+)
+from aries_cloudagent.wallet.base import BaseWallet
+
+from ..caching import invalidate_did_caches
+from ..config import DIDManagementConfig
+from ..metrics import instrumented
+from ..route_registration import RouteRegistrar, RouteRegistration
+from .openapi_config import OPENAPI_TAG
+from .schemas import BulkRegisterRoutesRequestSchema, BulkRegisterRoutesResponseSchema
+
+
+@docs(
+    tags=[OPENAPI_TAG],
+    summary="Registers the routes of a batch of DIDs within a multi-tenanted agent.",
+)
+@request_schema(BulkRegisterRoutesRequestSchema())
+@response_schema(BulkRegisterRoutesResponseSchema())
+@instrumented("register_routes")
+async def register_routes(request: web.Request):
+    body = await request.json()
+    dids = body.get("dids")
+    if not dids:
+        raise web.HTTPBadRequest(reason="Request body must include DIDs")
+
+    context: AdminRequestContext = request["context"]
+    config = DIDManagementConfig.from_settings(context.settings).route_registration
+    chunk_size = int(body.get("chunk_size", config.keylist_chunk_size))
+
+    async with context.profile.transaction() as transaction:
+        route_registrar = RouteRegistrar(
+            context.profile,
+            transaction.inject(BaseWallet),
+            transaction.inject(RouteManager),
+        )
+        registrations = await route_registrar.register_routes(dids, chunk_size)
+        await transaction.commit()
+
+    for registration in registrations:
+        if registration.registered:
+            await invalidate_did_caches(context.profile, registration.did)
+
+    return web.json_response(
+        data={"results": [_result(registration) for registration in registrations]}
+    )
+
+
+def _result(registration: RouteRegistration) -> dict:
+    result = {"did": registration.did, "status": registration.status}
+    if registration.error is not None:
+        result["error"] = registration.error
+    return result
@@ -3,10 +3,10 @@ from aiohttp_apispec import response_schema, match_info_schema
 from aiohttp_apispec.decorators import docs
 
 from aries_cloudagent.admin.request_context import AdminRequestContext
-from aries_cloudagent.storage.base import BaseStorage
-from aries_cloudagent.wallet.base import BaseWallet
 
-from ..did_manager import DIDManager
+from ..events import notify_key_rotated
+from ..manager_factory import DIDManagerFactory
+from ..metrics import instrumented
 from .openapi_config import OPENAPI_TAG
 from .schemas import DIDDocSchema, DIDSchema
 
@@ -14,21 +14,25 @@ from .schemas import DIDDocSchema, DIDSchema
 @docs(tags=[OPENAPI_TAG], summary="Rotate keys for specified did, returns new DIDDoc")
 @match_info_schema(DIDSchema())
 @response_schema(DIDDocSchema())
+@instrumented("rotate_key")
 async def rotate_key(request: web.Request):
     did = request.match_info.get("did")
     if not did:
         raise web.HTTPBadRequest(reason="Request query must include DID")
 
     context: AdminRequestContext = request["context"]
+    manager_factory = context.profile.inject(DIDManagerFactory)
 
-    async with context.profile.transaction() as transaction:
-        manager = DIDManager(
-            context.profile,
-            transaction.inject(BaseWallet),
-            transaction.inject(BaseStorage),
-        )
+    # a rotation waiting for this one must read the key it commits
+    wallet_id = context.profile.settings.get("wallet.id")
+    async with manager_factory.did_locks.hold(wallet_id, [did]):
+        async with context.profile.transaction() as transaction:
+            manager = manager_factory.manager(transaction)
 
-        new_diddoc = await manager.rotate_key(did)
-        await transaction.commit()
+            rotation, new_diddoc = await manager.rotate(did, build_diddoc=True)
+            await transaction.commit()
+
+    # subscribers, the plugin's caches among them, only learn about committed rotations
+    await notify_key_rotated(context.profile, rotation)
 
     return web.json_response(text=new_diddoc.to_json())
@@ -0,0 +1,53 @@
+from aiohttp import web
+from aiohttp_apispec import request_schema, response_schema
+from aiohttp_apispec.decorators import docs
+from aries_cloudagent.admin.request_context import AdminRequestContext
+
+from ..bulk_rotation import BulkKeyRotator, RotationOutcome
+from ..manager_factory import DIDManagerFactory
+from ..metrics import instrumented
+from .openapi_config import OPENAPI_TAG
+from .schemas import BulkRotateKeysRequestSchema, BulkRotateKeysResponseSchema
+
+
+@docs(tags=[OPENAPI_TAG], summary="Rotate keys for a batch of DIDs")
+@request_schema(BulkRotateKeysRequestSchema())
+@response_schema(BulkRotateKeysResponseSchema())
+@instrumented("rotate_keys")
+async def rotate_keys(request: web.Request):
+    body = await request.json()
+    dids = body.get("dids")
+    if not dids:
+        raise web.HTTPBadRequest(reason="Request body must include DIDs")
+
+    context: AdminRequestContext = request["context"]
+    manager_factory = context.profile.inject(DIDManagerFactory)
+    config = manager_factory.config.bulk_rotation
+
+    concurrency = int(body.get("concurrency", config.max_concurrency))
+    rotator = BulkKeyRotator(
+        context.profile,
+        manager_factory.manager,
+        concurrency=min(concurrency, config.max_concurrency),
+        chunk_size=int(body.get("chunk_size", config.chunk_size)),
+        include_diddocs=not body.get("indices_only", False),
+        did_locks=manager_factory.did_locks,
+    )
+    outcomes = await rotator.rotate(dids)
+
+    return web.json_response(data={"results": [_result(outcome) for outcome in outcomes]})
+
+
+def _result(outcome: RotationOutcome) -> dict:
+    if not outcome.rotated:
+        return {"did": outcome.did, "status": "failed", "error": outcome.error}
+
+    result = {
+        "did": outcome.did,
+        "status": "rotated",
+        "old_index": outcome.rotation.old_index,
+        "new_index": outcome.rotation.new_index,
+    }
+    if outcome.diddoc is not None:
+        result["diddoc"] = outcome.diddoc.serialize()
+    return result
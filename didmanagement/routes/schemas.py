@@ -1,7 +1,7 @@
 import re
 
 from marshmallow import fields, INCLUDE, Schema
-from marshmallow.validate import Regexp
+from marshmallow.validate import Range, Regexp
 
 from aries_cloudagent.messaging.models.openapi import OpenAPISchema
 from aries_cloudagent.messaging.valid import GENERIC_DID_VALIDATE
@@ -44,9 +44,135 @@ class GetDIDDocSchema(OpenAPISchema):
 class DIDQueryStringSchema(OpenAPISchema):
     """Parameters and validators for set public DID request query string."""
 
-    did = fields.Str(description="DID of interest", required=True, validate=GENERIC_DID_VALIDATE)
+    did = fields.Str(
+        description="DID of interest", required=True, validate=GENERIC_DID_VALIDATE
+    )
 
 
 class DIDDocSchema(Schema):
     class Meta:
         unknown = INCLUDE
+
+
+class CacheStatsSchema(OpenAPISchema):
+    hits = fields.Int(required=True)
+    misses = fields.Int(required=True)
+    evictions = fields.Int(required=True, allow_none=True)
+    size = fields.Int(required=True, allow_none=True)
+    max_size = fields.Int(required=True, allow_none=True)
+
+
+class BulkDIDDocRequestSchema(OpenAPISchema):
+    dids = fields.List(
+        fields.Str(validate=GENERIC_DID_VALIDATE),
+        required=True,
+        description="DIDs to resolve",
+    )
+    number_of_keys = fields.Int(required=False)
+
+
+class BulkDIDDocResultSchema(OpenAPISchema):
+    did = fields.Str(required=True)
+    diddoc = fields.Dict(
+        required=False, description="DID document, when it could be built"
+    )
+    error = fields.Str(
+        required=False, description="Reason the DID document could not be built"
+    )
+
+
+class BulkDIDDocResponseSchema(OpenAPISchema):
+    results = fields.List(fields.Nested(BulkDIDDocResultSchema()), required=True)
+
+
+class BulkRotateKeysRequestSchema(OpenAPISchema):
+    dids = fields.List(
+        fields.Str(validate=GENERIC_DID_VALIDATE),
+        required=True,
+        description="DIDs to rotate the key of",
+    )
+    concurrency = fields.Int(
+        required=False,
+        description="Chunks rotated at the same time, capped by the config",
+    )
+    chunk_size = fields.Int(required=False, description="DIDs rotated per transaction")
+    indices_only = fields.Bool(
+        required=False, description="Only report key indices instead of new DIDDocs"
+    )
+
+
+class BulkRotateKeysResultSchema(OpenAPISchema):
+    did = fields.Str(required=True)
+    status = fields.Str(required=True, description="rotated or failed")
+    old_index = fields.Int(required=False)
+    new_index = fields.Int(required=False)
+    diddoc = fields.Dict(required=False)
+    error = fields.Str(required=False)
+
+
+class BulkRotateKeysResponseSchema(OpenAPISchema):
+    results = fields.List(fields.Nested(BulkRotateKeysResultSchema()), required=True)
+
+
+class BulkRegisterRoutesRequestSchema(OpenAPISchema):
+    dids = fields.List(
+        fields.Str(validate=GENERIC_DID_VALIDATE),
+        required=True,
+        description="DIDs to register a route for",
+    )
+    chunk_size = fields.Int(
+        required=False, description="Keys sent to the mediator per keylist update"
+    )
+
+
+class BulkRegisterRoutesResultSchema(OpenAPISchema):
+    did = fields.Str(required=True)
+    status = fields.Str(
+        required=True, description="registered, already_registered or failed"
+    )
+    error = fields.Str(required=False)
+
+
+class BulkRegisterRoutesResponseSchema(OpenAPISchema):
+    results = fields.List(fields.Nested(BulkRegisterRoutesResultSchema()), required=True)
+
+
+class KeyHistoryListQueryStringSchema(OpenAPISchema):
+    cursor = fields.Str(
+        required=False, description="Cursor returned with the previous page"
+    )
+    limit = fields.Int(
+        required=False,
+        validate=Range(min=1, max=1000),
+        description="Maximum number of DIDs in the page",
+    )
+
+
+class KeyHistorySummarySchema(OpenAPISchema):
+    did = fields.Str(required=True)
+    current_index = fields.Int(required=True, description="Index of the current key")
+    previous_keys = fields.Int(
+        required=True, description="Number of stored previous keys"
+    )
+
+
+class KeyHistoryListSchema(OpenAPISchema):
+    results = fields.List(fields.Nested(KeyHistorySummarySchema()), required=True)
+    next_cursor = fields.Str(
+        required=False, allow_none=True, description="Cursor of the next page, if any"
+    )
+
+
+class PruneKeyHistoriesRequestSchema(OpenAPISchema):
+    dry_run = fields.Bool(
+        required=False, description="Only count the previous keys that would be pruned"
+    )
+
+
+class PruneKeyHistoriesResultSchema(OpenAPISchema):
+    dids_scanned = fields.Int(required=True)
+    dids_pruned = fields.Int(required=True)
+    records_pruned = fields.Int(
+        required=True, description="Previous keys pruned, or that would be on a dry run"
+    )
+    dry_run = fields.Bool(required=True)
@@ -0,0 +1,213 @@
+import abc
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, ContextManager, Dict, Iterator, Optional, TypeVar, Union
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_span_id: Optional[str]
+    start_time: int
+    end_time: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def to_otlp(self) -> dict:
+        """The span as an OTLP/JSON span."""
+        status = (
+            {"code": "STATUS_CODE_ERROR", "message": self.error}
+            if self.error
+            else {"code": "STATUS_CODE_OK"}
+        )
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id or "",
+            "name": self.name,
+            "kind": "SPAN_KIND_INTERNAL",
+            "startTimeUnixNano": str(self.start_time),
+            "endTimeUnixNano": str(self.end_time),
+            "attributes": [
+                {"key": key, "value": {"stringValue": str(value)}}
+                for key, value in self.attributes.items()
+            ],
+            "status": status,
+        }
+
+
+class SpanExporter(abc.ABC):
+    @abc.abstractmethod
+    def export(self, span: Span):
+        """Hand over a finished span."""
+
+    def shutdown(self):
+        """Export the spans handed over so far, before the exporter is let go of."""
+
+
+class ConsoleSpanExporter(SpanExporter):
+    """Log finished spans, one OTLP/JSON span per line."""
+
+    def export(self, span: Span):
+        logger.info(json.dumps(span.to_otlp()))
+
+
+class FileSpanExporter(SpanExporter):
+    """
+    Append finished spans to a file, one OTLP/JSON span per line.
+
+    Spans are queued and written by a thread of their own, the event loop never waits on
+    the file.
+    """
+
+    def __init__(self, path: str):
+        self.__path = path
+        self.__spans: "queue.SimpleQueue[Optional[Span]]" = queue.SimpleQueue()
+        self.__writer = threading.Thread(
+            target=self._write, name="didmanagement-span-writer", daemon=True
+        )
+        self.__writer.start()
+
+    def export(self, span: Span):
+        self.__spans.put(span)
+
+    def shutdown(self):
+        self.__spans.put(None)
+        self.__writer.join()
+
+    def _write(self):
+        with open(self.__path, "a") as file:
+            while True:
+                # one write and flush for whatever was queued meanwhile
+                spans = [self.__spans.get()]
+                while not self.__spans.empty():
+                    spans.append(self.__spans.get())
+
+                file.writelines(
+                    json.dumps(span.to_otlp()) + os.linesep
+                    for span in spans
+                    if span is not None
+                )
+                file.flush()
+                if None in spans:
+                    return
+
+
+# spans of a request which was not sampled, none of its children are recorded either
+_UNSAMPLED = object()
+_current_span: ContextVar[Union[Span, object, None]] = ContextVar(
+    "didmanagement_current_span", default=None
+)
+
+
+class Tracer:
+    """Nested spans of the plugin's operations, off unless given an exporter."""
+
+    def __init__(self, exporter: SpanExporter = None, sample_rate: float = 1.0):
+        self.__exporter: Optional[SpanExporter] = None
+        self.configure(exporter, sample_rate)
+
+    def configure(self, exporter: Optional[SpanExporter], sample_rate: float = 1.0):
+        """
+        :param exporter: where finished spans go, tracing is off without one
+        :param sample_rate: share of the traces recorded, decided when they start
+        """
+        if self.__exporter is not None and self.__exporter is not exporter:
+            self.__exporter.shutdown()
+        self.__exporter = exporter
+        self.__sample_rate = sample_rate
+
+    @property
+    def enabled(self) -> bool:
+        return self.__exporter is not None
+
+    def span(self, name: str, **attributes: Any) -> ContextManager[Optional[Span]]:
+        """A span nested in the current one, or starting a trace when there is none."""
+        if self.__exporter is None:
+            return nullcontext()
+        return self._span(name, attributes)
+
+    @contextmanager
+    def _span(self, name: str, attributes: Dict[str, Any]) -> Iterator[Optional[Span]]:
+        parent = _current_span.get()
+        if parent is _UNSAMPLED or (
+            parent is None and random.random() >= self.__sample_rate
+        ):
+            token = _current_span.set(_UNSAMPLED)
+            try:
+                yield None
+            finally:
+                _current_span.reset(token)
+            return
+
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else _random_id(16),
+            span_id=_random_id(8),
+            parent_span_id=parent.span_id if parent else None,
+            start_time=time.time_ns(),
+            attributes=attributes,
+        )
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_time = time.time_ns()
+            self.__exporter.export(span)
+
+
+# shared by every profile of the agent process
+TRACER = Tracer()
+
+
+def traced(target: T, prefix: str) -> T:
+    """
+    Record a span around every coroutine method call of a wallet, storage or route
+    manager.
+    :param target:
+    :param prefix: span names are `<prefix>.<method>`
+    :return: the target itself when tracing is off
+    """
+    return _TracedProxy(target, prefix) if TRACER.enabled else target
+
+
+class _TracedProxy:
+    def __init__(self, target: Any, prefix: str):
+        self.__target = target
+        self.__prefix = prefix
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self.__target, name)
+        if not inspect.iscoroutinefunction(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        async def traced_call(*args, **kwargs):
+            with TRACER.span(f"{self.__prefix}.{name}"):
+                return await attribute(*args, **kwargs)
+
+        return traced_call
+
+
+def _random_id(length: int) -> str:
+    return random.getrandbits(length * 8).to_bytes(length, "big").hex()
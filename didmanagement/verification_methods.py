@@ -1,24 +1,36 @@
 import base64
 import logging
-from typing import List, Tuple, Optional
+from typing import TYPE_CHECKING, List, Tuple, Optional, Union
 
 import base58
-from aries_cloudagent.core.profile import Profile
+from aries_cloudagent.core.profile import Profile, ProfileSession
 from aries_cloudagent.storage.base import BaseStorage
 from aries_cloudagent.wallet.base import BaseWallet
-from aries_cloudagent.wallet.default_verification_key_strategy import BaseVerificationKeyStrategy
+from aries_cloudagent.wallet.default_verification_key_strategy import (
+    BaseVerificationKeyStrategy,
+)
 from aries_cloudagent.wallet.error import WalletNotFoundError
 from aries_cloudagent.wallet.key_type import KeyType
-from pydid.verification_method import JsonWebKey2020, Ed25519VerificationKey2018
 
-from didmanagement.retention import StorageBackendStorageStrategy
+from didmanagement.caching import KeyIndexCache
+from didmanagement.key_encodings import KeyEncodings
+from didmanagement.manager_factory import DIDManagerFactory
+from didmanagement.metrics import METRICS
+
+if TYPE_CHECKING:
+    from pydid.verification_method import JsonWebKey2020, Ed25519VerificationKey2018
 
 Did = str
 
 logger = logging.getLogger(__name__)
 
 
-def json_web_key_2020(did_value: Did, key_index: int, key: bytes) -> Tuple[JsonWebKey2020, List[str]]:
+def json_web_key_2020(
+    did_value: Did, key_index: int, key: bytes, encodings: KeyEncodings = None
+) -> Tuple["JsonWebKey2020", List[str]]:
+    # pydid is only loaded once a DID document is built, not when the plugin is set up
+    from pydid.verification_method import JsonWebKey2020
+
     return JsonWebKey2020(
         id=_verification_method_id(did_value, key_index),
         type=JsonWebKey2020.__name__,
@@ -27,43 +39,82 @@ def json_web_key_2020(did_value: Did, key_index: int, key: bytes) -> Tuple[JsonW
             "kty": "OKP",
             # TODO: remove hard-coding if we want to support more key types
             "crv": "Ed25519",
-            "x": base64.b64encode(key),
+            "x": encodings.jwk_x if encodings else base64.b64encode(key).decode(),
         },
     ), ["https://w3id.org/security/suite/jws-2020/v1"]
 
 
 def ed25519_verification_key_2018(
-    did_value: Did, key_index: int, key: bytes
-) -> Tuple[Ed25519VerificationKey2018, List[str]]:
+    did_value: Did, key_index: int, key: bytes, encodings: KeyEncodings = None
+) -> Tuple["Ed25519VerificationKey2018", List[str]]:
+    from pydid.verification_method import Ed25519VerificationKey2018
+
+    public_key_base58 = encodings.base58 if encodings else base58.b58encode(key).decode()
     return Ed25519VerificationKey2018(
         id=_verification_method_id(did_value, key_index),
         type=Ed25519VerificationKey2018.__name__,
         controller=did_value,
-        public_key_base58=base58.b58encode(key),
+        public_key_base58=public_key_base58,
     ), ["https://w3id.org/security/suites/ed25519-2018/v1"]
 
 
 class LatestVerificationKeyStrategy(BaseVerificationKeyStrategy):
-    async def get_verification_method_id_for_did(self, did: str,
-                                                 profile: Optional[Profile],
-                                                 allowed_verification_method_types: Optional[List[KeyType]] = None,
-                                                 proof_purpose: Optional[str] = None) -> Optional[str]:
-        async with profile.session() as session:
-            wallet = session.inject(BaseWallet)
-            try:
-                # Check is DID is known
-                await wallet.get_local_did(did.replace("did:sov:", ""))
-
-                # DID is known, get current keys count and derive key ID
-                storage = session.inject(BaseStorage)
-                storage_strategy = StorageBackendStorageStrategy(storage)
-                curr_idx = await storage_strategy.current_index(did)
-
-                return _verification_method_id(did, curr_idx)
-            except WalletNotFoundError:
-                # DID is unknown
+    def __init__(
+        self,
+        key_index_cache: KeyIndexCache = None,
+        manager_factory: DIDManagerFactory = None,
+    ):
+        self.__key_index_cache = key_index_cache
+        self.__manager_factory = manager_factory or DIDManagerFactory()
+
+    async def get_verification_method_id_for_did(
+        self,
+        did: str,
+        profile: Optional[Union[Profile, ProfileSession]],
+        allowed_verification_method_types: Optional[List[KeyType]] = None,
+        proof_purpose: Optional[str] = None,
+    ) -> Optional[str]:
+        with METRICS.operation("verification_method_lookup"):
+            session = profile if isinstance(profile, ProfileSession) else None
+            wallet_id = (session.profile if session else profile).settings.get(
+                "wallet.id"
+            )
+            if self.__key_index_cache is not None:
+                # taken first, an index read before a rotation committed is not cached
+                generation = await self.__key_index_cache.generation(wallet_id, did)
+                curr_idx = await self.__key_index_cache.get(wallet_id, did, generation)
+                if curr_idx is not None:
+                    return _verification_method_id(did, curr_idx)
+
+            # Reuse the caller's session when we are handed one
+            if session:
+                curr_idx = await self._current_index(did, session)
+            else:
+                async with profile.session() as session:
+                    curr_idx = await self._current_index(did, session)
+
+            if curr_idx is None:
                 return None
 
+            if self.__key_index_cache is not None:
+                await self.__key_index_cache.set(wallet_id, did, curr_idx, generation)
+
+            return _verification_method_id(did, curr_idx)
+
+    async def _current_index(self, did: str, session: ProfileSession) -> Optional[int]:
+        wallet = session.inject(BaseWallet)
+        try:
+            # Check is DID is known
+            await wallet.get_local_did(did.replace("did:sov:", ""))
+
+            # DID is known, get current keys count and derive key ID
+            storage_strategy = self.__manager_factory.storage_strategy(
+                session.inject(BaseStorage)
+            )
+            return await storage_strategy.current_index(did)
+        except WalletNotFoundError:
+            # DID is unknown
+            return None
 
 
 def _verification_method_id(did_value: Did, key_index: int) -> str:
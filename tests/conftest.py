@@ -2,6 +2,8 @@ from typing import Mapping
 
 import pytest
 from aries_cloudagent.storage.base import BaseStorage
+from aries_cloudagent.storage.error import StorageDuplicateError, StorageNotFoundError
+from aries_cloudagent.storage.in_memory import tag_query_match
 from aries_cloudagent.storage.record import StorageRecord
 
 
@@ -10,26 +12,38 @@ class DummyStorage(BaseStorage):
         self.store = dict()
 
     async def add_record(self, record: StorageRecord):
+        if record.id in self.store:
+            raise StorageDuplicateError(f"Duplicate record: {record.id}")
         self.store[record.id] = record
 
     async def get_record(
         self, record_type: str, record_id: str, options: Mapping = None
     ) -> StorageRecord:
-        return self.store[record_id]
+        record = self.store.get(record_id)
+        if not record or record.type != record_type:
+            raise StorageNotFoundError(f"Record not found: {record_id}")
+        return record
 
     async def find_all_records(
         self, type_filter: str, tag_query: Mapping = None, options: Mapping = None
     ):
-        return [v for v in self.store.values()]
+        return [
+            v
+            for v in self.store.values()
+            if v.type == type_filter and tag_query_match(v.tags, tag_query)
+        ]
 
     async def update_record(self, record: StorageRecord, value: str, tags: Mapping):
-        pass
+        self.store[record.id] = StorageRecord(record.type, value, tags, record.id)
 
     async def delete_record(self, record: StorageRecord):
-        pass
+        if record.id not in self.store:
+            raise StorageNotFoundError(f"Record not found: {record.id}")
+        del self.store[record.id]
 
     async def delete_all_records(self, type_filter: str, tag_query: Mapping = None):
-        pass
+        for record in await self.find_all_records(type_filter, tag_query):
+            del self.store[record.id]
 
 
 @pytest.fixture
@@ -0,0 +1,95 @@
+import base64
+
+import pytest
+from aries_cloudagent.core.in_memory import InMemoryProfile
+from aries_cloudagent.storage.in_memory import InMemoryStorage
+from aries_cloudagent.storage.record import StorageRecord
+
+from didmanagement.retention import (
+    KeyHistoryHead,
+    StorageBackendStorageStrategy,
+    list_key_history_heads,
+    migrate_key_history_heads,
+)
+from didmanagement.retention.storage_strategy import PREVIOUS_PUBLIC_KEY_RECORD_TYPE
+
+
+@pytest.fixture
+def in_memory_storage():
+    yield InMemoryStorage(InMemoryProfile.test_profile())
+
+
+@pytest.mark.asyncio
+async def test_list_key_history_heads_pages_through_every_did(in_memory_storage):
+    # given
+    storage_strategy = StorageBackendStorageStrategy(in_memory_storage)
+    for i in range(5):
+        for _ in range(i + 1):
+            await storage_strategy.store_old_key(f"did:web:example.com:{i}", b"key")
+
+    # when
+    pages = []
+    offset, more = 0, True
+    while more:
+        heads, more = await list_key_history_heads(in_memory_storage, offset, limit=2)
+        pages.append(heads)
+        offset += len(heads)
+
+    # then
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert dict(head for page in pages for head in page) == {
+        f"did:web:example.com:{i}": KeyHistoryHead(latest_index=i + 1, count=i + 1)
+        for i in range(5)
+    }
+
+
+@pytest.mark.asyncio
+async def test_list_key_history_heads_past_the_end_is_empty(in_memory_storage):
+    # given
+    await StorageBackendStorageStrategy(in_memory_storage).store_old_key(
+        "did:web:example.com", b"key"
+    )
+
+    # when
+    heads, more = await list_key_history_heads(in_memory_storage, offset=3, limit=2)
+
+    # then
+    assert heads == []
+    assert not more
+
+
+@pytest.mark.asyncio
+async def test_list_key_history_heads_lists_legacy_dids_once_migrated(in_memory_storage):
+    # given - a key stored before head records were
+    await in_memory_storage.add_record(
+        StorageRecord(
+            PREVIOUS_PUBLIC_KEY_RECORD_TYPE,
+            base64.b64encode(b"key").decode(),
+            {"did": "did:web:example.com", "index": "1"},
+            "did:web:example.com#1",
+        )
+    )
+
+    # when
+    before, _ = await list_key_history_heads(in_memory_storage)
+    await migrate_key_history_heads(in_memory_storage)
+    after, _ = await list_key_history_heads(in_memory_storage)
+
+    # then
+    assert before == []
+    assert after == [("did:web:example.com", KeyHistoryHead(latest_index=1, count=1))]
+
+
+@pytest.mark.asyncio
+async def test_list_key_history_heads_leaves_out_dids_never_rotated(in_memory_storage):
+    # given
+    storage_strategy = StorageBackendStorageStrategy(in_memory_storage)
+    await storage_strategy.store_old_key("did:web:example.com:rotated", b"key")
+    await storage_strategy.head("did:web:example.com:never-rotated")
+
+    # when
+    heads, more = await list_key_history_heads(in_memory_storage)
+
+    # then
+    assert heads == [("did:web:example.com:rotated", KeyHistoryHead(1, 1))]
+    assert not more
@@ -0,0 +1,191 @@
+import base64
+from unittest.mock import AsyncMock
+
+import pytest
+from aries_cloudagent.storage.record import StorageRecord
+
+from didmanagement.retention import (
+    KeyHistoryHead,
+    PackedStorageStrategy,
+    PreviousKey,
+    StorageBackendStorageStrategy,
+    pack_key_histories,
+)
+from didmanagement.retention.packed_storage_strategy import (
+    PACKED_KEY_HISTORY_RECORD_TYPE,
+    pack_keys,
+    unpack_keys,
+)
+from didmanagement.retention.storage_strategy import (
+    PREVIOUS_PUBLIC_KEY_HEAD_RECORD_TYPE,
+    PREVIOUS_PUBLIC_KEY_RECORD_TYPE,
+)
+
+
+def test_packed_keys_round_trip():
+    # given
+    previous_keys = [
+        PreviousKey(1, bytes(32)),
+        PreviousKey(2, bytes(range(32)), 1700000000.0),
+    ]
+
+    # when
+    unpacked = unpack_keys(pack_keys(previous_keys))
+
+    # then
+    assert unpacked == previous_keys
+    assert [key.rotated_at for key in unpacked] == [None, 1700000000]
+
+
+@pytest.mark.asyncio
+async def test_packed_strategy_appends_keys_to_a_single_record(dummy_storage):
+    # given
+    did = "did:phone:911"
+    storage = PackedStorageStrategy(dummy_storage)
+
+    # when
+    await storage.store_old_key(did, b"abc")
+    get_record = AsyncMock(wraps=dummy_storage.get_record)
+    update_record = AsyncMock(wraps=dummy_storage.update_record)
+    dummy_storage.get_record, dummy_storage.update_record = get_record, update_record
+    head = await storage.store_old_key(did, b"def")
+
+    # then
+    assert head == KeyHistoryHead(2, 2)
+    assert (get_record.call_count, update_record.call_count) == (1, 1)
+    assert [record.type for record in dummy_storage.store.values()] == [
+        PACKED_KEY_HISTORY_RECORD_TYPE
+    ]
+    assert await storage.latest_keys(did, 1) == [PreviousKey(2, b"def")]
+    assert await storage.current_index(did) == 3
+
+
+@pytest.mark.asyncio
+async def test_packed_strategy_reads_histories_of_several_dids_at_once(dummy_storage):
+    # given
+    storage = PackedStorageStrategy(dummy_storage)
+    for did, rotations in (("did:phone:911", 3), ("did:phone:112", 1)):
+        for i in range(rotations):
+            await storage.store_old_key(did, bytes([i]))
+    find_all_records = AsyncMock(wraps=dummy_storage.find_all_records)
+    dummy_storage.find_all_records = find_all_records
+
+    # when
+    heads = await storage.heads(["did:phone:911", "did:phone:112", "did:phone:999"])
+    latest_keys = await storage.latest_keys_for_dids(heads, 2)
+
+    # then
+    assert heads == {
+        "did:phone:911": KeyHistoryHead(3, 3),
+        "did:phone:112": KeyHistoryHead(1, 1),
+        "did:phone:999": KeyHistoryHead(),
+    }
+    assert latest_keys == {
+        "did:phone:911": [PreviousKey(3, bytes([2])), PreviousKey(2, bytes([1]))],
+        "did:phone:112": [PreviousKey(1, bytes([0]))],
+        "did:phone:999": [],
+    }
+    # the keys of the DIDs without a packed history are looked for once
+    assert find_all_records.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_pack_key_histories_converts_one_record_per_key_histories(dummy_storage):
+    # given
+    records = StorageBackendStorageStrategy(dummy_storage)
+    for did, rotations in (("did:phone:911", 3), ("did:phone:112", 1)):
+        for i in range(rotations):
+            await records.store_old_key(did, bytes([i]))
+
+    # when
+    converted = await pack_key_histories(dummy_storage)
+
+    # then
+    packed = PackedStorageStrategy(dummy_storage)
+    assert converted == 2
+    assert sorted(record.type for record in dummy_storage.store.values()) == [
+        PACKED_KEY_HISTORY_RECORD_TYPE,
+        PACKED_KEY_HISTORY_RECORD_TYPE,
+        PREVIOUS_PUBLIC_KEY_HEAD_RECORD_TYPE,
+        PREVIOUS_PUBLIC_KEY_HEAD_RECORD_TYPE,
+    ]
+    assert await packed.stored_keys("did:phone:911") == [
+        PreviousKey(i + 1, bytes([i])) for i in range(3)
+    ]
+    assert await packed.head("did:phone:112") == KeyHistoryHead(1, 1)
+
+
+@pytest.mark.asyncio
+async def test_packed_strategy_carries_on_histories_kept_one_record_per_key(
+    dummy_storage,
+):
+    # given
+    did = "did:phone:911"
+    records = StorageBackendStorageStrategy(dummy_storage)
+    for i in range(2):
+        await records.store_old_key(did, bytes([i]))
+    packed = PackedStorageStrategy(dummy_storage)
+
+    # when
+    before_rotation = await packed.head(did)
+    head = await packed.store_old_key(did, bytes([2]))
+
+    # then
+    assert before_rotation == KeyHistoryHead(2, 2)
+    assert head == KeyHistoryHead(3, 3)
+    assert await records.stored_keys(did) == []
+    assert await packed.stored_keys(did) == [
+        PreviousKey(i + 1, bytes([i])) for i in range(3)
+    ]
+    assert await packed.heads([did]) == {did: KeyHistoryHead(3, 3)}
+
+
+@pytest.mark.asyncio
+async def test_packed_strategy_carries_on_histories_without_a_head(dummy_storage):
+    # given - keys stored before head records were, e.g. in a sub-wallet not migrated
+    did = "did:phone:911"
+    for index in (1, 2):
+        await dummy_storage.add_record(
+            StorageRecord(
+                PREVIOUS_PUBLIC_KEY_RECORD_TYPE,
+                base64.b64encode(bytes([index])).decode(),
+                {"did": did, "index": str(index)},
+                f"{did}#{index}",
+            )
+        )
+    packed = PackedStorageStrategy(dummy_storage)
+
+    # when
+    current_index = await packed.current_index(did)
+    heads = await packed.heads([did])
+    head = await packed.store_old_key(did, bytes([3]))
+
+    # then
+    assert current_index == 3
+    assert heads == {did: KeyHistoryHead(2, 2)}
+    assert head == KeyHistoryHead(3, 3)
+    assert await packed.stored_keys(did) == [
+        PreviousKey(i, bytes([i])) for i in (1, 2, 3)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_packed_strategy_recalls_keys_from_the_read_of_the_head(dummy_storage):
+    # given
+    did = "did:phone:911"
+    packed = PackedStorageStrategy(dummy_storage)
+    for i in range(3):
+        await packed.store_old_key(did, bytes([i]))
+    get_record = AsyncMock(wraps=dummy_storage.get_record)
+    dummy_storage.get_record = get_record
+
+    # when
+    head = await packed.head(did)
+    latest_keys = await packed.latest_keys(did, 2, head)
+
+    # then
+    assert latest_keys == [PreviousKey(3, bytes([2])), PreviousKey(2, bytes([1]))]
+    assert get_record.call_count == 1
+    # later recalls read the history again
+    assert await packed.latest_keys(did, 1, head) == [PreviousKey(3, bytes([2]))]
+    assert get_record.call_count == 2
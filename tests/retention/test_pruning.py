@@ -0,0 +1,159 @@
+import pytest
+from aries_cloudagent.core.in_memory import InMemoryProfile
+from aries_cloudagent.storage.base import BaseStorage
+from aries_cloudagent.storage.record import StorageRecord
+
+from didmanagement.caching import DIDDocCache
+from didmanagement.retention import (
+    KeyHistoryHead,
+    KeyHistorySweeper,
+    PreviousKey,
+    RetentionPolicy,
+    StorageBackendStorageStrategy,
+)
+from didmanagement.retention.storage_strategy import PREVIOUS_PUBLIC_KEY_RECORD_TYPE
+
+DAY = 86400
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100 * DAY
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def profile():
+    yield InMemoryProfile.test_profile()
+
+
+async def _rotate(profile, did: str, times: int, clock: FakeClock, every: float = DAY):
+    async with profile.session() as session:
+        storage_strategy = StorageBackendStorageStrategy(
+            session.inject(BaseStorage), clock
+        )
+        for i in range(times):
+            await storage_strategy.store_old_key(did, f"key {i}".encode())
+            clock.now += every
+
+
+async def _history(profile, did: str):
+    async with profile.session() as session:
+        storage_strategy = StorageBackendStorageStrategy(session.inject(BaseStorage))
+        return (
+            sorted(key.index for key in await storage_strategy.stored_keys(did)),
+            await storage_strategy.head(did),
+        )
+
+
+def test_retention_policy_prunes_keys_no_rule_keeps():
+    # given
+    now = 100 * DAY
+    keys = [PreviousKey(i, b"key", now - (10 - i) * DAY) for i in range(1, 10)]
+    keys.append(PreviousKey(10, b"legacy key"))
+
+    # then
+    assert RetentionPolicy().prunable(keys, now) == []
+    assert [key.index for key in RetentionPolicy(keep_last=3).prunable(keys, now)] == [
+        7,
+        6,
+        5,
+        4,
+        3,
+        2,
+        1,
+    ]
+    assert [
+        key.index for key in RetentionPolicy(max_age=3.5 * DAY).prunable(keys, now)
+    ] == [6, 5, 4, 3, 2, 1]
+    assert [
+        key.index
+        for key in RetentionPolicy(keep_last=6, max_age=3.5 * DAY).prunable(keys, now)
+    ] == [4, 3, 2, 1]
+
+
+@pytest.mark.asyncio
+async def test_sweeper_keeps_last_keys_of_every_did(profile):
+    # given
+    clock = FakeClock()
+    await _rotate(profile, "did:web:example.com:a", 5, clock)
+    await _rotate(profile, "did:web:example.com:b", 2, clock)
+    sweeper = KeyHistorySweeper(
+        profile, RetentionPolicy(keep_last=2), batch_size=2, pause=0
+    )
+
+    # when
+    dry_run = await sweeper.sweep(dry_run=True)
+    dry_run_history = await _history(profile, "did:web:example.com:a")
+    result = await sweeper.sweep()
+
+    # then
+    assert (dry_run.records_pruned, dry_run.dids_pruned, dry_run.dry_run) == (3, 1, True)
+    assert dry_run_history[0] == [1, 2, 3, 4, 5]
+    assert (result.dids_scanned, result.dids_pruned, result.records_pruned) == (2, 1, 3)
+    assert await _history(profile, "did:web:example.com:a") == (
+        [4, 5],
+        KeyHistoryHead(latest_index=5, count=2),
+    )
+    assert (await _history(profile, "did:web:example.com:b"))[0] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_sweeper_prunes_old_keys_but_not_those_of_unknown_age(profile):
+    # given
+    did = "did:web:example.com"
+    clock = FakeClock()
+    async with profile.session() as session:
+        # stored before rotation times were recorded
+        await session.inject(BaseStorage).add_record(
+            StorageRecord(
+                PREVIOUS_PUBLIC_KEY_RECORD_TYPE,
+                "bGVnYWN5",
+                {"did": did, "index": "1"},
+                f"{did}#1",
+            )
+        )
+    await _rotate(profile, did, 4, clock)
+    sweeper = KeyHistorySweeper(
+        profile, RetentionPolicy(max_age=2.5 * DAY), pause=0, clock=clock
+    )
+
+    # when
+    result = await sweeper.sweep()
+
+    # then
+    assert result.records_pruned == 2
+    assert (await _history(profile, did))[0] == [1, 4, 5]
+    # new keys keep following the latest index
+    await _rotate(profile, did, 1, clock)
+    assert (await _history(profile, did))[1] == KeyHistoryHead(latest_index=6, count=4)
+
+
+@pytest.mark.asyncio
+async def test_sweeper_prunes_legacy_histories_and_forgets_their_documents(profile):
+    # given - keys stored before head records were
+    did = "did:web:example.com"
+    async with profile.session() as session:
+        for index in range(1, 5):
+            await session.inject(BaseStorage).add_record(
+                StorageRecord(
+                    PREVIOUS_PUBLIC_KEY_RECORD_TYPE,
+                    "bGVnYWN5",
+                    {"did": did, "index": str(index)},
+                    f"{did}#{index}",
+                )
+            )
+    diddoc_cache = DIDDocCache()
+    profile.context.injector.bind_instance(DIDDocCache, diddoc_cache)
+    await diddoc_cache.set(None, did, 4, "ed25519_verification_key_2018", "{}")
+    sweeper = KeyHistorySweeper(profile, RetentionPolicy(keep_last=1), pause=0)
+
+    # when
+    result = await sweeper.sweep()
+
+    # then
+    assert (result.dids_scanned, result.records_pruned) == (1, 3)
+    assert await _history(profile, did) == ([4], KeyHistoryHead(latest_index=4, count=1))
+    assert await diddoc_cache.get(None, did, 4, "ed25519_verification_key_2018") is None
@@ -2,7 +2,13 @@ from typing import List
 
 import pytest
 
-from didmanagement.retention import NumberOfKeysStrategy, StorageStrategy, PreviousKey
+from didmanagement.retention import (
+    KeyHistoryHead,
+    NumberOfKeysStrategy,
+    PreviousKey,
+    StorageStrategy,
+    TimeWindowStrategy,
+)
 
 
 class DummyStorageStrategy(StorageStrategy):
@@ -59,3 +65,28 @@ async def test_number_of_keys_strategy_returns_keys_in_descending_order_of_creat
 
     # then
     assert recalled_keys == sorted(stored_keys, key=lambda k: k.index, reverse=True)
+
+
+@pytest.mark.asyncio
+async def test_time_window_strategy_returns_keys_rotated_out_within_the_window():
+    # given
+    day = 86400
+    now = 100 * day
+    stored_keys = [
+        PreviousKey(1, b"abc"),
+        PreviousKey(2, b"abc", now - 40 * day),
+        PreviousKey(3, b"abc", now - 20 * day),
+        PreviousKey(4, b"abc", now - day),
+    ]
+    storage_strategy = DummyStorageStrategy(stored_keys)
+
+    # when
+    recall_strategy = TimeWindowStrategy(storage_strategy, 30 * day, lambda: now)
+    recalled_keys = await recall_strategy.previous_keys("did:phone:911")
+    recalled_keys_by_did = await recall_strategy.previous_keys_for_dids(
+        {"did:phone:911": KeyHistoryHead(4, 4), "did:phone:112": KeyHistoryHead()}
+    )
+
+    # then
+    assert [key.index for key in recalled_keys] == [4, 3]
+    assert recalled_keys_by_did == {"did:phone:911": recalled_keys, "did:phone:112": []}
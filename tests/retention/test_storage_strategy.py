@@ -1,6 +1,43 @@
+import asyncio
+import base64
+import json
+from unittest.mock import AsyncMock
+
 import pytest
+from aries_cloudagent.did.did_key import DIDKey
+from aries_cloudagent.storage.record import StorageRecord
+from aries_cloudagent.wallet.key_type import ED25519
+
+from didmanagement.key_encodings import KeyEncodings
+from didmanagement.retention import (
+    KeyHistoryHead,
+    NoStorageStrategy,
+    PreviousKey,
+    StorageBackendStorageStrategy,
+    backfill_key_history_heads,
+    migrate_key_history_heads,
+)
+from didmanagement.retention.storage_strategy import (
+    PREVIOUS_PUBLIC_KEY_HEAD_RECORD_TYPE,
+    PREVIOUS_PUBLIC_KEY_RECORD_TYPE,
+)
+from tests.conftest import DummyStorage
+
+
+class YieldingStorage(DummyStorage):
+    """Gives control back to the event loop before every storage call."""
 
-from didmanagement.retention import NoStorageStrategy, StorageBackendStorageStrategy, PreviousKey
+    async def add_record(self, record):
+        await asyncio.sleep(0)
+        await super().add_record(record)
+
+    async def get_record(self, record_type, record_id, options=None):
+        await asyncio.sleep(0)
+        return await super().get_record(record_type, record_id, options)
+
+    async def find_all_records(self, type_filter, tag_query=None, options=None):
+        await asyncio.sleep(0)
+        return await super().find_all_records(type_filter, tag_query, options)
 
 
 @pytest.mark.asyncio
@@ -16,6 +53,45 @@ async def test_storage_backend_strategy_stores_keys_and_recall_with_index(dummy_
     assert await storage.stored_keys(did) == [PreviousKey(1, b"abc")]
 
 
+@pytest.mark.asyncio
+async def test_storage_backend_strategy_stores_the_encodings_of_keys(dummy_storage):
+    # given
+    did = "did:phone:911"
+    key = bytes(range(32))
+
+    # when
+    storage = StorageBackendStorageStrategy(dummy_storage)
+    await storage.store_old_key(did, key)
+    await dummy_storage.add_record(_legacy_key_record(did, 2, key))
+    # stored along with a multibase lacking the multicodec prefix, or without any
+    encodings = KeyEncodings.of(key)
+    for index, stored_multibase in ((3, "z" + encodings.base58), (4, None)):
+        stored_value = {"key": encodings.jwk_x, "base58": encodings.base58}
+        if stored_multibase is not None:
+            stored_value["multibase"] = stored_multibase
+        await dummy_storage.add_record(
+            StorageRecord(
+                PREVIOUS_PUBLIC_KEY_RECORD_TYPE,
+                json.dumps(stored_value),
+                {"did": did, "index": str(index)},
+                f"{did}#{index}",
+            )
+        )
+
+    # then
+    stored, legacy, unprefixed, without_multibase = sorted(
+        await storage.stored_keys(did), key=lambda k: k.index
+    )
+    assert stored.encodings == encodings
+    # the fingerprint of a did:key is the multibase of its key
+    assert stored.encodings.multibase == DIDKey.from_public_key(key, ED25519).fingerprint
+    assert unprefixed.encodings == encodings
+    assert without_multibase.encodings == encodings
+    assert legacy.key == key
+    assert legacy.encodings is None
+    assert legacy.key_encodings() == stored.key_encodings()
+
+
 @pytest.mark.asyncio
 async def test_storage_backend_strategy_retrieves_correct_index(dummy_storage):
     # given
@@ -41,3 +117,221 @@ async def test_no_storage_strategy_never_stores_keys():
     assert await storage.store_old_key(did, b"abc") is None
     assert await storage.stored_keys(did) == []
     assert await storage.current_index(did) == 1
+
+
+@pytest.mark.asyncio
+async def test_storage_backend_strategy_current_index_does_not_scan_key_history(
+    dummy_storage,
+):
+    # given
+    did = "did:phone:911"
+    storage = StorageBackendStorageStrategy(dummy_storage)
+    await storage.store_old_key(did, b"abc")
+    await storage.store_old_key(did, b"def")
+
+    # when
+    dummy_storage.find_all_records = AsyncMock(side_effect=AssertionError("scanned"))
+
+    # then
+    assert await storage.current_index(did) == 3
+    assert await storage.head(did) == KeyHistoryHead(latest_index=2, count=2)
+
+
+@pytest.mark.asyncio
+async def test_storage_backend_strategy_backfills_head_from_legacy_records(dummy_storage):
+    # given
+    did = "did:phone:911"
+    for index, key in ((1, b"abc"), (2, b"def")):
+        await dummy_storage.add_record(_legacy_key_record(did, index, key))
+
+    # when
+    storage = StorageBackendStorageStrategy(dummy_storage)
+    await storage.store_old_key(did, b"ghi")
+
+    # then
+    assert await storage.head(did) == KeyHistoryHead(latest_index=3, count=3)
+    assert PreviousKey(3, b"ghi") in await storage.stored_keys(did)
+
+
+@pytest.mark.asyncio
+async def test_backfill_key_history_heads_writes_one_head_per_did(dummy_storage):
+    # given
+    for did, index in (("did:phone:911", 1), ("did:phone:911", 2), ("did:phone:112", 1)):
+        await dummy_storage.add_record(_legacy_key_record(did, index, b"abc"))
+
+    # when
+    written = await backfill_key_history_heads(dummy_storage)
+
+    # then
+    storage = StorageBackendStorageStrategy(dummy_storage)
+    assert written == 2
+    assert await storage.head("did:phone:911") == KeyHistoryHead(2, 2)
+    assert await storage.head("did:phone:112") == KeyHistoryHead(1, 1)
+    assert await backfill_key_history_heads(dummy_storage) == 0
+
+
+@pytest.mark.asyncio
+async def test_storage_backend_strategy_backfills_head_once_under_concurrent_reads():
+    # given
+    did = "did:phone:911"
+    storage = YieldingStorage()
+    for index, key in ((1, b"abc"), (2, b"def")):
+        await storage.add_record(_legacy_key_record(did, index, key))
+
+    # when
+    current_indices = await asyncio.gather(
+        *(StorageBackendStorageStrategy(storage).current_index(did) for _ in range(5)),
+        StorageBackendStorageStrategy(storage).heads([did]),
+    )
+
+    # then
+    assert current_indices[:5] == [3] * 5
+    assert current_indices[5] == {did: KeyHistoryHead(2, 2)}
+
+
+@pytest.mark.asyncio
+async def test_migrate_key_history_heads_backfills_a_wallet_once(dummy_storage):
+    # given
+    await dummy_storage.add_record(_legacy_key_record("did:phone:911", 1, b"abc"))
+
+    # when
+    written = await migrate_key_history_heads(dummy_storage)
+    await dummy_storage.add_record(_legacy_key_record("did:phone:112", 1, b"abc"))
+
+    # then
+    assert written == 1
+    assert await migrate_key_history_heads(dummy_storage) == 0
+
+
+def _legacy_key_record(did: str, index: int, key: bytes) -> StorageRecord:
+    return StorageRecord(
+        type=PREVIOUS_PUBLIC_KEY_RECORD_TYPE,
+        value=base64.b64encode(key),
+        tags={"did": did, "index": str(index)},
+        id=f"{did}#{index}",
+    )
+
+
+@pytest.mark.parametrize(
+    "stored, requested, expected_indices", ((3, 2, [3, 2]), (1, 2, [1]), (2, 0, []))
+)
+@pytest.mark.asyncio
+async def test_storage_backend_strategy_latest_keys_only_fetches_requested_indices(
+    dummy_storage, stored, requested, expected_indices
+):
+    # given
+    did = "did:phone:911"
+    storage = StorageBackendStorageStrategy(dummy_storage)
+    for i in range(stored):
+        await storage.store_old_key(did, bytes([i]))
+    find_all_records = AsyncMock(wraps=dummy_storage.find_all_records)
+    dummy_storage.find_all_records = find_all_records
+
+    # when
+    latest_keys = await storage.latest_keys(did, requested)
+
+    # then
+    assert [key.index for key in latest_keys] == expected_indices
+    for call in find_all_records.call_args_list:
+        assert len(call.args[1]["index"]["$in"]) <= requested
+
+
+@pytest.mark.asyncio
+async def test_storage_backend_strategy_remembers_dids_never_rotated(dummy_storage):
+    # given
+    did = "did:phone:911"
+    storage = StorageBackendStorageStrategy(dummy_storage)
+    first_head = await storage.head(did)
+    get_record = AsyncMock(wraps=dummy_storage.get_record)
+    find_all_records = AsyncMock(wraps=dummy_storage.find_all_records)
+    dummy_storage.get_record = get_record
+    dummy_storage.find_all_records = find_all_records
+
+    # when
+    head = await storage.head(did)
+    heads = await storage.heads([did])
+
+    # then - the empty head stored by the first read answers the next ones
+    assert first_head == head == heads[did] == KeyHistoryHead()
+    assert get_record.call_count == 1
+    assert find_all_records.call_count == 1
+    for call in find_all_records.call_args_list:
+        assert call.args[0] == PREVIOUS_PUBLIC_KEY_HEAD_RECORD_TYPE
+
+
+@pytest.mark.asyncio
+async def test_storage_backend_strategy_rotates_dids_with_an_empty_head(dummy_storage):
+    # given
+    did = "did:phone:911"
+    storage = StorageBackendStorageStrategy(dummy_storage)
+    await storage.heads([did])
+
+    # when
+    await storage.store_old_key(did, b"first")
+    await storage.store_old_key(did, b"second")
+
+    # then
+    assert await storage.head(did) == KeyHistoryHead(2, 2)
+    assert [key.key for key in await storage.latest_keys(did, 2)] == [b"second", b"first"]
+
+
+@pytest.mark.asyncio
+async def test_storage_backend_strategy_reads_histories_of_several_dids_in_batches(
+    dummy_storage,
+):
+    # given
+    storage = StorageBackendStorageStrategy(dummy_storage)
+    for did, rotations in (("did:phone:911", 3), ("did:phone:112", 1)):
+        for i in range(rotations):
+            await storage.store_old_key(did, bytes([i]))
+    find_all_records = AsyncMock(wraps=dummy_storage.find_all_records)
+    dummy_storage.find_all_records = find_all_records
+
+    # when
+    heads = await storage.heads(["did:phone:911", "did:phone:112"])
+    latest_keys = await storage.latest_keys_for_dids(heads, 2)
+
+    # then
+    assert heads == {
+        "did:phone:911": KeyHistoryHead(3, 3),
+        "did:phone:112": KeyHistoryHead(1, 1),
+    }
+    assert latest_keys == {
+        "did:phone:911": [PreviousKey(3, bytes([2])), PreviousKey(2, bytes([1]))],
+        "did:phone:112": [PreviousKey(1, bytes([0]))],
+    }
+    assert find_all_records.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_storage_backend_strategy_reads_only_keys_rotated_within_the_window(
+    dummy_storage,
+):
+    # given
+    did = "did:phone:911"
+    now = iter([1000.0, 2000.0, 3000.0])
+    storage = StorageBackendStorageStrategy(dummy_storage, lambda: next(now))
+    for i in range(3):
+        await storage.store_old_key(did, bytes([i]))
+    # stored before rotation times were recorded
+    await dummy_storage.add_record(
+        StorageRecord(
+            PREVIOUS_PUBLIC_KEY_RECORD_TYPE,
+            base64.b64encode(b"legacy"),
+            {"did": "did:phone:112", "index": "1"},
+            "did:phone:112#1",
+        )
+    )
+    find_all_records = AsyncMock(wraps=dummy_storage.find_all_records)
+    dummy_storage.find_all_records = find_all_records
+
+    # when
+    recent_keys = await storage.keys_rotated_since(did, 2000.0)
+    recent_keys_by_did = await storage.keys_rotated_since_for_dids(
+        [did, "did:phone:112"], 2500.0
+    )
+
+    # then
+    assert [key.index for key in recent_keys] == [3, 2]
+    assert recent_keys_by_did == {did: [PreviousKey(3, bytes([2]))], "did:phone:112": []}
+    assert find_all_records.call_count == 2
@@ -0,0 +1,136 @@
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from aiohttp import web
+from aries_cloudagent.admin.request_context import AdminRequestContext
+from aries_cloudagent.core.in_memory import InMemoryProfile
+from aries_cloudagent.protocols.coordinate_mediation.v1_0.route_manager import (
+    RouteManager,
+)
+from aries_cloudagent.wallet.base import BaseWallet
+from aries_cloudagent.wallet.did_method import SOV, DIDMethods
+from aries_cloudagent.wallet.key_type import ED25519
+
+from didmanagement.caching import DIDDocCache
+from didmanagement.config import PLUGIN_CONFIG_KEY, DIDManagementConfig
+from didmanagement.manager_factory import DIDManagerFactory
+
+# the route schemas need a more recent ACA-Py than some environments have
+get_diddoc = pytest.importorskip("didmanagement.routes.get_diddoc")
+
+
+@pytest.fixture
+def profile():
+    profile = InMemoryProfile.test_profile(
+        settings={"default_endpoint": "http://endpoint.url"},
+        bind={DIDMethods: DIDMethods()},
+    )
+    profile.context.injector.bind_instance(
+        RouteManager,
+        AsyncMock(routing_info=AsyncMock(return_value=([], "http://endpoint.url"))),
+    )
+    yield profile
+
+
+async def _create_did(profile) -> str:
+    async with profile.session() as session:
+        did_info = await session.inject(BaseWallet).create_local_did(SOV, ED25519)
+    # the wallet keeps sov DIDs unqualified
+    return f"did:sov:{did_info.did}"
+
+
+def _bind_manager_factory(profile, diddoc_cache: DIDDocCache = None, **endpoint):
+    profile.context.injector.bind_instance(
+        DIDManagerFactory,
+        DIDManagerFactory(
+            DIDManagementConfig.from_settings(
+                {"plugin_config": {PLUGIN_CONFIG_KEY: {"diddoc_endpoint": endpoint}}}
+            ),
+            diddoc_cache=diddoc_cache,
+        ),
+    )
+
+
+def _request(profile, did: str, if_none_match: str = None) -> MagicMock:
+    context = AdminRequestContext.test_context({}, profile)
+    request = MagicMock(
+        match_info={"did": did},
+        query={},
+        headers={"If-None-Match": if_none_match} if if_none_match else {},
+        method="GET",
+        path=f"/wallet/{did}/diddoc",
+    )
+    request.__getitem__.side_effect = {"context": context}.__getitem__
+    return request
+
+
+@pytest.mark.asyncio
+async def test_fetch_diddoc_sets_the_etag_and_cache_control_headers(profile):
+    # given
+    did = await _create_did(profile)
+    _bind_manager_factory(profile, cache_control="max-age=60")
+
+    # when
+    response = await get_diddoc.fetch_diddoc(_request(profile, did))
+
+    # then
+    assert response.status == 200
+    assert json.loads(response.text)["id"] == did
+    assert response.headers["ETag"].startswith('"')
+    assert response.headers["Cache-Control"] == "max-age=60"
+
+
+@pytest.mark.parametrize("direct_json", (False, True))
+@pytest.mark.parametrize("cached", (False, True))
+@pytest.mark.asyncio
+async def test_fetch_diddoc_answers_not_modified_without_building_the_document(
+    profile, direct_json, cached, monkeypatch
+):
+    # given
+    did = await _create_did(profile)
+    _bind_manager_factory(
+        profile, DIDDocCache() if cached else None, direct_json=direct_json
+    )
+    etag = (await get_diddoc.fetch_diddoc(_request(profile, did))).headers["ETag"]
+    build = MagicMock(side_effect=AssertionError("the document was built"))
+    monkeypatch.setattr("didmanagement.did_manager._build_diddoc", build)
+    monkeypatch.setattr("didmanagement.did_manager.render_diddoc_json", build)
+
+    # when
+    with pytest.raises(web.HTTPNotModified) as not_modified:
+        await get_diddoc.fetch_diddoc(_request(profile, did, etag))
+
+    # then
+    assert not_modified.value.headers["ETag"] == etag
+    assert not_modified.value.headers["Cache-Control"] == "no-cache"
+    build.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "if_none_match, matches",
+    (
+        ('"other"', False),
+        ('W/"{etag}"', True),
+        ('"other", W/"{etag}"', True),
+        ('"{etag}",  "other"', True),
+        ("*", True),
+    ),
+)
+@pytest.mark.asyncio
+async def test_fetch_diddoc_compares_etags_weakly(profile, if_none_match, matches):
+    # given
+    did = await _create_did(profile)
+    _bind_manager_factory(profile)
+    etag = (await get_diddoc.fetch_diddoc(_request(profile, did))).headers["ETag"]
+    request = _request(profile, did, if_none_match.format(etag=etag.strip('"')))
+
+    # when
+    try:
+        response = await get_diddoc.fetch_diddoc(request)
+    except web.HTTPNotModified as not_modified:
+        response = not_modified
+
+    # then
+    assert (response.status == 304) == matches
+    assert response.headers["ETag"] == etag
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from benchmarks.__main__ import DEFAULT_BASELINE
+from benchmarks.harness import (
+    OPERATIONS,
+    OperationResult,
+    compare,
+    run_benchmarks,
+)
+
+
+@pytest.mark.asyncio
+async def test_benchmarks_report_every_operation_with_storage_calls():
+    # when
+    results = await run_benchmarks(history_sizes=[3], wallet_sizes=[2], iterations=3)
+
+    # then
+    assert [result.operation for result in results] == OPERATIONS
+    assert all(result.p50_ms <= result.p90_ms <= result.p99_ms for result in results)
+    assert all(result.storage_calls >= 1 for result in results)
+
+
+@pytest.mark.asyncio
+async def test_benchmarks_flag_regressions_against_baseline():
+    # given
+    results = await run_benchmarks(
+        history_sizes=[3], wallet_sizes=[1], iterations=3, operations=["current_index"]
+    )
+    result = results[0]
+    baseline = {
+        result.name: {**result.to_dict(), "storage_calls": result.storage_calls - 1},
+        "unknown[history=1,wallet=1]": result.to_dict(),
+    }
+
+    # when
+    regressions = compare(results, baseline)
+
+    # then
+    assert [(regression.name, regression.metric) for regression in regressions] == [
+        (result.name, "storage_calls")
+    ]
+
+
+def test_benchmarks_tolerate_sub_millisecond_noise():
+    # given
+    name = "current_index[history=3,wallet=1]"
+    baseline = {name: {"p50_ms": 0.017, "storage_calls": 1}}
+
+    # when
+    noisy = compare(
+        [OperationResult("current_index", 3, 1, 50, 0.023, 0.03, 0.04, 0.025, 1)],
+        baseline,
+    )
+    slower = compare(
+        [OperationResult("current_index", 3, 1, 50, 0.2, 0.3, 0.4, 0.25, 1)], baseline
+    )
+
+    # then
+    assert noisy == []
+    assert [(regression.name, regression.metric) for regression in slower] == [
+        (name, "p50_ms")
+    ]
+
+
+def test_baseline_covers_every_operation():
+    # given
+    baseline = json.loads(DEFAULT_BASELINE.read_text())
+
+    # then
+    assert {name.split("[")[0] for name in baseline} == set(OPERATIONS)
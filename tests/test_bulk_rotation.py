@@ -0,0 +1,192 @@
+import copy
+from unittest.mock import AsyncMock, MagicMock
+
+import base58
+import pytest
+from aries_cloudagent.core.event_bus import EventBus
+from aries_cloudagent.wallet.did_info import DIDInfo
+from aries_cloudagent.wallet.did_method import SOV
+from aries_cloudagent.wallet.error import WalletNotFoundError
+from aries_cloudagent.wallet.key_type import ED25519
+
+from didmanagement.bulk_rotation import BulkKeyRotator
+from didmanagement.did_manager import DIDManager
+from didmanagement.events import KEY_ROTATED_EVENT_TOPIC
+from didmanagement.retention import StorageBackendStorageStrategy
+from tests.conftest import DummyStorage
+
+
+class FakeTransaction:
+    """Transaction over a DummyStorage, restoring its records on rollback."""
+
+    def __init__(self, storage: DummyStorage, journal: list):
+        self.storage = storage
+        self.journal = journal
+
+    async def __aenter__(self):
+        self.snapshot = copy.copy(self.storage.store)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    async def commit(self):
+        self.journal.append("commit")
+
+    async def rollback(self):
+        self.storage.store = self.snapshot
+        self.journal.append("rollback")
+
+
+@pytest.fixture
+def known_dids():
+    yield {
+        f"did:sov:{name}": DIDInfo(
+            f"did:sov:{name}", base58.b58encode(name.encode()).decode(), {}, SOV, ED25519
+        )
+        for name in ("one", "two", "three", "four")
+    }
+
+
+@pytest.fixture
+def rotator_factory(known_dids, dummy_storage):
+    wallet = AsyncMock()
+
+    async def get_local_did(did):
+        if f"did:sov:{did}" not in known_dids:
+            raise WalletNotFoundError()
+        return known_dids[f"did:sov:{did}"]
+
+    wallet.get_local_did = AsyncMock(side_effect=get_local_did)
+    profile = MagicMock(settings={"default_endpoint": "http://endpoint.url"})
+    profile.inject = MagicMock(
+        return_value=AsyncMock(routing_info=AsyncMock(return_value=([], None)))
+    )
+    profile.inject_or = MagicMock(return_value=None)
+    journal = []
+    profile.transaction = MagicMock(
+        side_effect=lambda: FakeTransaction(dummy_storage, journal)
+    )
+
+    def rotator_factory(**kwargs):
+        return (
+            BulkKeyRotator(
+                profile,
+                lambda transaction: DIDManager(profile, wallet, transaction.storage),
+                **kwargs,
+            ),
+            journal,
+        )
+
+    yield rotator_factory
+
+
+@pytest.mark.asyncio
+async def test_bulk_rotation_reports_indices_for_every_did(rotator_factory, known_dids):
+    # given
+    rotator, journal = rotator_factory(chunk_size=2, include_diddocs=False)
+
+    # when
+    outcomes = await rotator.rotate(list(known_dids))
+
+    # then
+    assert [outcome.did for outcome in outcomes] == list(known_dids)
+    assert all(outcome.rotated and outcome.diddoc is None for outcome in outcomes)
+    assert {(o.rotation.old_index, o.rotation.new_index) for o in outcomes} == {(1, 2)}
+    assert journal == ["commit", "commit"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_rotation_failure_does_not_roll_back_unrelated_dids(
+    rotator_factory, dummy_storage
+):
+    # given
+    rotator, journal = rotator_factory(chunk_size=3)
+
+    # when
+    outcomes = await rotator.rotate(["did:sov:one", "did:sov:unknown", "did:sov:two"])
+
+    # then
+    assert [outcome.rotated for outcome in outcomes] == [True, False, True]
+    assert outcomes[1].error == "Unknown DID"
+    assert outcomes[0].diddoc is not None
+    assert journal == ["rollback", "commit"]
+
+    storage = StorageBackendStorageStrategy(dummy_storage)
+    assert await storage.current_index("did:sov:one") == 2
+    assert await storage.current_index("did:sov:two") == 2
+
+
+@pytest.mark.asyncio
+async def test_bulk_rotation_publishes_committed_rotations(rotator_factory, known_dids):
+    # given
+    rotator, journal = rotator_factory(chunk_size=3, include_diddocs=False)
+    profile = rotator._BulkKeyRotator__profile
+    profile.inject_or = MagicMock(
+        side_effect=lambda cls: EventBus() if cls is EventBus else None
+    )
+    profile.notify = AsyncMock()
+
+    # when
+    await rotator.rotate(["did:sov:one", "did:sov:unknown"])
+
+    # then
+    profile.notify.assert_called_once_with(
+        KEY_ROTATED_EVENT_TOPIC,
+        {
+            "did": "did:sov:one",
+            "old_index": 1,
+            "new_index": 2,
+            "old_verkey": known_dids["did:sov:one"].verkey,
+            "new_verkey": known_dids["did:sov:one"].verkey,
+        },
+    )
+
+
+@pytest.mark.asyncio
+async def test_bulk_rotation_reports_unexpected_failures_per_did(
+    rotator_factory, known_dids
+):
+    # given
+    rotator, journal = rotator_factory(
+        chunk_size=2, concurrency=1, include_diddocs=False
+    )
+    manager_factory = rotator._BulkKeyRotator__manager_factory
+
+    def failing_manager_factory(transaction):
+        manager = manager_factory(transaction)
+        rotate = manager.rotate
+
+        async def rotate_or_fail(did, build_diddoc=False):
+            if did == "did:sov:two":
+                raise ValueError("Invalid DID document")
+            return await rotate(did, build_diddoc)
+
+        manager.rotate = rotate_or_fail
+        return manager
+
+    rotator._BulkKeyRotator__manager_factory = failing_manager_factory
+    profile = rotator._BulkKeyRotator__profile
+    transaction = profile.transaction.side_effect
+    # the first chunk rolls back, commits without did:sov:two, then the second fails
+    commits = iter([True, True, False])
+
+    def failing_transaction():
+        fake = transaction()
+        if not next(commits):
+            fake.commit = AsyncMock(side_effect=RuntimeError("Connection lost"))
+        return fake
+
+    profile.transaction = MagicMock(side_effect=failing_transaction)
+
+    # when
+    outcomes = await rotator.rotate(list(known_dids))
+
+    # then
+    assert [(outcome.did, outcome.error) for outcome in outcomes] == [
+        ("did:sov:one", None),
+        ("did:sov:two", "Invalid DID document"),
+        ("did:sov:three", "Connection lost"),
+        ("did:sov:four", "Connection lost"),
+    ]
+    assert outcomes[0].rotated
@@ -0,0 +1,273 @@
+import pytest
+from aries_cloudagent.cache.in_memory import InMemoryCache
+from aries_cloudagent.core.event_bus import Event, EventBus
+from aries_cloudagent.core.in_memory import InMemoryProfile
+
+from didmanagement.caching import (
+    MEDIATION_EVENT_PATTERN,
+    DIDCacheVersions,
+    DIDDocCache,
+    KeyIndexCache,
+    RoutingInfoCache,
+    SharedDIDDocCache,
+    SharedKeyIndexCache,
+    on_key_rotated,
+)
+from didmanagement.events import KEY_ROTATED_EVENT_PATTERN, KEY_ROTATED_EVENT_TOPIC
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_diddoc_cache_counts_hits_and_misses():
+    # given
+    cache = DIDDocCache()
+
+    # when
+    miss = await cache.get("wallet", "did:sov:abc", 1, "factory")
+    await cache.set("wallet", "did:sov:abc", 1, "factory", "{}")
+    hit = await cache.get("wallet", "did:sov:abc", 1, "factory")
+
+    # then
+    assert miss is None
+    assert hit == "{}"
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 1,
+        "evictions": 0,
+        "size": 1,
+        "max_size": 1000,
+    }
+
+
+@pytest.mark.asyncio
+async def test_diddoc_cache_evicts_least_recently_used_entries():
+    # given
+    cache = DIDDocCache(max_size=2)
+    await cache.set("wallet", "did:sov:a", 1, "factory", "a")
+    await cache.set("wallet", "did:sov:b", 1, "factory", "b")
+
+    # when
+    await cache.get("wallet", "did:sov:a", 1, "factory")
+    await cache.set("wallet", "did:sov:c", 1, "factory", "c")
+
+    # then
+    assert await cache.get("wallet", "did:sov:a", 1, "factory") == "a"
+    assert await cache.get("wallet", "did:sov:b", 1, "factory") is None
+    assert cache.stats()["evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_diddoc_cache_expires_entries_after_ttl():
+    # given
+    clock = FakeClock()
+    cache = DIDDocCache(ttl=10, clock=clock)
+    await cache.set("wallet", "did:sov:a", 1, "factory", "a")
+
+    # when
+    clock.now = 10
+
+    # then
+    assert await cache.get("wallet", "did:sov:a", 1, "factory") is None
+    assert cache.stats()["size"] == 0
+
+
+@pytest.mark.asyncio
+async def test_diddoc_cache_invalidates_every_variant_of_a_did():
+    # given
+    cache = DIDDocCache()
+    await cache.set("wallet", "did:sov:a", 1, "factory", "a")
+    await cache.set("wallet", "did:sov:a", 3, "other_factory", "a")
+    await cache.set("other_wallet", "did:sov:a", 1, "factory", "a")
+
+    # when
+    await cache.invalidate("wallet", "a")
+
+    # then
+    assert await cache.get("wallet", "did:sov:a", 1, "factory") is None
+    assert await cache.get("wallet", "did:sov:a", 3, "other_factory") is None
+    assert await cache.get("other_wallet", "did:sov:a", 1, "factory") == "a"
+
+
+@pytest.mark.asyncio
+async def test_caches_leave_out_what_was_read_before_an_invalidation():
+    # given
+    diddoc_cache, key_index_cache = DIDDocCache(), KeyIndexCache()
+    diddoc_generation = await diddoc_cache.generation("wallet", "did:sov:a")
+    key_index_generation = await key_index_cache.generation("wallet", "did:sov:a")
+    other_generation = await diddoc_cache.generation("wallet", "did:sov:b")
+    miss = await diddoc_cache.get("wallet", "did:sov:a", 1, "factory")
+
+    # when - a rotation is committed while the reader builds the document
+    await diddoc_cache.invalidate("wallet", "a")
+    await key_index_cache.invalidate("wallet", "did:sov:a")
+    await diddoc_cache.set(
+        "wallet", "did:sov:a", 1, "factory", "before", generation=diddoc_generation
+    )
+    await key_index_cache.set("wallet", "did:sov:a", 1, key_index_generation)
+    await diddoc_cache.set(
+        "wallet", "did:sov:b", 1, "factory", "b", generation=other_generation
+    )
+
+    # then
+    assert miss is None
+    assert await diddoc_cache.get("wallet", "did:sov:a", 1, "factory") is None
+    assert await key_index_cache.get("wallet", "did:sov:a") is None
+    # the other DIDs are still cached
+    assert await diddoc_cache.get("wallet", "did:sov:b", 1, "factory") == "b"
+
+
+@pytest.mark.asyncio
+async def test_diddoc_cache_forgetting_invalidations_leaves_out_older_reads():
+    # given
+    cache = DIDDocCache(max_size=1)
+    generation = await cache.generation("wallet", "did:sov:a")
+
+    # when - too many DIDs were invalidated since to remember the first one
+    await cache.invalidate("wallet", "a")
+    await cache.invalidate("wallet", "b")
+    await cache.set("wallet", "did:sov:a", 1, "factory", "a", generation=generation)
+
+    # then
+    assert await cache.get("wallet", "did:sov:a", 1, "factory") is None
+
+
+@pytest.mark.asyncio
+async def test_routing_info_cache_expires_entries_after_ttl():
+    # given
+    clock = FakeClock()
+    cache = RoutingInfoCache(ttl=10, clock=clock)
+    await cache.set("wallet", (["routing key"], "http://endpoint.url"))
+
+    # when
+    hit = await cache.get("wallet")
+    clock.now = 10
+
+    # then
+    assert hit == (["routing key"], "http://endpoint.url")
+    assert await cache.get("wallet") is None
+    assert await cache.get("other_wallet") is None
+
+
+@pytest.mark.asyncio
+async def test_routing_info_cache_is_refreshed_on_mediation_events():
+    # given
+    cache = RoutingInfoCache()
+    profile = InMemoryProfile.test_profile(settings={"wallet.id": "wallet"})
+    event_bus = EventBus()
+    event_bus.subscribe(MEDIATION_EVENT_PATTERN, cache.on_mediation_event)
+    await cache.set("wallet", ([], "http://endpoint.url"))
+    await cache.set("other_wallet", ([], "http://endpoint.url"))
+
+    # when
+    await event_bus.notify(profile, Event("acapy::record::mediation::granted", {}))
+
+    # then
+    assert await cache.get("wallet") is None
+    assert await cache.get("other_wallet") == ([], "http://endpoint.url")
+
+
+@pytest.mark.asyncio
+async def test_routing_info_cache_is_refreshed_everywhere_on_root_mediation_events():
+    # given - the root profile of a multi-tenant agent, holding the base mediation
+    cache = RoutingInfoCache()
+    root_profile = InMemoryProfile.test_profile(settings={"multitenant.enabled": True})
+    event_bus = EventBus()
+    event_bus.subscribe(MEDIATION_EVENT_PATTERN, cache.on_mediation_event)
+    await cache.set(None, ([], "http://endpoint.url"))
+    await cache.set("sub_wallet", ([], "http://endpoint.url"))
+
+    # when
+    await event_bus.notify(root_profile, Event("acapy::record::mediation::granted", {}))
+
+    # then
+    assert await cache.get(None) is None
+    assert await cache.get("sub_wallet") is None
+
+
+@pytest.mark.asyncio
+async def test_shared_caches_stop_serving_entries_invalidated_on_another_instance():
+    # given - two agent instances sharing the same cache
+    shared = InMemoryCache()
+    diddoc_caches = [
+        SharedDIDDocCache(shared, DIDCacheVersions(shared)) for _ in range(2)
+    ]
+    key_index_caches = [
+        SharedKeyIndexCache(shared, DIDCacheVersions(shared)) for _ in range(2)
+    ]
+    await diddoc_caches[0].set("wallet", "did:sov:a", 1, "factory", "a")
+    await key_index_caches[0].set("wallet", "did:sov:a", 1)
+    served_elsewhere = await diddoc_caches[1].get("wallet", "did:sov:a", 1, "factory")
+
+    # when - the DID is rotated through the second instance
+    await diddoc_caches[1].invalidate("wallet", "a")
+
+    # then
+    assert served_elsewhere == "a"
+    assert await diddoc_caches[0].get("wallet", "did:sov:a", 1, "factory") is None
+    assert await key_index_caches[0].get("wallet", "did:sov:a") is None
+
+
+@pytest.mark.asyncio
+async def test_shared_caches_never_serve_what_was_read_before_an_invalidation():
+    # given - two agent instances sharing the same cache
+    shared = InMemoryCache()
+    diddoc_reader = SharedDIDDocCache(shared, DIDCacheVersions(shared))
+    key_index_reader = SharedKeyIndexCache(shared, DIDCacheVersions(shared))
+    readers = diddoc_reader, key_index_reader
+    rotating = SharedDIDDocCache(shared, DIDCacheVersions(shared))
+    generations = [await cache.generation("wallet", "did:sov:a") for cache in readers]
+    miss = await diddoc_reader.get("wallet", "did:sov:a", 1, "factory", generations[0])
+
+    # when - the DID is rotated elsewhere before the reader stores what it read
+    await rotating.invalidate("wallet", "a")
+    await diddoc_reader.set(
+        "wallet", "did:sov:a", 1, "factory", "before", generation=generations[0]
+    )
+    await key_index_reader.set("wallet", "did:sov:a", 1, generations[1])
+
+    # then
+    assert miss is None
+    assert await rotating.get("wallet", "did:sov:a", 1, "factory") is None
+    assert await diddoc_reader.get("wallet", "did:sov:a", 1, "factory") is None
+    assert await key_index_reader.get("wallet", "did:sov:a") is None
+
+
+@pytest.mark.asyncio
+async def test_shared_caches_do_not_trust_entries_once_the_version_is_lost():
+    # given
+    shared = InMemoryCache()
+    versions = DIDCacheVersions(shared)
+    cache = SharedKeyIndexCache(shared, versions)
+    await cache.set("wallet", "did:sov:a", 1)
+
+    # when
+    await shared.clear(versions._key("wallet", "did:sov:a"))
+
+    # then
+    assert await cache.get("wallet", "did:sov:a") is None
+
+
+@pytest.mark.asyncio
+async def test_caches_forget_dids_whose_key_rotation_is_published():
+    # given
+    diddoc_cache = DIDDocCache()
+    event_bus = EventBus()
+    event_bus.subscribe(KEY_ROTATED_EVENT_PATTERN, on_key_rotated)
+    profile = InMemoryProfile.test_profile(
+        settings={"wallet.id": "wallet"},
+        bind={DIDDocCache: diddoc_cache, EventBus: event_bus},
+    )
+    await diddoc_cache.set("wallet", "did:sov:a", 1, "factory", "a")
+
+    # when
+    await profile.notify(KEY_ROTATED_EVENT_TOPIC, {"did": "did:sov:a"})
+
+    # then
+    assert await diddoc_cache.get("wallet", "did:sov:a", 1, "factory") is None
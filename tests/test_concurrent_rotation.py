@@ -0,0 +1,220 @@
+import asyncio
+import random
+from unittest.mock import AsyncMock, MagicMock
+
+import base58
+import pytest
+from aries_cloudagent.storage.base import BaseStorage
+from aries_cloudagent.storage.error import StorageNotFoundError
+from aries_cloudagent.wallet.base import BaseWallet
+from aries_cloudagent.wallet.did_info import DIDInfo
+from aries_cloudagent.wallet.did_method import SOV
+from aries_cloudagent.wallet.key_type import ED25519
+
+from didmanagement.bulk_rotation import BulkKeyRotator
+from didmanagement.concurrency import DIDLocks
+from didmanagement.did_manager import DIDManager
+from didmanagement.manager_factory import DIDManagerFactory
+from didmanagement.retention import KeyHistoryHead, StorageBackendStorageStrategy
+from tests.conftest import DummyStorage
+
+DID = "did:sov:HR6vs6GEZ8rHaVgjg2WodM"
+
+
+class InterleavingStorage(DummyStorage):
+    """
+    Gives control back to the event loop around every storage call, and holds the
+    records read for update locked until they are written, as a database would.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.row_locks = {}
+
+    async def add_record(self, record):
+        await _yield()
+        await super().add_record(record)
+
+    async def get_record(self, record_type, record_id, options=None):
+        await _yield()
+        if not (options or {}).get("forUpdate"):
+            return await super().get_record(record_type, record_id, options)
+
+        row_lock = self.row_locks.setdefault(record_id, asyncio.Lock())
+        await row_lock.acquire()
+        try:
+            return await super().get_record(record_type, record_id, options)
+        except StorageNotFoundError:
+            row_lock.release()
+            raise
+
+    async def find_all_records(self, type_filter, tag_query=None, options=None):
+        await _yield()
+        return await super().find_all_records(type_filter, tag_query, options)
+
+    async def update_record(self, record, value, tags):
+        await _yield()
+        await super().update_record(record, value, tags)
+        self.row_locks[record.id].release()
+
+
+class IsolatedTransaction:
+    """
+    Transaction seeing the records committed when it began and its own writes only,
+    which other transactions see once it commits.
+    """
+
+    def __init__(self, profile, committed: DummyStorage, wallet):
+        self.profile = profile
+        self.committed = committed
+        self.wallet = wallet
+
+    async def __aenter__(self):
+        self.snapshot = dict(self.committed.store)
+        self.storage = InterleavingStorage()
+        self.storage.store = dict(self.snapshot)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def inject(self, cls):
+        return {BaseStorage: self.storage, BaseWallet: self.wallet}[cls]
+
+    async def commit(self):
+        await _yield()
+        for record_id, record in self.storage.store.items():
+            if self.snapshot.get(record_id) is not record:
+                self.committed.store[record_id] = record
+        for record_id in self.snapshot.keys() - self.storage.store.keys():
+            self.committed.store.pop(record_id, None)
+
+
+class RotatingWallet:
+    """Wallet producing a new verkey on every rotation."""
+
+    def __init__(self):
+        self.rotations = 0
+
+    async def get_local_did(self, did):
+        await _yield()
+        verkey = base58.b58encode(f"key {self.rotations}".encode()).decode()
+        return DIDInfo(DID, verkey, {}, SOV, ED25519)
+
+    async def rotate_did_keypair_start(self, did):
+        await _yield()
+
+    async def rotate_did_keypair_apply(self, did):
+        await _yield()
+        self.rotations += 1
+
+
+async def _yield():
+    await asyncio.sleep(random.random() / 1000)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_store_old_key_allocates_gapless_indices():
+    # given
+    storage = InterleavingStorage()
+    strategies = [StorageBackendStorageStrategy(storage) for _ in range(25)]
+
+    # when - every writer starts from the same, soon stale, head
+    await asyncio.gather(
+        *(
+            strategy.store_old_key(DID, bytes([i]), KeyHistoryHead())
+            for i, strategy in enumerate(strategies)
+        )
+    )
+
+    # then
+    stored_keys = await StorageBackendStorageStrategy(storage).stored_keys(DID)
+    assert sorted(key.index for key in stored_keys) == list(range(1, 26))
+    assert len({key.key for key in stored_keys}) == 25
+    assert await strategies[0].head(DID) == KeyHistoryHead(latest_index=25, count=25)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_rotations_of_one_did_keep_history_gapless():
+    # given
+    storage = InterleavingStorage()
+    wallet = RotatingWallet()
+    profile = MagicMock(settings={"default_endpoint": "http://endpoint.url"})
+    profile.inject = MagicMock(
+        return_value=AsyncMock(routing_info=AsyncMock(return_value=([], None)))
+    )
+    did_locks = DIDManager(profile, wallet, storage)._DIDManager__did_locks
+
+    # when
+    rotations = await asyncio.gather(
+        *(
+            DIDManager(profile, wallet, storage, did_locks=did_locks).rotate(DID)
+            for _ in range(50)
+        )
+    )
+
+    # then
+    stored_keys = await StorageBackendStorageStrategy(storage).stored_keys(DID)
+    assert sorted(key.index for key in stored_keys) == list(range(1, 51))
+    # every key the wallet produced was safe kept exactly once
+    assert len({key.key for key in stored_keys}) == 50
+    assert sorted(rotation.new_index for rotation, _ in rotations) == list(range(2, 52))
+
+
+@pytest.fixture
+def transactional_profile():
+    committed = DummyStorage()
+    wallet = RotatingWallet()
+    profile = MagicMock(settings={"default_endpoint": "http://endpoint.url"})
+    profile.transaction = MagicMock(
+        side_effect=lambda: IsolatedTransaction(profile, committed, wallet)
+    )
+    manager_factory = DIDManagerFactory()
+    route_manager = AsyncMock(routing_info=AsyncMock(return_value=([], None)))
+    profile.inject = MagicMock(
+        side_effect=lambda cls: manager_factory
+        if cls is DIDManagerFactory
+        else route_manager
+    )
+    profile.inject_or = MagicMock(return_value=None)
+    yield profile, committed
+
+
+@pytest.mark.asyncio
+async def test_bulk_rotations_wait_for_the_chunks_rotating_the_same_dids(
+    transactional_profile,
+):
+    # given
+    profile, committed = transactional_profile
+    manager_factory = profile.inject(DIDManagerFactory)
+    rotator = BulkKeyRotator(
+        profile,
+        manager_factory.manager,
+        include_diddocs=False,
+        did_locks=manager_factory.did_locks,
+    )
+
+    # when
+    outcomes = await asyncio.gather(*(rotator.rotate([DID]) for _ in range(10)))
+
+    # then
+    assert all(outcome.rotated for outcome, in outcomes)
+    stored_keys = await StorageBackendStorageStrategy(committed).stored_keys(DID)
+    assert sorted(key.index for key in stored_keys) == list(range(1, 11))
+    assert len({key.key for key in stored_keys}) == 10
+
+
+@pytest.mark.asyncio
+async def test_did_locks_are_reentrant_for_their_holder():
+    # given
+    did_locks = DIDLocks()
+
+    # when
+    async with did_locks.hold("wallet", [DID, "did:sov:other"]):
+        async with did_locks.lock("wallet", DID):
+            inner_locked = did_locks.lock("wallet", DID).locked()
+
+        # then
+        assert inner_locked
+        assert did_locks.lock("wallet", DID).locked()
+    assert not did_locks.lock("wallet", DID).locked()
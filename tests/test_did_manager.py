@@ -1,3 +1,4 @@
+import asyncio
 import json
 from typing import Tuple, Type, Mapping
 from unittest.mock import AsyncMock, MagicMock
@@ -17,6 +18,7 @@ from aries_cloudagent.wallet.error import WalletNotFoundError
 from aries_cloudagent.wallet.key_type import ED25519
 
 from didmanagement import LatestVerificationKeyStrategy
+from didmanagement.caching import DIDDocCache, KeyIndexCache, RoutingInfoCache
 from didmanagement.did_manager import DIDManager, RecallStrategyConfig, UnknownDIDException
 from tests.conftest import DummyStorage
 
@@ -255,3 +257,327 @@ async def test_requests_for_unknown_did_should_fail(
 
     verkey = await verkey_strat.get_verification_method_id_for_did("did:sov:unknown", profile)
     assert verkey is None
+
+
+@pytest.mark.asyncio
+async def test_rotate_key_reads_key_history_head_once(
+    a_did, configure_context, dummy_storage
+):
+    # given
+    profile, wallet = configure_context(a_did, dummy_storage)
+    didweb_manager = DIDManager(
+        profile=profile,
+        wallet=wallet,
+        storage=dummy_storage,
+        recall_strategy_config=RecallStrategyConfig(2),
+    )
+    await didweb_manager.rotate_key(a_did.did)
+    get_record = AsyncMock(wraps=dummy_storage.get_record)
+    dummy_storage.get_record = get_record
+
+    # when
+    diddoc = await didweb_manager.rotate_key(a_did.did)
+
+    # then - the head is read once, and once more locked to be moved forward
+    history_reads = [
+        call for call in get_record.call_args_list if not call.args[2].get("forUpdate")
+    ]
+    assert len(history_reads) == 1
+    assert len(json.loads(diddoc.to_json())["verificationMethod"]) == 3
+
+
+@pytest.mark.asyncio
+async def test_get_diddoc_json_is_cached_until_the_rotation_is_committed(
+    a_did, configure_context, dummy_storage
+):
+    # given
+    profile, wallet = configure_context(a_did, dummy_storage)
+    diddoc_cache = DIDDocCache()
+    didweb_manager = DIDManager(
+        profile=profile,
+        wallet=wallet,
+        storage=dummy_storage,
+        recall_strategy_config=RecallStrategyConfig(2),
+        diddoc_cache=diddoc_cache,
+    )
+
+    # when
+    first = await didweb_manager.get_diddoc_json(a_did.did)
+    second = await didweb_manager.get_diddoc_json(a_did.did)
+    await didweb_manager.rotate_key(a_did.did)
+    before_commit = await didweb_manager.get_diddoc_json(a_did.did)
+    # as the subscriber of committed rotations does
+    await diddoc_cache.invalidate(profile.settings.get("wallet.id"), a_did.did)
+    after_rotation = await didweb_manager.get_diddoc_json(a_did.did)
+
+    # then
+    assert first == second == before_commit
+    assert len(json.loads(after_rotation)["verificationMethod"]) == 2
+    assert diddoc_cache.stats()["hits"] == 2
+    assert diddoc_cache.stats()["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_get_diddoc_json_does_not_cache_documents_built_before_a_rotation(
+    a_did, configure_context, dummy_storage
+):
+    # given
+    profile, wallet = configure_context(a_did, dummy_storage)
+    diddoc_cache = DIDDocCache()
+    didweb_manager = DIDManager(
+        profile=profile, wallet=wallet, storage=dummy_storage, diddoc_cache=diddoc_cache
+    )
+    build = didweb_manager._diddoc_json
+
+    async def build_while_rotated(*args):
+        diddoc_json = await build(*args)
+        # a rotation is committed before the document is cached
+        await diddoc_cache.invalidate(profile.settings.get("wallet.id"), a_did.did)
+        return diddoc_json
+
+    # when
+    didweb_manager._diddoc_json = build_while_rotated
+    await didweb_manager.get_diddoc_json(a_did.did)
+
+    # then
+    assert diddoc_cache.stats()["size"] == 0
+
+
+@pytest.mark.asyncio
+async def test_latest_verification_key_strategy_serves_cached_index_until_invalidated(
+    a_did, configure_context, dummy_storage
+):
+    # given
+    profile, wallet = configure_context(a_did, dummy_storage)
+    key_index_cache = KeyIndexCache()
+    verkey_strat = LatestVerificationKeyStrategy(key_index_cache)
+    didweb_manager = DIDManager(profile=profile, wallet=wallet, storage=dummy_storage)
+
+    # when
+    await verkey_strat.get_verification_method_id_for_did(a_did.did, profile)
+    await didweb_manager.rotate_key(a_did.did)
+    wallet.get_local_did.reset_mock()
+    cached = await verkey_strat.get_verification_method_id_for_did(a_did.did, profile)
+    await key_index_cache.invalidate(None, a_did.did)
+    refreshed = await verkey_strat.get_verification_method_id_for_did(a_did.did, profile)
+
+    # then
+    assert cached == f"{a_did.did}#key-1"
+    assert refreshed == f"{a_did.did}#key-2"
+    assert wallet.get_local_did.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_latest_verification_key_strategy_reuses_given_session(
+    a_did, configure_context, dummy_storage
+):
+    # given
+    profile, wallet = configure_context(a_did, dummy_storage)
+    session = profile.session()
+    profile.session.reset_mock()
+
+    # when
+    verkey = await LatestVerificationKeyStrategy().get_verification_method_id_for_did(
+        a_did.did, session
+    )
+
+    # then
+    assert verkey == f"{a_did.did}#key-1"
+    profile.session.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_get_diddocs_builds_each_known_did_and_reports_unknown_ones(
+    a_did, configure_context, dummy_storage
+):
+    # given
+    profile, wallet = configure_context(a_did, dummy_storage)
+    didweb_manager = DIDManager(
+        profile=profile,
+        wallet=wallet,
+        storage=dummy_storage,
+        recall_strategy_config=RecallStrategyConfig(2),
+    )
+    await didweb_manager.rotate_key(a_did.did)
+    wallet.get_local_did.side_effect = lambda did: (
+        a_did if did in a_did.did else _raise(WalletNotFoundError())
+    )
+    route_manager = profile.inject(RouteManager)
+    route_manager.routing_info.reset_mock()
+
+    # when
+    diddocs = await didweb_manager.get_diddocs([a_did.did, "did:sov:unknown", a_did.did])
+
+    # then
+    assert list(diddocs) == [a_did.did, "did:sov:unknown"]
+    assert len(diddocs[a_did.did].verification_method) == 2
+    assert isinstance(diddocs["did:sov:unknown"], UnknownDIDException)
+    route_manager.routing_info.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_get_diddoc_reuses_cached_routing_information(
+    a_did, configure_context, dummy_storage
+):
+    # given
+    profile, wallet = configure_context(a_did, dummy_storage)
+    route_manager = profile.inject(RouteManager)
+    route_manager.routing_info.return_value = (
+        [base58.b58encode(b"a mediator routing key!!!!!!!!!").decode()],
+        "http://endpoint.url",
+    )
+    routing_info_cache = RoutingInfoCache()
+
+    # when
+    diddocs = [
+        await DIDManager(
+            profile, wallet, dummy_storage, routing_info_cache=routing_info_cache
+        ).get_diddoc(a_did.did)
+        for _ in range(3)
+    ]
+
+    # then
+    route_manager.routing_info.assert_called_once()
+    assert all(diddoc.to_json() == diddocs[0].to_json() for diddoc in diddocs)
+    assert diddocs[0].service[0].routing_keys[0].startswith("did:key:")
+
+
+@pytest.mark.asyncio
+async def test_get_diddoc_etag_changes_with_the_document_only(
+    a_did, configure_context, dummy_storage
+):
+    # given
+    profile, wallet = configure_context(a_did, dummy_storage)
+    didweb_manager = DIDManager(profile, wallet, dummy_storage, RecallStrategyConfig(2))
+    more_keys_manager = DIDManager(
+        profile, wallet, dummy_storage, RecallStrategyConfig(3)
+    )
+    route_manager = profile.inject(RouteManager)
+
+    # when
+    _, etag = await didweb_manager.get_diddoc_json_with_etag(a_did.did)
+    _, same_etag = await didweb_manager.get_diddoc_json_with_etag(a_did.did)
+    for _ in range(3):
+        await didweb_manager.rotate_key(a_did.did)
+    _, rotated_etag = await didweb_manager.get_diddoc_json_with_etag(a_did.did)
+    _, more_keys_etag = await more_keys_manager.get_diddoc_json_with_etag(a_did.did)
+    route_manager.routing_info.return_value = ([], "http://other-endpoint.url")
+    _, other_endpoint_etag = await didweb_manager.get_diddoc_json_with_etag(a_did.did)
+
+    # then
+    assert etag == same_etag
+    assert etag.startswith('"') and etag.endswith('"')
+    assert len({etag, more_keys_etag, other_endpoint_etag, rotated_etag}) == 4
+
+
+@pytest.mark.asyncio
+async def test_get_diddoc_json_is_not_built_for_a_current_etag(
+    a_did, configure_context, dummy_storage, monkeypatch
+):
+    # given
+    profile, wallet = configure_context(a_did, dummy_storage)
+    didweb_manager = DIDManager(profile, wallet, dummy_storage)
+    _, etag = await didweb_manager.get_diddoc_json_with_etag(a_did.did)
+    build = MagicMock(side_effect=AssertionError("the document was built"))
+    monkeypatch.setattr("didmanagement.did_manager._build_diddoc", build)
+
+    # when
+    diddoc_json, current_etag = await didweb_manager.get_diddoc_json_with_etag(
+        a_did.did, is_current=lambda candidate: candidate == etag
+    )
+
+    # then
+    assert diddoc_json is None
+    assert current_etag == etag
+    build.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_get_diddoc_etag_is_cached_with_the_document(
+    a_did, configure_context, dummy_storage
+):
+    # given
+    profile, wallet = configure_context(a_did, dummy_storage)
+    manager = DIDManager(profile, wallet, dummy_storage, diddoc_cache=DIDDocCache())
+    route_manager = profile.inject(RouteManager)
+
+    # when
+    diddoc_json, etag = await manager.get_diddoc_json_with_etag(a_did.did)
+    route_manager.routing_info.return_value = ([], "http://other-endpoint.url")
+    cached_json, cached_etag = await manager.get_diddoc_json_with_etag(a_did.did)
+
+    # then - the cached document keeps its tag until it is invalidated
+    assert (cached_json, cached_etag) == (diddoc_json, etag)
+    route_manager.routing_info.assert_called_once()
+
+
+@pytest.mark.parametrize("concurrent_session_reads", (False, True))
+@pytest.mark.asyncio
+async def test_get_diddoc_reads_routing_information_while_reading_the_did(
+    a_did, configure_context, dummy_storage, concurrent_session_reads
+):
+    # given
+    profile, wallet = configure_context(a_did, dummy_storage)
+    routing_started = asyncio.Event()
+    route_manager = profile.inject(RouteManager)
+
+    async def routing_info(*args):
+        routing_started.set()
+        return [], "http://endpoint.url"
+
+    async def get_local_did(did):
+        # only returns once routing information is being read alongside
+        await asyncio.wait_for(routing_started.wait(), 1)
+        return a_did
+
+    didweb_manager = DIDManager(
+        profile,
+        wallet,
+        dummy_storage,
+        RecallStrategyConfig(2),
+        concurrent_session_reads=concurrent_session_reads,
+    )
+    await didweb_manager.rotate_key(a_did.did)
+    route_manager.routing_info.side_effect = routing_info
+    wallet.get_local_did.side_effect = get_local_did
+
+    # when
+    diddoc = await didweb_manager.get_diddoc(a_did.did)
+    diddoc_json = await didweb_manager.get_diddoc_json(a_did.did)
+
+    # then
+    assert diddoc.to_json() == diddoc_json
+    assert len(diddoc.verification_method) == 2
+
+
+@pytest.mark.asyncio
+async def test_get_diddoc_of_unknown_did_cancels_the_other_reads(
+    a_did, configure_context, dummy_storage
+):
+    # given
+    profile, wallet = configure_context(a_did, dummy_storage)
+    wallet.get_local_did.side_effect = WalletNotFoundError("DID is unknown!")
+    routing_cancelled = asyncio.Event()
+
+    async def routing_info(*args):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            routing_cancelled.set()
+            raise
+
+    profile.inject(RouteManager).routing_info.side_effect = routing_info
+    didweb_manager = DIDManager(
+        profile, wallet, dummy_storage, concurrent_session_reads=True
+    )
+
+    # when
+    with pytest.raises(UnknownDIDException):
+        await didweb_manager.get_diddoc("did:sov:unknown")
+
+    # then
+    assert routing_cancelled.is_set()
+
+
+def _raise(exception: Exception):
+    raise exception
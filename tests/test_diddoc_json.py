@@ -0,0 +1,128 @@
+import pytest
+from pydid import InvalidDIDError
+
+from didmanagement.did_manager import _build_diddoc
+from didmanagement.diddoc_json import can_render, render_diddoc_json
+from didmanagement.key_encodings import KeyEncodings
+from didmanagement.retention import KeyHistoryHead, KeyHistorySnapshot, PreviousKey
+from didmanagement.verification_methods import (
+    ed25519_verification_key_2018,
+    json_web_key_2020,
+)
+
+ROUTING_KEYS = [
+    "8HH5gYEeNc3z7PYXmd54d4x6qAfCNrqQqEB3nS7Zfu7K",
+    "BjHQU69pvfDdzM1Dh1CA19dSmK3P9nYP5SKvyQvrsAYq",
+]
+
+
+def _key_history(previous_keys: int) -> KeyHistorySnapshot:
+    return KeyHistorySnapshot(
+        KeyHistoryHead(previous_keys + 2, previous_keys + 1),
+        [
+            PreviousKey(index, bytes([index]) * 32)
+            for index in range(previous_keys + 2, 2, -1)
+        ],
+    )
+
+
+@pytest.mark.parametrize(
+    "verification_method_factory", (ed25519_verification_key_2018, json_web_key_2020)
+)
+@pytest.mark.parametrize("previous_keys", (0, 1, 3))
+@pytest.mark.parametrize(
+    "routing_information",
+    (
+        (None, "http://endpoint.url"),
+        ([], 'https://agent.example.com:8443/didcomm?x="y"'),
+        (ROUTING_KEYS, "http://endpoint.url"),
+    ),
+)
+@pytest.mark.parametrize(
+    "did", ("did:web:example.com", "did:web:example.com%3A8080:user:alice")
+)
+def test_rendered_json_is_the_pydid_json(
+    verification_method_factory, previous_keys, routing_information, did
+):
+    # given
+    signing_key = bytes(range(32))
+    key_history = _key_history(previous_keys)
+
+    # when
+    rendered = render_diddoc_json(
+        did, signing_key, key_history, routing_information, verification_method_factory
+    )
+
+    # then
+    assert can_render(verification_method_factory)
+    assert (
+        rendered
+        == _build_diddoc(
+            did,
+            signing_key,
+            key_history,
+            routing_information,
+            verification_method_factory,
+        ).to_json()
+    )
+
+
+@pytest.mark.parametrize(
+    "verification_method_factory", (ed25519_verification_key_2018, json_web_key_2020)
+)
+@pytest.mark.parametrize("did", ("not a did", "did:web:exa mple.com"))
+def test_invalid_dids_are_rejected_as_pydid_does(did, verification_method_factory):
+    # then
+    with pytest.raises(InvalidDIDError):
+        _build_diddoc(
+            did,
+            bytes(32),
+            _key_history(0),
+            ([], "http://endpoint.url"),
+            verification_method_factory,
+        )
+    with pytest.raises(InvalidDIDError):
+        render_diddoc_json(
+            did,
+            bytes(32),
+            _key_history(0),
+            ([], "http://endpoint.url"),
+            verification_method_factory,
+        )
+
+
+def test_other_verification_methods_are_not_rendered():
+    assert not can_render(lambda did, index, key: None)
+
+
+@pytest.mark.parametrize(
+    "verification_method_factory", (ed25519_verification_key_2018, json_web_key_2020)
+)
+def test_stored_key_encodings_are_used_as_they_are(verification_method_factory):
+    # given
+    stored = KeyEncodings("stored base58", "stored base64", "zstored multibase")
+    key_history = KeyHistorySnapshot(
+        KeyHistoryHead(1, 1), [PreviousKey(1, bytes(32), encodings=stored)]
+    )
+
+    # when
+    rendered = render_diddoc_json(
+        "did:web:example.com",
+        bytes(range(32)),
+        key_history,
+        (None, "http://endpoint.url"),
+        verification_method_factory,
+    )
+
+    # then
+    assert (
+        rendered
+        == _build_diddoc(
+            "did:web:example.com",
+            bytes(range(32)),
+            key_history,
+            (None, "http://endpoint.url"),
+            verification_method_factory,
+        ).to_json()
+    )
+    assert '"stored base' in rendered
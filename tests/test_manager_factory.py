@@ -0,0 +1,62 @@
+import pytest
+from aries_cloudagent.config.injection_context import InjectionContext
+from aries_cloudagent.core.in_memory import InMemoryProfile
+from aries_cloudagent.wallet.default_verification_key_strategy import (
+    BaseVerificationKeyStrategy,
+)
+
+import didmanagement
+from didmanagement.caching import DIDDocCache, RoutingInfoCache
+from didmanagement.concurrency import DIDLocks
+from didmanagement.config import PLUGIN_CONFIG_KEY, DIDManagementConfig
+from didmanagement.manager_factory import DIDManagerFactory
+from didmanagement.retention import PackedStorageStrategy
+
+
+@pytest.mark.asyncio
+async def test_setup_binds_a_manager_factory_sharing_the_plugin_state():
+    # given
+    context = InjectionContext(
+        settings={
+            "plugin_config": {
+                PLUGIN_CONFIG_KEY: {
+                    "diddoc_cache": {"enabled": True},
+                    "routing_info_cache": {"enabled": True},
+                }
+            }
+        }
+    )
+
+    # when
+    await didmanagement.setup(context)
+
+    # then
+    manager_factory = context.inject(DIDManagerFactory)
+    assert manager_factory.diddoc_cache is context.inject(DIDDocCache)
+    assert manager_factory.routing_info_cache is context.inject(RoutingInfoCache)
+    assert manager_factory.did_locks is context.inject(DIDLocks)
+    assert context.inject(BaseVerificationKeyStrategy) is not None
+
+
+@pytest.mark.asyncio
+async def test_managers_share_the_factory_state_and_use_the_configured_layout():
+    # given
+    profile = InMemoryProfile.test_profile()
+    manager_factory = DIDManagerFactory(
+        DIDManagementConfig.from_settings(
+            {"plugin_config": {PLUGIN_CONFIG_KEY: {"key_history": {"layout": "packed"}}}}
+        ),
+        diddoc_cache=DIDDocCache(),
+    )
+
+    # when
+    async with profile.session() as session:
+        first = manager_factory.manager(session)
+        second = manager_factory.manager(session, previous_keys=2)
+
+    # then
+    assert first is not second
+    assert first._DIDManager__diddoc_cache is manager_factory.diddoc_cache
+    assert first._DIDManager__did_locks is second._DIDManager__did_locks
+    assert second._DIDManager__number_of_keys == 2
+    assert isinstance(first._DIDManager__storage_strategy, PackedStorageStrategy)
@@ -0,0 +1,57 @@
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+from didmanagement.metrics import METRICS, DIDManagementMetrics, instrumented
+
+
+def test_metrics_are_exposed_in_text_format():
+    # given
+    metrics = DIDManagementMetrics()
+
+    class Cache:
+        hits, misses = 3, 1
+
+    # when
+    with metrics.operation("fetch_diddoc"):
+        with metrics.stage("wallet_lookup"):
+            pass
+    metrics.key_history_length.observe(7)
+    metrics.track_cache("diddoc", Cache())
+    exposed = metrics.expose()
+
+    # then
+    assert "# TYPE didmanagement_operations counter" in exposed
+    assert (
+        'didmanagement_operations_total{operation="fetch_diddoc",outcome="success"} 1'
+        in exposed
+    )
+    assert (
+        'didmanagement_stage_duration_seconds_count{stage="wallet_lookup"} 1' in exposed
+    )
+    assert 'didmanagement_key_history_length_bucket{le="5"} 0' in exposed
+    assert 'didmanagement_key_history_length_bucket{le="10"} 1' in exposed
+    assert 'didmanagement_cache_hit_ratio{cache="diddoc"} 0.75' in exposed
+
+
+@pytest.mark.asyncio
+async def test_instrumented_handlers_count_outcomes():
+    # given
+    @instrumented("test_handler")
+    async def handler(request):
+        if request.path == "/missing":
+            raise web.HTTPNotFound()
+        if request.path == "/unchanged":
+            raise web.HTTPNotModified()
+        return web.Response()
+
+    # when
+    await handler(make_mocked_request("GET", "/found"))
+    for path in ("/missing", "/unchanged"):
+        with pytest.raises(web.HTTPException):
+            await handler(make_mocked_request("GET", path))
+
+    # then
+    assert METRICS.operations.value(operation="test_handler", outcome="success") == 2
+    assert METRICS.operations.value(operation="test_handler", outcome="error") == 1
+    assert METRICS.operation_duration.count(operation="test_handler") == 3
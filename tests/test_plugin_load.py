@@ -0,0 +1,73 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+# seconds to import the plugin and run its setup, once ACA-Py itself is loaded
+PLUGIN_LOAD_BUDGET = 0.5
+
+# loaded on demand only, when the admin API is served or a DID document is built
+LAZY_MODULES = [
+    "pydid",
+    "aiohttp_apispec",
+    "didmanagement.did_manager",
+    "didmanagement.retention",
+    "didmanagement.routes.get_diddoc",
+    "didmanagement.routes.schemas",
+]
+
+MEASURE_PLUGIN_LOAD = """
+import asyncio
+import json
+import sys
+import time
+
+# already loaded by any agent, before its plugins
+from aries_cloudagent.cache.base import BaseCache
+from aries_cloudagent.config.injection_context import InjectionContext
+from aries_cloudagent.core.event_bus import EventBus
+from aries_cloudagent.storage.base import BaseStorage
+from aries_cloudagent.wallet.base import BaseWallet
+from aries_cloudagent.wallet.default_verification_key_strategy import (
+    BaseVerificationKeyStrategy,
+)
+
+lazy_modules = json.loads(sys.argv[1])
+already_loaded = [module for module in lazy_modules if module in sys.modules]
+
+start = time.perf_counter()
+import didmanagement
+import didmanagement.routes
+
+asyncio.run(didmanagement.setup(InjectionContext()))
+elapsed = time.perf_counter() - start
+
+print(
+    json.dumps(
+        {
+            "elapsed": elapsed,
+            "loaded": [
+                module
+                for module in lazy_modules
+                if module in sys.modules and module not in already_loaded
+            ],
+        }
+    )
+)
+"""
+
+
+def test_plugin_loads_within_budget_without_heavy_dependencies():
+    # when
+    output = subprocess.run(
+        [sys.executable, "-c", MEASURE_PLUGIN_LOAD, json.dumps(LAZY_MODULES)],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    measured = json.loads(output.strip().splitlines()[-1])
+
+    # then
+    assert measured["loaded"] == []
+    assert measured["elapsed"] < PLUGIN_LOAD_BUDGET
@@ -0,0 +1,125 @@
+from unittest.mock import AsyncMock
+
+import base58
+import pytest
+from aries_cloudagent.core.in_memory import InMemoryProfile
+from aries_cloudagent.messaging.responder import BaseResponder
+from aries_cloudagent.multitenant.route_manager import MultitenantRouteManager
+from aries_cloudagent.protocols.coordinate_mediation.v1_0.models.mediation_record import (
+    MediationRecord,
+)
+from aries_cloudagent.protocols.coordinate_mediation.v1_0.normalization import (
+    normalize_from_did_key,
+)
+from aries_cloudagent.protocols.routing.v1_0.manager import RoutingManager
+from aries_cloudagent.wallet.did_info import DIDInfo
+from aries_cloudagent.wallet.did_method import SOV
+from aries_cloudagent.wallet.error import WalletNotFoundError
+from aries_cloudagent.wallet.key_type import ED25519
+
+from didmanagement.route_registration import RouteRegistrar, RouteRegistration
+
+KNOWN_DIDS = [f"did:sov:{i}" for i in range(5)]
+
+
+def _verkey(did: str) -> str:
+    return base58.b58encode(did.encode().ljust(32, b"!")).decode()
+
+
+@pytest.fixture
+def wallet():
+    async def get_local_did(did: str) -> DIDInfo:
+        if did not in KNOWN_DIDS:
+            raise WalletNotFoundError(f"Unknown DID {did}")
+        return DIDInfo(did, _verkey(did), {}, SOV, ED25519)
+
+    yield AsyncMock(get_local_did=AsyncMock(side_effect=get_local_did))
+
+
+@pytest.fixture
+def responder():
+    yield AsyncMock(BaseResponder)
+
+
+@pytest.fixture
+def route_manager(responder):
+    root_profile = InMemoryProfile.test_profile(bind={BaseResponder: responder})
+    route_manager = MultitenantRouteManager(root_profile)
+    route_manager.get_base_wallet_mediator = AsyncMock(
+        return_value=MediationRecord(connection_id="mediator")
+    )
+    yield route_manager
+
+
+@pytest.mark.asyncio
+async def test_register_routes_sends_the_keys_in_chunked_keylist_updates(
+    wallet, responder, route_manager
+):
+    # given
+    profile = InMemoryProfile.test_profile(settings={"wallet.id": "tenant"})
+    registrar = RouteRegistrar(profile, wallet, route_manager)
+    await RoutingManager(route_manager.root_profile).create_route_record(
+        recipient_key=_verkey(KNOWN_DIDS[0]), internal_wallet_id="tenant"
+    )
+
+    # when
+    registrations = await registrar.register_routes(
+        [*KNOWN_DIDS, "did:sov:unknown", KNOWN_DIDS[1]], chunk_size=2
+    )
+
+    # then
+    assert registrations == [
+        RouteRegistration(KNOWN_DIDS[0], "already_registered"),
+        *(RouteRegistration(did, "registered") for did in KNOWN_DIDS[1:]),
+        RouteRegistration("did:sov:unknown", "failed", "Unknown DID"),
+    ]
+    keylist_updates = [call.args[0] for call in responder.send.call_args_list]
+    assert [len(update.updates) for update in keylist_updates] == [2, 2]
+    assert [
+        normalize_from_did_key(rule.recipient_key)
+        for update in keylist_updates
+        for rule in update.updates
+    ] == [_verkey(did) for did in KNOWN_DIDS[1:]]
+    routes = await RoutingManager(route_manager.root_profile).get_routes()
+    assert len(routes) == len(KNOWN_DIDS)
+
+
+@pytest.mark.asyncio
+async def test_register_routes_forgets_routes_the_mediator_was_not_told_about(
+    wallet, responder, route_manager
+):
+    # given
+    profile = InMemoryProfile.test_profile(settings={"wallet.id": "tenant"})
+    registrar = RouteRegistrar(profile, wallet, route_manager)
+    responder.send.side_effect = [None, WalletNotFoundError("mediator unreachable")]
+
+    # when
+    registrations = await registrar.register_routes(KNOWN_DIDS[:3], chunk_size=2)
+
+    # then
+    assert [registration.status for registration in registrations] == [
+        "registered",
+        "registered",
+        "failed",
+    ]
+    routes = await RoutingManager(route_manager.root_profile).get_routes()
+    assert {route.recipient_key for route in routes} == {
+        _verkey(did) for did in KNOWN_DIDS[:2]
+    }
+
+
+@pytest.mark.asyncio
+async def test_register_routes_routes_each_did_with_other_route_managers(wallet):
+    # given
+    profile = InMemoryProfile.test_profile()
+    route_manager = AsyncMock(route_public_did=AsyncMock(return_value=None))
+    registrar = RouteRegistrar(profile, wallet, route_manager)
+
+    # when
+    registrations = await registrar.register_routes(KNOWN_DIDS[:2])
+
+    # then
+    assert all(registration.registered for registration in registrations)
+    assert [call.args[1] for call in route_manager.route_public_did.call_args_list] == [
+        _verkey(did) for did in KNOWN_DIDS[:2]
+    ]
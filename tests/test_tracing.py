@@ -0,0 +1,111 @@
+import asyncio
+import json
+from typing import List
+from unittest.mock import AsyncMock
+
+import pytest
+
+from didmanagement.tracing import (
+    FileSpanExporter,
+    Span,
+    SpanExporter,
+    Tracer,
+    TRACER,
+    traced,
+)
+
+
+class InMemorySpanExporter(SpanExporter):
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def export(self, span: Span):
+        self.spans.append(span)
+
+
+@pytest.fixture
+def exporter():
+    exporter = InMemorySpanExporter()
+    TRACER.configure(exporter)
+    yield exporter
+    TRACER.configure(None)
+
+
+def test_tracer_without_exporter_records_nothing():
+    # given
+    tracer = Tracer()
+    storage = object()
+
+    # when - then
+    with tracer.span("fetch_diddoc") as span:
+        assert span is None
+    assert traced(storage, "storage") is storage
+
+
+@pytest.mark.asyncio
+async def test_spans_nest_across_traced_calls(exporter):
+    # given
+    storage = traced(AsyncMock(find_all_records=AsyncMock(return_value=[])), "storage")
+
+    # when
+    with TRACER.span("fetch_diddoc", did="did:web:example.com"):
+        with TRACER.span("key_history_read"):
+            await asyncio.gather(storage.find_all_records(), storage.find_all_records())
+
+    # then
+    reads, _, stage, root = exporter.spans
+    assert [span.name for span in exporter.spans] == [
+        "storage.find_all_records",
+        "storage.find_all_records",
+        "key_history_read",
+        "fetch_diddoc",
+    ]
+    assert {span.trace_id for span in exporter.spans} == {root.trace_id}
+    assert (reads.parent_span_id, stage.parent_span_id, root.parent_span_id) == (
+        stage.span_id,
+        root.span_id,
+        None,
+    )
+    assert root.to_otlp()["attributes"] == [
+        {"key": "did", "value": {"stringValue": "did:web:example.com"}}
+    ]
+
+
+def test_unsampled_traces_record_no_span():
+    # given
+    exporter = InMemorySpanExporter()
+    tracer = Tracer(exporter, sample_rate=0)
+
+    # when
+    with tracer.span("fetch_diddoc"):
+        with tracer.span("key_history_read") as span:
+            assert span is None
+
+    # then
+    assert exporter.spans == []
+
+
+def test_failing_spans_are_exported_with_an_error_status(exporter):
+    # when
+    with pytest.raises(ValueError):
+        with TRACER.span("rotate_key"):
+            raise ValueError()
+
+    # then
+    assert exporter.spans[0].to_otlp()["status"]["code"] == "STATUS_CODE_ERROR"
+
+
+def test_file_exporter_writes_spans_once_shut_down(tmp_path):
+    # given
+    path = tmp_path / "spans.jsonl"
+    tracer = Tracer(FileSpanExporter(str(path)))
+
+    # when
+    for name in ("fetch_diddoc", "rotate_key"):
+        with tracer.span(name):
+            pass
+    tracer.configure(None)
+
+    # then
+    lines = path.read_text().splitlines()
+    assert [json.loads(line)["name"] for line in lines] == ["fetch_diddoc", "rotate_key"]